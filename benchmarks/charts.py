@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the time and peak memory needed to calculate and draw the chart
+# of generated sprints of increasing size, e.g.
+#
+#   python benchmarks/charts.py
+#   python benchmarks/charts.py --scales large --repeat 3
+#   python benchmarks/charts.py --only getActualBurndown
+#   python benchmarks/charts.py --stages
+#   python benchmarks/charts.py --only fetchSprintData fetchSprintData-async --latency 50
+#
+# Each compute function is measured on its own and the whole chart is
+# requested from fakejira.py serving the generated sprint and drawn the way
+# Chart.updateChart does, on a ChartPlot that is reused between charts.
+# Requesting the data of the sprint is measured with both the threaded and,
+# if aiohttp is installed, the asyncio client. --latency delays every
+# response of the server, which is where the two differ most.
+# Peak memory is measured with tracemalloc in a separate run, so it does
+# not affect the times. With --stages the time, requests and bytes of each
+# stage of one more updateChart are printed as well.
+
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import asyncjira
+import core
+import fakejira
+import instrumentation
+import jiradataset
+import workcalendar
+
+scales = {
+    'small' :  { 'subtasks' : 100,   'worklogs' : 1000,   'scopeChanges' : 20,    'burnupIssues' : 20 },
+    'medium' : { 'subtasks' : 5000,  'worklogs' : 50000,  'scopeChanges' : 2000,  'burnupIssues' : 200 },
+    'large' :  { 'subtasks' : 50000, 'worklogs' : 500000, 'scopeChanges' : 20000, 'burnupIssues' : 1000 },
+}
+
+burnupBudget = 40
+availability = 300
+
+# Created for the end-to-end benchmark
+app = None
+plotWidget = None
+
+@contextlib.contextmanager
+def quiet():
+    ''' Discards everything that is printed, i.e. the log of the chart calculations '''
+    with open(os.devnull, 'wt') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def measure(function, setup, repeat):
+    ''' Calls function with the arguments returned by setup repeat times and
+        returns the times in seconds and the peak memory in bytes.
+    '''
+    times = []
+    with quiet():
+        for _ in range(repeat):
+            args = setup()
+            start = time.perf_counter()
+            function(*args)
+            times.append(time.perf_counter() - start)
+
+        args = setup()
+        tracemalloc.start()
+        try:
+            function(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return times, peak
+
+def requestSprintData(url):
+    ''' Requests the generated sprint the same way the application does '''
+    with quiet():
+        return core.fetchSprintData(core.Jira6(url, '', ''), 1, 1)
+
+def getMicroBenchmarks(sprintData):
+    ''' Returns (name, function, setup) of the compute functions '''
+    sprintStart = sprintData.sprintStart
+    sprintEnd = sprintData.sprintEnd
+    currentTime = core.getCurrentTimeFromBurndown(sprintData.scopeChangeBurndownChart)
+    scopeChangingIssues = sprintData.scopeChangingIssues
+    effortForIssues = sprintData.effortForIssues
+    with quiet():
+        finalSprintScope = (core.getInitialScope(scopeChangingIssues['initial'], effortForIssues) +
+                            core.calculateScopeChanges(sprintStart, sprintEnd, scopeChangingIssues['changes'], effortForIssues).y[-1])
+
+    def removeNonWorkingTime():
+        series = [core.getActualBurndown(sprintStart, sprintEnd, currentTime, finalSprintScope, sprintData.issues),
+                  core.calculateActualBurnup(sprintStart, sprintEnd, currentTime, sprintData.issueWorklogs, burnupBudget, 1)]
+        return (workcalendar.WorkCalendar(sprintStart, sprintEnd),) + tuple(series)
+
+    return [
+        ('getScopeChangingIssues', core.getScopeChangingIssues,
+         lambda: (sprintStart, sprintEnd, sprintData.scopeChangeBurndownChart)),
+        ('calculateScopeChanges', core.calculateScopeChanges,
+         lambda: (sprintStart, sprintEnd, scopeChangingIssues['changes'], effortForIssues)),
+        ('getActualBurndown', core.getActualBurndown,
+         lambda: (sprintStart, sprintEnd, currentTime, finalSprintScope, sprintData.issues)),
+        ('calculateActualBurnup', core.calculateActualBurnup,
+         lambda: (sprintStart, sprintEnd, currentTime, sprintData.issueWorklogs, burnupBudget, 1)),
+        ('WorkCalendar', workcalendar.WorkCalendar,
+         lambda: (sprintStart, sprintEnd)),
+        ('removeNonWorkingTime', lambda workCalendar, *series: workCalendar.removeNonWorkingTime(*series),
+         removeNonWorkingTime),
+        ('calculateChart', core.calculateChart,
+         lambda: (sprintData, burnupBudget, availability)),
+    ]
+
+def getFetchBenchmarks(url):
+    ''' Returns (name, function, setup) of requesting the data of the sprint
+        with core.Jira6 and, if aiohttp is available, asyncjira.AsyncJira6
+    '''
+    benchmarks = [('fetchSprintData', core.fetchSprintData, lambda: (core.Jira6(url, '', ''), 1, 1))]
+
+    async def fetchAsync(jira):
+        try:
+            return await asyncjira.fetchSprintData(jira, 1, 1)
+        finally:
+            await jira.close()
+
+    if importlib.util.find_spec('aiohttp'):
+        benchmarks.append(('fetchSprintData-async', lambda jira: asyncio.run(fetchAsync(jira)),
+                           lambda: (asyncjira.AsyncJira6(url, '', ''),)))
+
+    return benchmarks
+
+@contextlib.contextmanager
+def serveDataset(dataset, latency = 0):
+    ''' Serves the generated sprint with fakejira.py and yields its URL '''
+    server = fakejira.FakeJira(('localhost', 0), dataset, latency = latency, verbose = False)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    try:
+        yield 'http://localhost:%d' % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def getEndToEndBenchmark(url):
+    ''' Returns (name, function, setup) of requesting and drawing the chart
+        like Chart.updateChart, including all requests to the server. The
+        ChartPlot is created once, as in the application, so only updating
+        its items is measured.
+    '''
+    global app, plotWidget
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    import pyqtgraph as pg
+    from pyqtgraph.Qt import QtGui
+    import jiraburnupanddown
+
+    if not app:
+        app = QtGui.QApplication([])
+
+    plotWidget = pg.PlotWidget()
+    chartPlot = jiraburnupanddown.ChartPlot(plotWidget.getPlotItem())
+
+    def updateChart(jira, timings = None):
+        chartData = core.calculateChartData(jira, 1, 1, burnupBudget, availability, timings = timings)
+        with instrumentation.stage(timings, 'plot'):
+            chartPlot.plot(chartData)
+
+    def setup():
+        return (core.Jira6(url, '', ''),)
+
+    return ('updateChart', updateChart, setup)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Measure the time and memory needed to calculate and draw charts')
+    parser.add_argument('--scales', nargs = '+', choices = list(scales), default = ['small', 'medium'])
+    parser.add_argument('--repeat', type = int, default = 5, help = 'number of times to run each benchmark')
+    parser.add_argument('--only', nargs = '+', metavar = 'NAME', help = 'only run the named benchmarks')
+    parser.add_argument('--no-end-to-end', action = 'store_true', help = 'skip the updateChart benchmark')
+    parser.add_argument('--stages', action = 'store_true', help = 'print the stages of updateChart')
+    parser.add_argument('--latency', type = float, default = 0, help = 'delay of each response in milliseconds')
+    args = parser.parse_args()
+
+    print('%-24s %-8s %10s %10s %12s' % ('benchmark', 'scale', 'min (ms)', 'median', 'peak (MB)'))
+
+    for scale in args.scales:
+        with serveDataset(jiradataset.generateDataset(**scales[scale]), args.latency / 1000) as url:
+            benchmarks = getMicroBenchmarks(requestSprintData(url)) + getFetchBenchmarks(url)
+            if not args.no_end_to_end:
+                benchmarks.append(getEndToEndBenchmark(url))
+
+            for name, function, setup in benchmarks:
+                if args.only and name not in args.only:
+                    continue
+                times, peak = measure(function, setup, args.repeat)
+                print('%-24s %-8s %10.1f %10.1f %12.1f' % (name, scale, min(times) * 1000,
+                                                           statistics.median(times) * 1000, peak / 2**20))
+                sys.stdout.flush()
+
+            if args.stages and not args.no_end_to_end:
+                _, function, setup = getEndToEndBenchmark(url)
+                timings = instrumentation.Timings()
+                with quiet():
+                    function(*setup(), timings = timings)
+                print('\nStages of updateChart (%s):\n%s\n' % (scale, timings.describe()))
+
+if __name__ == '__main__':
+    main()
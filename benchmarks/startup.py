@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures how long it takes a fresh python interpreter to import each of
+# the modules of the application, e.g.
+#
+#   python benchmarks/startup.py
+#   python benchmarks/startup.py --repeat 20 core batchrender
+#
+# The modules are imported from the src directory of this repository. With
+# --importtime the slowest imports made by each module are listed as well.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+srcDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+defaultModules = ['core', 'batchrender', 'fakejira', 'jiraburnupanddown']
+
+def timeImport(module):
+    ''' Returns the wall clock time in seconds that a new interpreter needs
+        to start and import module, or raises CalledProcessError if the
+        import fails.
+    '''
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import %s' % module], cwd = srcDir, check = True,
+                   stdout = subprocess.DEVNULL, stderr = subprocess.PIPE)
+    return time.perf_counter() - start
+
+def getSlowestImports(module, count):
+    ''' Returns (cumulative microseconds, module name) of the slowest
+        imports made by module itself.
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module], cwd = srcDir,
+                            stdout = subprocess.DEVNULL, stderr = subprocess.PIPE, universal_newlines = True)
+    # Nested imports are indented by two spaces per level and are listed
+    # before the import that made them
+    imports = []
+    nested = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level == 1:
+            nested.append((int(cumulative), name.strip()))
+        elif level == 0:
+            if name.strip() == module:
+                imports = nested
+            nested = []
+
+    return sorted(imports, reverse = True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Measure the time needed to start up and import modules')
+    parser.add_argument('modules', nargs = '*', default = defaultModules)
+    parser.add_argument('--repeat', type = int, default = 10, help = 'number of times to import each module')
+    parser.add_argument('--importtime', type = int, default = 0, metavar = 'N',
+                        help = 'also list the N slowest imports of each module')
+    args = parser.parse_args()
+
+    baseline = min(timeImport('sys') for _ in range(args.repeat))
+    print('%-20s %10s %10s %10s' % ('module', 'min (ms)', 'median', 'import'))
+    print('%-20s %10.1f %10s %10s' % ('(interpreter)', baseline * 1000, '', ''))
+
+    for module in args.modules:
+        try:
+            times = [timeImport(module) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print('%-20s failed: %s' % (module, e.stderr.decode('utf-8', 'replace').strip().splitlines()[-1]))
+            continue
+
+        print('%-20s %10.1f %10.1f %10.1f' % (module, min(times) * 1000, statistics.median(times) * 1000,
+                                              (min(times) - baseline) * 1000))
+
+        for cumulative, name in getSlowestImports(module, args.importtime):
+            print('    %-30s %8.1f' % (name, cumulative / 1000))
+
+if __name__ == '__main__':
+    main()
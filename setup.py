@@ -10,6 +10,7 @@ setup(name='jiraburnupanddown',
       entry_points={
           'console_scripts': [
               'fakejira = jiraburnupanddown.fakejira:main',
+              'jiraburnupanddown-render = jiraburnupanddown.batchrender:main',
           ],
           'gui_scripts': [
               'jiraburnupanddown = jiraburnupanddown.jiraburnupanddown:main',
@@ -32,6 +33,9 @@ setup(name='jiraburnupanddown',
           'requests',
           'tzlocal',
       ],
+      extras_require={
+          'async': ['aiohttp', 'qasync'],
+      },
       classifiers=[
           # Status
           'Development Status :: 3 - Alpha',
@@ -0,0 +1,428 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# An asyncio version of the Jira 6 client in core. All requests are made
+# from one event loop over a single aiohttp session, so the number of
+# requests in flight is limited by the size of its connection pool instead
+# of by the number of threads. The methods have the same names, arguments
+# and results as those of core.Jira6, but are coroutines. aiohttp is only
+# needed when an AsyncJira6 is actually used.
+
+import asyncio
+import contextlib
+import itertools
+import json
+import threading
+import zlib
+
+try:
+    from . import core
+    from . import instrumentation
+    from . import records
+    from . import requestscheduler
+except ImportError:
+    import core
+    import instrumentation
+    import records
+    import requestscheduler
+
+def decompress(body, encoding):
+    ''' Returns the body of a response decompressed according to its
+        Content-Encoding. Responses are received compressed so that their
+        size on the wire can be counted.
+    '''
+    if encoding == 'gzip':
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        # Some servers send raw deflate data without the zlib header
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    else:
+        return body
+
+class AsyncJira6():
+
+    def __init__(self, url, username, burnupIssueQuery, pageSize = 1000, maxConnections = 32, responseCache = None,
+                 scheduler = None, maxBackgroundRequests = 4):
+        self.url = url
+        self.auth = (username, '')
+        self.burnupIssueQuery = burnupIssueQuery
+        self.pageSize = pageSize
+        self.maxConnections = maxConnections
+        # Requests with background priority may only use a few of the
+        # connections, so foreground requests never have to wait for them
+        self.maxBackgroundRequests = maxBackgroundRequests
+        self.backgroundRequests = None
+        self.worklogFeedAvailable = True
+        self.responseCache = responseCache
+        # Shared with core.Jira6 if both are used for the same server, so
+        # that they stay within one budget
+        self.scheduler = scheduler or requestscheduler.RequestScheduler()
+        # The session is bound to the event loop it is created on, so it is
+        # only created when the first request is made from that loop
+        self.session = None
+
+        # Bytes received over the network and the size they decompressed to.
+        # Requests are only made from the event loop, but the statistics may
+        # be read from any thread.
+        self.transferLock = threading.Lock()
+        self.bytesReceived = 0
+        self.bytesDecoded = 0
+
+    def _getSession(self):
+        import aiohttp
+
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector = aiohttp.TCPConnector(limit = self.maxConnections, ssl = False),
+                auth = aiohttp.BasicAuth(*self.auth),
+                headers = { 'Accept-Encoding' : 'gzip, deflate' },
+                auto_decompress = False)
+        return self.session
+
+    async def close(self):
+        if self.session:
+            session, self.session = self.session, None
+            await session.close()
+
+    def _countTransfer(self, received, decoded):
+        with self.transferLock:
+            self.bytesReceived += received
+            self.bytesDecoded += decoded
+        instrumentation.countRequest(received, decoded)
+        core.log('%d bytes received, %d bytes decompressed' % (received, decoded))
+
+    def getTransferStatistics(self):
+        with self.transferLock:
+            return { 'bytesReceived' : self.bytesReceived,
+                     'bytesDecoded' : self.bytesDecoded }
+
+    @contextlib.asynccontextmanager
+    async def _limitBackgroundRequests(self):
+        if requestscheduler.priority.get() != requestscheduler.BACKGROUND:
+            yield
+            return
+        # Like the session, the semaphore is created on the event loop
+        if self.backgroundRequests is None:
+            self.backgroundRequests = asyncio.Semaphore(self.maxBackgroundRequests)
+        async with self.backgroundRequests:
+            yield
+
+    async def _send(self, method, resource, params = None, headers = None, body = None):
+        ''' Makes a request when the scheduler allows it and returns the
+            response with its body decompressed. The response is not checked
+            for errors. As in core.JiraRest._send, requests that are
+            throttled by the server are sent again. At most
+            maxBackgroundRequests requests with background priority are
+            sent at the same time.
+        '''
+        if params:
+            params = dict((name, str(value)) for name, value in params.items())
+
+        core.log('--------------------------------\n%s %s/%s %s' % (method, self.url, resource, params))
+        async with self._limitBackgroundRequests():
+            for attempt in itertools.count():
+                await self.scheduler.acquireAsync()
+                async with self._getSession().request(method, '%s/%s' % (self.url, resource), params = params,
+                                                      headers = headers, json = body) as r:
+                    delay = self.scheduler.getRetryDelay(r.status, r.headers.get('Retry-After'), attempt)
+                    if delay is not None:
+                        core.log('Jira answered %d, retrying in %.1f s' % (r.status, delay))
+                        continue
+                    raw = await r.read()
+                    content = decompress(raw, r.headers.get('Content-Encoding'))
+                    self._countTransfer(len(raw), len(content))
+                    return r, content
+
+    def _decode(self, r, content):
+        r.raise_for_status()
+        with instrumentation.parsing():
+            return json.loads(content)
+
+    async def _request(self, resource, params = None):
+        if not self.responseCache:
+            return self._decode(*await self._send('GET', resource, params))
+
+        # The cache reads and writes files, which is done on a thread so
+        # that other requests can go on in the meantime
+        cache = self.responseCache
+        key = cache.getKey((self.url, self.auth[0]), resource, params)
+        entry = await asyncio.to_thread(cache.lookupFresh, key, resource)
+        if entry and entry.fresh:
+            return entry.data
+
+        r, content = await self._send('GET', resource, params, headers = entry.getValidationHeaders() if entry else {})
+
+        if entry and r.status == 304: # Not Modified
+            return await asyncio.to_thread(cache.revalidated, key, entry)
+
+        data = self._decode(r, content)
+        return await asyncio.to_thread(cache.received, key, resource, data, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+
+    async def _post(self, resource, body):
+        return self._decode(*await self._send('POST', resource, body = body))
+
+    async def _getPaged(self, resource, itemsKey, params = None):
+        ''' Returns the items stored under itemsKey from all pages of a
+            paged resource, in order. As in core.JiraRest, the first page
+            tells how many pages there are, after which all remaining pages
+            are requested at once.
+        '''
+        params = dict(params or {})
+        params['startAt'] = 0
+        params['maxResults'] = self.pageSize
+
+        page = await self._request(resource, params)
+        items = list(page[itemsKey])
+
+        # The server may return fewer results per page than we asked for
+        pageSize = page.get('maxResults', self.pageSize) or self.pageSize
+
+        if 'total' in page:
+            pages = await asyncio.gather(*[self._request(resource, dict(params, startAt = startAt))
+                                           for startAt in range(pageSize, page['total'], pageSize)])
+            for page in pages:
+                items.extend(page[itemsKey])
+        else:
+            while not page.get('isLast', True) and page[itemsKey]:
+                page = await self._request(resource, dict(params, startAt = page['startAt'] + len(page[itemsKey])))
+                items.extend(page[itemsKey])
+
+        return items
+
+    async def _getWorklogsFromFeed(self, issues, since):
+        ''' See core.JiraRest._getWorklogsFromFeed '''
+        issueIds = set(issue['id'] for issue in issues)
+        worklogIds = []
+        params = { 'since' : int(since.timestamp() * 1000) }
+        while True:
+            jsonData = await self._request('rest/api/2/worklog/updated', params)
+            worklogIds.extend(value['worklogId'] for value in jsonData['values'])
+            if jsonData.get('lastPage', True):
+                break
+            params = { 'since' : jsonData['until'] }
+
+        # Jira returns at most 1000 worklogs per bulk request
+        worklogLists = await asyncio.gather(*[self._post('rest/api/2/worklog/list', { 'ids' : worklogIds[i:i + 1000] })
+                                              for i in range(0, len(worklogIds), 1000)])
+
+        worklogsByIssueId = {}
+        for worklogs in worklogLists:
+            for worklog in worklogs:
+                if str(worklog['issueId']) in issueIds:
+                    worklogsByIssueId.setdefault(str(worklog['issueId']), []).append(worklog)
+
+        return dict((issue['id'], records.BurnupIssue.fromJson(issue['key'], worklogsByIssueId.get(issue['id'], [])))
+                    for issue in issues)
+
+    async def _getWorklogsPerIssue(self, issues):
+        ''' Returns the given issues as BurnupIssues with all their worklogs
+            by issue id. The worklogs of all issues are requested at once.
+        '''
+        async def getWorklogs(issue):
+            return records.BurnupIssue.fromJson(issue['key'],
+                await self._getPaged('rest/api/2/issue/%s/worklog' % issue['key'], 'worklogs'))
+
+        burnupIssues = await asyncio.gather(*[getWorklogs(issue) for issue in issues])
+
+        return dict((issue['id'], burnupIssue) for issue, burnupIssue in zip(issues, burnupIssues))
+
+    async def _addWorklogs(self, issues, sprintStart, sprintEnd, useFeed):
+        ''' See core.JiraRest._addWorklogs '''
+        import aiohttp
+
+        burnupIssues = None
+
+        if useFeed and self.worklogFeedAvailable:
+            try:
+                burnupIssues = await self._getWorklogsFromFeed(issues, sprintStart)
+            except aiohttp.ClientResponseError as e:
+                if e.status != 404:
+                    raise
+                self.worklogFeedAvailable = False
+
+        if burnupIssues is None:
+            burnupIssues = await self._getWorklogsPerIssue(issues)
+
+        return [burnupIssues[issue['id']].createdBetween(core.timestamp_to_seconds(sprintStart), core.timestamp_to_seconds(sprintEnd))
+                for issue in issues]
+
+    useWorklogFeed = core.JiraRest.useWorklogFeed
+    worklogFeedMaxAge = core.JiraRest.worklogFeedMaxAge
+
+    def setConnectionData(self, url, username, password, burnupIssueQuery):
+        connectionChanged = (url, (username, password)) != (self.url, self.auth)
+
+        self.url = url
+        self.auth = (username, password)
+        self.burnupIssueQuery = burnupIssueQuery
+
+        if connectionChanged:
+            self._discardSession()
+
+    def setAuth(self, auth):
+        self.auth = auth
+        self._discardSession()
+
+    def _discardSession(self):
+        ''' Makes the next request create a new session. The old one is
+            closed once the requests that are still using it are done.
+        '''
+        if self.session:
+            session, self.session = self.session, None
+            asyncio.ensure_future(session.close())
+
+    async def getScrumBoards(self):
+        jsonData = await self._request('rest/greenhopper/1.0/xboard/selectorData')
+
+        boards = {}
+        for board in jsonData['rapidViews']:
+            if board['sprintSupportEnabled']:
+                boards[board['id']] = board['name']
+
+        return boards
+
+    async def getSprints(self, boardId):
+        sprints = {}
+        for sprint in await self._getPaged('rest/greenhopper/1.0/sprintquery/%s' % boardId, 'sprints'):
+            sprints[sprint['id']] = sprint
+
+        return sprints
+
+    async def getSprintDates(self, boardId, sprintId):
+        jsonData = await self._request('rest/greenhopper/1.0/rapid/charts/sprintreport', {
+                'rapidViewId' : boardId,
+                'sprintId' : sprintId
+            })
+
+        return core.getSprintDatesFromSprintReport(jsonData)
+
+    async def getKanbanBoards(self):
+        jsonData = await self._request('rest/greenhopper/1.0/xboard/selectorData')
+
+        boards = {}
+        for view in jsonData['rapidViews']:
+            if view['sprintSupportEnabled']:
+                boards[view['id']] = view['name']
+
+        return boards
+
+    async def getIssues(self, boardId, sprintId, updatedSince = None):
+        jql = 'issuetype = Sub-task and sprint = %s' % sprintId
+        if updatedSince:
+            jql += ' and updated >= %s' % core.timestamp_to_jqltimestamp(updatedSince)
+
+        return [records.SubTask.fromJson(issue) for issue in await self._getPaged('rest/api/2/search', 'issues', {
+                'jql' : jql,
+                'fields' : 'timetracking,resolutiondate'
+            })]
+
+    async def getEffortForIssues(self, boardId, issueNames):
+        if not issueNames:
+            return {}
+
+        return core.getEffortFromIssues(await self._getPaged('rest/api/2/search', 'issues', {
+                'jql' : 'issuekey in (%s)' % ','.join(issueNames),
+                'fields' : 'timetracking'
+            }))
+
+    async def getScopeChangeBurndownChart(self, rapidViewId, sprintId):
+        return await self._request('rest/greenhopper/1.0/rapid/charts/scopechangeburndownchart', {
+                'rapidViewId' : rapidViewId,
+                'sprintId' : sprintId
+            })
+
+    async def getIssueWorklogs(self, sprintStart, sprintEnd, updatedSince = None):
+        issues = await self._getPaged('rest/api/2/search', 'issues', {
+                'jql' : core.getBurnupIssueJql(sprintStart, sprintEnd, updatedSince, self.burnupIssueQuery),
+                'fields' : 'updated'
+            })
+
+        return await self._addWorklogs(issues, sprintStart, sprintEnd, self.useWorklogFeed(sprintStart, updatedSince))
+
+async def refreshRetainedIssues(retainedIssues, fetch):
+    ''' The coroutine version of RetainedIssues.refresh. Loading from and
+        saving to the issue store is done on a thread.
+    '''
+    now, updatedSince = await asyncio.to_thread(retainedIssues.beginRefresh)
+    updatedIssues = await fetch(updatedSince)
+    return await asyncio.to_thread(retainedIssues.endRefresh, now, updatedSince, updatedIssues)
+
+async def fetchSprintData(jira, boardId, sprintId, retainedIssues = None, issueStore = None, timings = None):
+    ''' The coroutine version of core.fetchSprintData for an AsyncJira6.
+        The requests are started in the same order and with the same
+        dependencies, and measured in the same stages.
+    '''
+    if retainedIssues is None:
+        retainedIssues = {}
+
+    sprintIssues = retainedIssues.setdefault(('issues', boardId, sprintId),
+                                             core.RetainedIssues(store = issueStore, kind = 'sprint', name = sprintId))
+
+    def measure(name, coroutine):
+        async def run():
+            with instrumentation.stage(timings, 'fetch %s' % name):
+                return await coroutine
+        return asyncio.ensure_future(run())
+
+    async def getIssueWorklogs():
+        sprintStart, sprintEnd = await sprintDates
+        with instrumentation.stage(timings, 'fetch issueWorklogs'):
+            query = '%s|%s|%s' % (sprintStart.isoformat(), sprintEnd.isoformat(), jira.burnupIssueQuery)
+            burnupIssues = retainedIssues.setdefault(('worklogs', query),
+                                                     core.RetainedIssues(store = issueStore, kind = 'burnup', name = query))
+            return await refreshRetainedIssues(burnupIssues,
+                                               lambda updatedSince: jira.getIssueWorklogs(sprintStart, sprintEnd, updatedSince))
+
+    async def getScopeChangingIssues():
+        sprintStart, sprintEnd = await sprintDates
+        chart = await scopeChangeBurndownChart
+        with instrumentation.stage(timings, 'fetch scopeChangingIssues'):
+            return core.getScopeChangingIssues(sprintStart, sprintEnd, chart)
+
+    async def getEffortForIssues():
+        names = (await scopeChangingIssues)['names']
+        with instrumentation.stage(timings, 'fetch effortForIssues'):
+            return await jira.getEffortForIssues(boardId, names)
+
+    with instrumentation.stage(timings, 'fetch'):
+        sprintDates = measure('sprintDates', jira.getSprintDates(boardId, sprintId))
+        scopeChangeBurndownChart = measure('scopeChangeBurndownChart', jira.getScopeChangeBurndownChart(boardId, sprintId))
+        issues = measure('issues', refreshRetainedIssues(sprintIssues,
+                                                         lambda updatedSince: jira.getIssues(boardId, sprintId, updatedSince)))
+        issueWorklogs = asyncio.ensure_future(getIssueWorklogs())
+        scopeChangingIssues = asyncio.ensure_future(getScopeChangingIssues())
+        effortForIssues = asyncio.ensure_future(getEffortForIssues())
+
+        tasks = { 'sprintDates' : sprintDates,
+                  'scopeChangeBurndownChart' : scopeChangeBurndownChart,
+                  'issues' : issues,
+                  'issueWorklogs' : issueWorklogs,
+                  'scopeChangingIssues' : scopeChangingIssues,
+                  'effortForIssues' : effortForIssues }
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            # Do not leave the other requests running if one of them failed
+            # or the fetch was cancelled
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+    fetched = dict((name, task.result()) for name, task in tasks.items())
+
+    return core.createSprintData(boardId, sprintId, fetched, sprintIssues, timings)
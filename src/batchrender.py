@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Renders the charts of a number of sprints to image files without showing
+# a window, e.g.
+#
+#   jiraburnupanddown-render --all-active -o charts
+#   jiraburnupanddown-render 12 15:230 --format svg
+#
+# renders the active sprints of all boards or the active sprints of board 12
+# and sprint 230 of board 15. The Jira URL, user, burnup query and hours are
+# taken from the configuration of the GUI unless they are given as options.
+# The password is read from the JIRA_PASSWORD environment variable or asked
+# for. The boards are rendered in parallel by a pool of processes, which
+# share the request budget of the configuration between them. With
+# --timings the time, requests and bytes that each chart took are written
+# to a JSON file.
+
+import argparse
+import concurrent.futures
+import datetime as dt
+import getpass
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+
+try:
+    from . import core
+    from . import instrumentation
+    from . import issuestore
+    from . import requestscheduler
+    from . import responsecache
+except ImportError:
+    import core
+    import instrumentation
+    import issuestore
+    import requestscheduler
+    import responsecache
+
+# Set in each worker process by initializeWorker
+app = None
+jira = None
+renderOptions = None
+
+def createJira(connectionData, streamResponses = False, requestsPerSecond = None, requestBurst = 1):
+    url, username, password, burnupIssueQuery = connectionData
+    jiraClass = core.Jira6 if core.jiraVersion == 6 else core.Jira7
+    jira = jiraClass(url, username, burnupIssueQuery, responseCache = responsecache.ResponseCache(core.cache_dir),
+                     streamResponses = streamResponses, scheduler = requestscheduler.RequestScheduler(requestsPerSecond, requestBurst))
+    jira.setConnectionData(url, username, password, burnupIssueQuery)
+    return jira
+
+def initializeWorker(connectionData, options):
+    global app, jira, renderOptions
+
+    # Qt needs no display to render on the offscreen platform
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    core.logging = options['logging']
+
+    # Qt is only imported by the processes that render
+    from pyqtgraph.Qt import QtGui
+    import pyqtgraph as pg
+
+    app = QtGui.QApplication([])
+
+    pg.setConfigOption('background', 'w')
+    pg.setConfigOption('foreground', 'k')
+    pg.setConfigOption('antialias', True)
+
+    jira = createJira(connectionData, options['streamResponses'], options['requestsPerSecond'], options['requestBurst'])
+    renderOptions = options
+
+def renderChart(chartData, filename):
+    import pyqtgraph as pg
+    import pyqtgraph.exporters
+
+    try:
+        from . import jiraburnupanddown as burnupanddown
+    except ImportError:
+        import jiraburnupanddown as burnupanddown
+
+    plotWidget = pg.PlotWidget()
+    plotWidget.resize(renderOptions['width'], renderOptions['height'])
+    chartPlot = burnupanddown.ChartPlot(plotWidget.getPlotItem())
+    chartPlot.plot(chartData)
+
+    # The widget is shown on the offscreen platform to get it laid out. The
+    # axes adjust their width to the tick labels after they are first drawn,
+    # so the layout takes two rounds.
+    plotWidget.show()
+    for _ in range(2):
+        app.processEvents()
+        plotWidget.grab()
+
+    if renderOptions['format'] == 'svg':
+        pg.exporters.SVGExporter(plotWidget.getPlotItem()).export(filename)
+    else:
+        plotWidget.grab().save(filename)
+
+    plotWidget.close()
+
+def renderBoard(boardId, sprints):
+    ''' Renders the charts of the given sprints of one board. Returns a list
+        of (sprintId, filename, error, timings) tuples, of which either
+        filename or error is None. The timings are a dict in the form of
+        Timings.toDict.
+    '''
+    issueStore = None
+    if renderOptions['storeDirectory']:
+        issueStore = issuestore.openIssueStore(renderOptions['storeDirectory'], jira.url)
+
+    results = []
+    try:
+        for sprintId, availability, burnupBudget in sprints:
+            filename = os.path.join(renderOptions['outputDirectory'],
+                                    '%d-%d.%s' % (boardId, sprintId, renderOptions['format']))
+            timings = instrumentation.Timings()
+            try:
+                chartData = core.calculateChartData(jira, boardId, sprintId, burnupBudget, availability,
+                                                    issueStore = issueStore,
+                                                    nonWorkingDays = renderOptions['nonWorkingDays'],
+                                                    holidays = renderOptions['holidays'],
+                                                    timings = timings)
+                with timings.stage('plot'):
+                    renderChart(chartData, filename)
+            except Exception as e:
+                results.append((sprintId, None, ''.join(traceback.format_exception_only(type(e), e)).strip(), timings.toDict()))
+            else:
+                results.append((sprintId, filename, None, timings.toDict()))
+    finally:
+        if issueStore:
+            issueStore.close()
+
+    return results
+
+def isActive(sprint):
+    return sprint.get('state', '').lower() == 'active'
+
+def selectSprints(jira, targets, allActive):
+    ''' Returns a dict from board id to the list of sprint ids to render '''
+    selected = {}
+
+    if allActive:
+        targets = [str(boardId) for boardId in sorted(jira.getScrumBoards())]
+
+    for target in targets:
+        boardId, _, sprintId = target.partition(':')
+        sprintIds = selected.setdefault(int(boardId), [])
+        if sprintId:
+            sprintIds.append(int(sprintId))
+        else:
+            sprints = jira.getSprints(int(boardId))
+            sprintIds.extend(sorted(sprintId for sprintId in sprints if isActive(sprints[sprintId])))
+
+    return dict((boardId, sprintIds) for boardId, sprintIds in selected.items() if sprintIds)
+
+def parseArguments():
+    parser = argparse.ArgumentParser(description = 'Render burn-up-and-down charts to image files without a display')
+    parser.add_argument('targets', nargs = '*', metavar = 'BOARD[:SPRINT]',
+                        help = 'a board id to render its active sprints or a board and sprint id to render one sprint')
+    parser.add_argument('--all-active', action = 'store_true', help = 'render the active sprints of all scrum boards')
+    parser.add_argument('-o', '--output-directory', default = '.', help = 'directory to write the images to')
+    parser.add_argument('--format', choices = ['png', 'svg'], default = 'png')
+    parser.add_argument('--width', type = int, default = 1280)
+    parser.add_argument('--height', type = int, default = 720)
+    parser.add_argument('-j', '--processes', type = int, default = os.cpu_count(),
+                        help = 'number of boards to render at the same time')
+    parser.add_argument('--url', help = 'Jira URL (default: the one configured in the GUI)')
+    parser.add_argument('--username', help = 'Jira user (default: the one configured in the GUI)')
+    parser.add_argument('--query', help = 'JQL for the burnup issues (default: the one configured in the GUI)')
+    parser.add_argument('-v', '--verbose', action = 'store_true', help = 'print the requests and calculations')
+    parser.add_argument('--timings', metavar = 'FILE', help = 'write the time, requests and bytes of each chart to FILE as JSON')
+
+    args = parser.parse_args()
+    if not args.targets and not args.all_active:
+        parser.error('specify the boards or sprints to render or --all-active')
+
+    return args
+
+def main():
+    args = parseArguments()
+
+    core.loadConfiguration()
+    config = core.config
+    core.logging = args.verbose or config['logging']
+
+    import requests
+    from requests.packages.urllib3.exceptions import InsecureRequestWarning
+    requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+    password = os.environ.get('JIRA_PASSWORD')
+    if password is None:
+        password = getpass.getpass('Jira password: ')
+
+    connectionData = (args.url or config['jiraurl'],
+                      args.username or config['username'],
+                      password,
+                      args.query or config['burnupIssueQuery'])
+
+    jira = createJira(connectionData, config['streamResponses'], config['requestsPerSecond'], config['requestBurst'])
+    selected = selectSprints(jira, args.targets, args.all_active)
+    processes = max(1, min(args.processes, len(selected)))
+
+    hoursManager = core.HoursManager(config['hours'])
+    options = { 'outputDirectory' : args.output_directory,
+                'format' : args.format,
+                'width' : args.width,
+                'height' : args.height,
+                'storeDirectory' : core.cache_dir,
+                'nonWorkingDays' : config['nonWorkingDays'],
+                'holidays' : [dt.date.fromisoformat(holiday) for holiday in config['holidays']],
+                'streamResponses' : config['streamResponses'],
+                'requestsPerSecond' : config['requestsPerSecond'] and config['requestsPerSecond'] / processes,
+                'requestBurst' : max(1, config['requestBurst'] // processes),
+                'logging' : core.logging }
+
+    os.makedirs(args.output_directory, exist_ok = True)
+
+    # Qt does not survive being forked, so the workers are started fresh
+    failures = 0
+    allTimings = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers = processes,
+                                                mp_context = multiprocessing.get_context('spawn'),
+                                                initializer = initializeWorker,
+                                                initargs = (connectionData, options)) as executor:
+        futures = {}
+        for boardId, sprintIds in selected.items():
+            sprints = [(sprintId,) + tuple(hoursManager.getHours(boardId, sprintId)) for sprintId in sprintIds]
+            futures[executor.submit(renderBoard, boardId, sprints)] = boardId
+
+        for future in concurrent.futures.as_completed(futures):
+            boardId = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [(None, None, str(e), None)]
+
+            for sprintId, filename, error, timings in results:
+                if timings:
+                    allTimings.append(dict(timings, boardId = boardId, sprintId = sprintId))
+                if error:
+                    failures += 1
+                    print('Board %d sprint %s failed: %s' % (boardId, sprintId, error), file = sys.stderr)
+                else:
+                    print('Board %d sprint %d written to %s' % (boardId, sprintId, filename))
+
+    if args.timings:
+        with open(args.timings, 'wt') as f:
+            json.dump(allTimings, f, indent = 2)
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1372 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The data and calculations behind the chart, without any dependency on Qt,
+# so charts can also be calculated by tools that do not show them. Modules
+# that are slow to import and only needed for some requests are imported
+# where they are used.
+
+import concurrent.futures
+import copy
+import datetime as dt
+import itertools
+import json
+import numpy as np
+import os.path
+import threading
+import time
+
+try:
+    from . import instrumentation
+    from . import jiratime
+    from . import jsonstream
+    from . import records
+    from . import requestscheduler
+    from . import workcalendar
+except ImportError:
+    import instrumentation
+    import jiratime
+    import jsonstream
+    import records
+    import requestscheduler
+    import workcalendar
+
+jiraVersion = 6
+
+# Whether the requests and the steps of the calculations are printed. The
+# calculations only go through their issues and worklogs a second time to
+# print them if this is True.
+logging = False
+
+config_file = os.path.expanduser('~/.jira-burn-up-and-down.rc')
+cache_dir = os.path.expanduser('~/.jira-burn-up-and-down.cache')
+config = {}
+
+def saveConfiguration():
+    with open(config_file, 'wt') as f:
+        json.dump(config, f, indent = 2)
+
+def key_strings_to_int(d):
+    return dict( (int(k),(key_strings_to_int(v) if isinstance(v, dict) else v)) for k,v in d.items())
+
+def loadConfiguration():
+    global config
+    try:
+        with open(config_file, 'rt') as f:
+            config = json.load(f)
+    except (ValueError, FileNotFoundError):
+        config = {}
+
+    if 'hours' not in config:
+        config['hours'] = {}
+    config['hours'] = key_strings_to_int(config['hours'])
+
+    if 'jiraurl' not in config:
+        config['jiraurl'] = 'http://127.0.0.1:8080'
+        
+    if 'username' not in config:
+        config['username'] = ''
+
+    if 'currentBoard' not in config:
+        config['currentBoard'] = None
+
+    if 'currentSprint' not in config:
+        config['currentSprint'] = None
+
+    if 'burnupIssueQuery' not in config:
+        config['burnupIssueQuery'] = ''
+
+    if 'logging' not in config:
+        config['logging'] = False
+
+    # Days of the week (Monday is 0) and dates (YYYY-MM-DD) that are hidden from the chart
+    if 'nonWorkingDays' not in config:
+        config['nonWorkingDays'] = [5, 6]
+
+    if 'holidays' not in config:
+        config['holidays'] = []
+
+    # Boards of which the active sprint is prefetched, most recently used first
+    if 'recentBoards' not in config:
+        config['recentBoards'] = []
+
+    # Parse large responses while they are received, see JiraRest
+    if 'streamResponses' not in config:
+        config['streamResponses'] = False
+
+    # The most requests per second that are sent to Jira on average, or
+    # None for no limit, and how many may be sent at once after a pause.
+    # The rate is lowered automatically while Jira is throttling.
+    if 'requestsPerSecond' not in config:
+        config['requestsPerSecond'] = 20
+
+    if 'requestBurst' not in config:
+        config['requestBurst'] = 100
+
+    # Request the data of charts with the asyncio client in asyncjira.
+    # This needs aiohttp and qasync and is only available for Jira 6.
+    if 'asyncRequests' not in config:
+        config['asyncRequests'] = False
+
+def log(msg):
+    if logging:
+        print(msg)
+
+def timestamp_to_seconds(timestamp):
+    return (timestamp - jiratime.EPOCH).total_seconds()
+
+def seconds_to_timestamp(seconds):
+    return dt.datetime.fromtimestamp(seconds, jiratime.getLocalZone())
+
+def timestamp_to_jqltimestamp(ts):
+    localzone = jiratime.getLocalZone()
+    if str(ts.tzinfo) != str(localzone):
+        raise RuntimeError('Timezone of timestamp (%s) is not equal to local timezone (%s)' % (repr(ts.tzinfo), repr(localzone)))
+    return ts.strftime('"%Y-%m-%d %H:%M"')
+
+def getEffortFromIssues(issues):
+    ''' Returns the original estimates in seconds of issues returned by a
+        search for the timetracking field, by issue key.
+    '''
+    effortForIssues = {}
+    for issue in issues:
+        if 'originalEstimateSeconds' in issue['fields']['timetracking']:
+            effortForIssues[issue['key']] = issue['fields']['timetracking']['originalEstimateSeconds']
+        else:
+            effortForIssues[issue['key']] = 0
+
+    return effortForIssues
+
+def getSprintDatesFromSprintReport(jsonData):
+    ''' Returns the start and end of a sprint from a Jira 6 sprint report.
+        The end is when the sprint was completed if it was.
+    '''
+    from dateutil import parser
+
+    endDate = jsonData['sprint']['completeDate']
+    if endDate == 'None':
+        endDate = jsonData['sprint']['endDate']
+
+    localzone = jiratime.getLocalZone()
+
+    sprintStart = localzone.localize(parser.parse(jsonData['sprint']['startDate']))
+    sprintEnd = localzone.localize(parser.parse(endDate))
+
+    return sprintStart, sprintEnd
+
+def getBurnupIssueJql(sprintStart, sprintEnd, updatedSince, burnupIssueQuery):
+    ''' Returns the JQL that finds the burnup issues of a sprint on Jira 6 '''
+    queryParts = [ '(resolved >= %s or resolution = unresolved)' % timestamp_to_jqltimestamp(sprintStart),
+                   '(created <= %s)' % timestamp_to_jqltimestamp(sprintEnd),
+                   '(updated >= %s)' % timestamp_to_jqltimestamp(max(sprintStart, updatedSince) if updatedSince else sprintStart) ]
+
+    if burnupIssueQuery:
+        queryParts.append(burnupIssueQuery)
+
+    return ' and '.join(queryParts)
+
+class JiraRest:
+
+    worklogFeedMaxAge = dt.timedelta(days = 28)
+
+    # The only fields of worklogs that are used. Jira has no way to leave out
+    # the others (author, comment, visibility, ...), so they are dropped as
+    # soon as the worklogs arrive.
+    worklogFields = ('id', 'created', 'timeSpentSeconds')
+
+    def __init__(self, url, username, burnupIssueQuery, readFromFile = False, writeToFile = False,
+                 pageSize = 1000, maxParallelPages = 4, poolSize = 10, responseCache = None, streamResponses = False,
+                 scheduler = None):
+        self.url = url
+        self.read = readFromFile
+        self.write = writeToFile
+        self.auth = (username, '')
+        self.burnupIssueQuery = burnupIssueQuery
+        self.pageSize = pageSize
+        self.pagePool = concurrent.futures.ThreadPoolExecutor(max_workers = maxParallelPages)
+        # Requests that may themselves request further pages on the pagePool
+        # are run on a separate pool, so they can never wait for each other.
+        self.requestPool = concurrent.futures.ThreadPoolExecutor(max_workers = maxParallelPages)
+        # Requests with background priority have pools of their own, so
+        # they never queue up in front of foreground requests
+        self.backgroundPagePool = concurrent.futures.ThreadPoolExecutor(max_workers = maxParallelPages)
+        self.backgroundRequestPool = concurrent.futures.ThreadPoolExecutor(max_workers = maxParallelPages)
+        self.worklogFeedAvailable = True
+        self.poolSize = poolSize
+        self.responseCache = responseCache
+        # Paged resources are parsed while they are received instead of
+        # after, to keep the memory use of large responses down
+        self.streamResponses = streamResponses
+        # All requests wait for the scheduler, which may be shared with
+        # other clients of the same server
+        self.scheduler = scheduler or requestscheduler.RequestScheduler()
+        self.session = None
+        self._createSession()
+
+        # Bytes received over the network and the size they decompressed to
+        self.transferLock = threading.Lock()
+        self.bytesReceived = 0
+        self.bytesDecoded = 0
+
+    def _getPagePool(self):
+        if requestscheduler.priority.get() == requestscheduler.BACKGROUND:
+            return self.backgroundPagePool
+        return self.pagePool
+
+    def _getRequestPool(self):
+        if requestscheduler.priority.get() == requestscheduler.BACKGROUND:
+            return self.backgroundRequestPool
+        return self.requestPool
+
+    def _createSession(self):
+        ''' (Re)creates the HTTP session that is used for all requests.
+            The session keeps connections to the server alive between
+            requests and refreshes, so the TCP and TLS handshakes only
+            have to be done once per pooled connection.
+        '''
+        import requests
+
+        if self.session:
+            self.session.close()
+
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.verify = False
+
+        # Jira compresses its JSON responses to a fraction of their size
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections = self.poolSize, pool_maxsize = self.poolSize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _countTransfer(self, r, decoded = None):
+        ''' Reports the size of a response on the wire and after
+            decompression. The decompressed size of a streamed response must
+            be passed in, because its content is not kept.
+        '''
+        received = r.raw.tell()
+        if decoded is None:
+            decoded = len(r.content)
+        with self.transferLock:
+            self.bytesReceived += received
+            self.bytesDecoded += decoded
+        instrumentation.countRequest(received, decoded)
+        log('%d bytes received, %d bytes decompressed' % (received, decoded))
+
+    def getTransferStatistics(self):
+        with self.transferLock:
+            return { 'bytesReceived' : self.bytesReceived,
+                     'bytesDecoded' : self.bytesDecoded }
+
+    def _send(self, method, resource, **kwargs):
+        ''' Sends a request when the scheduler allows it and returns the
+            response. As long as the server answers that it is throttling
+            requests, the request is sent again after the scheduler's delay.
+            Raises requestscheduler.Cancelled if the work the request is
+            part of was cancelled before it could be sent. Code that may not
+            wait gets the throttled response instead of a retry.
+        '''
+        for attempt in itertools.count():
+            self.scheduler.acquire()
+            r = self.session.request(method, '%s/%s' % (self.url, resource), **kwargs)
+            delay = self.scheduler.getRetryDelay(r.status_code, r.headers.get('Retry-After'), attempt)
+            if delay is None or not requestscheduler.mayWait.get():
+                return r
+            log('Jira answered %d, retrying in %.1f s' % (r.status_code, delay))
+            r.close()
+
+    def _request(self, resource, params = None):
+        def request(headers):
+            log('--------------------------------\n%s/%s %s' % (self.url, resource, params))
+            r = self._send('GET', resource, params=params, headers=headers)
+            self._countTransfer(r)
+            return r
+
+        if self.responseCache:
+            return self.responseCache.get((self.url, self.auth[0]), resource, params, request)
+
+        r = request({})
+        r.raise_for_status()
+        with instrumentation.parsing():
+            return r.json()
+
+    def _post(self, resource, filename, body):
+        if self.read:
+            with open(filename, 'rt') as f:
+                jsonData = json.load(f)
+        else:
+            log('--------------------------------\nPOST %s/%s' % (self.url, resource))
+            r = self._send('POST', resource, json=body)
+            self._countTransfer(r)
+            r.raise_for_status()
+            with instrumentation.parsing():
+                jsonData = r.json()
+
+            if self.write:
+                with open(filename, 'wt') as f:
+                    json.dump(jsonData, f)
+
+        return jsonData
+
+    def _get(self, resource, filename, params = None):
+        if self.read:
+            with open(filename, 'rt') as f:
+                jsonData = json.load(f)
+        else:
+            jsonData = self._request(resource, params)
+
+            if self.write:
+                with open(filename, 'wt') as f:
+                    json.dump(jsonData, f)
+
+        return jsonData
+
+    def _getPaged(self, resource, filename, itemsKey, params = None):
+        ''' Yields the items stored under itemsKey from all pages of a paged
+            resource, in order. See _getPages and _getItemsStreamed for how
+            the pages are requested.
+        '''
+        if self.read:
+            with open(filename, 'rt') as f:
+                yield from json.load(f)[itemsKey]
+            return
+
+        params = dict(params or {})
+        params['startAt'] = 0
+        params['maxResults'] = self.pageSize
+
+        if self.streamResponses:
+            items = self._getItemsStreamed(resource, itemsKey, params)
+        else:
+            items = itertools.chain.from_iterable(page[itemsKey] for page in self._getPages(resource, itemsKey, params))
+
+        allItems = []
+        for item in items:
+            if self.write:
+                allItems.append(item)
+            yield item
+
+        if self.write:
+            with open(filename, 'wt') as f:
+                json.dump({ itemsKey : allItems }, f)
+
+    def _getPages(self, resource, itemsKey, params):
+        ''' Yields all pages of a paged resource. The first page is used to
+            find out how many items there are in total, after which all
+            remaining pages are requested concurrently. Resources that do not
+            report a total but do report isLast are followed page by page.
+            Resources that report neither are treated as having a single page.
+        '''
+        page = self._request(resource, params)
+
+        # The server may return fewer results per page than we asked for
+        pageSize = page.get('maxResults', self.pageSize) or self.pageSize
+
+        if 'total' in page:
+            startAts = range(pageSize, page['total'], pageSize)
+            futures = [instrumentation.submit(self._getPagePool(), self._request, resource, dict(params, startAt = startAt))
+                       for startAt in startAts]
+            try:
+                yield from itertools.chain([page], (future.result() for future in futures))
+            finally:
+                # Pages that are no longer needed, because a page failed or
+                # the fetch was cancelled, are not requested
+                for future in futures:
+                    future.cancel()
+        else:
+            while True:
+                yield page
+                if page.get('isLast', True) or not page[itemsKey]:
+                    break
+                page = self._request(resource, dict(params, startAt = page['startAt'] + len(page[itemsKey])))
+
+    def _streamPage(self, resource, params, itemsKey, page):
+        ''' Yields the items of one page of a resource while it is being
+            received and adds the other members of the page to page. The
+            time spent parsing is the time spent getting the items, minus
+            the time spent waiting for the chunks they are parsed from.
+        '''
+        log('--------------------------------\n%s/%s %s (streamed)' % (self.url, resource, params))
+
+        decoded = 0
+        waiting = 0
+        def countChunks(chunks):
+            nonlocal decoded, waiting
+            while True:
+                requestscheduler.checkCancelled()
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                waiting += time.perf_counter() - start
+                if chunk is None:
+                    return
+                decoded += len(chunk)
+                yield chunk
+
+        end = object()
+        parsing = 0
+        with self._send('GET', resource, params=params, stream=True) as r:
+            r.raise_for_status()
+            items = jsonstream.iterItems(countChunks(r.iter_content(chunk_size = 64 * 1024)), itemsKey, page)
+            while True:
+                start = time.perf_counter()
+                item = next(items, end)
+                parsing += time.perf_counter() - start
+                if item is end:
+                    break
+                yield item
+            instrumentation.addParseTime(parsing - waiting)
+            self._countTransfer(r, decoded)
+
+    def _getItemsStreamed(self, resource, itemsKey, params):
+        ''' Yields the items of all pages of a paged resource one at a time
+            as they are parsed, so that only a chunk of the response and the
+            item being parsed are held in memory, however large the pages
+            are. The pages are requested one after the other and are not
+            kept in the response cache.
+        '''
+        startAt = 0
+        while True:
+            page = {}
+            count = 0
+            for item in self._streamPage(resource, dict(params, startAt = startAt), itemsKey, page):
+                count += 1
+                yield item
+
+            startAt += count
+            if 'total' in page:
+                if not count or startAt >= page['total']:
+                    break
+            elif not count or page.get('isLast', True):
+                break
+
+    def _getWorklogsFromFeed(self, issues, since):
+        ''' Returns the given issues as BurnupIssues by issue id, with the
+            worklogs that were updated since the given time. The ids of the
+            worklogs are taken from the worklog updated feed, after which
+            the worklogs themselves are requested in bulk.
+        '''
+        issueIds = set(issue['id'] for issue in issues)
+        worklogIds = []
+        firstSince = int(since.timestamp() * 1000)
+        params = { 'since' : firstSince }
+        while True:
+            # Each page and each bulk request is recorded in a file of its
+            # own, so all of them can be read back
+            jsonData = self._get('rest/api/2/worklog/updated', 'jira6/getWorklogsUpdated-%d.json' % params['since'], params = params)
+            worklogIds.extend(value['worklogId'] for value in jsonData['values'])
+            if jsonData.get('lastPage', True):
+                break
+            params = { 'since' : jsonData['until'] }
+
+        # Jira returns at most 1000 worklogs per bulk request
+        futures = [instrumentation.submit(self._getPagePool(), self._post, 'rest/api/2/worklog/list',
+                                          'jira6/getWorklogList-%d-%d.json' % (firstSince, i // 1000),
+                                          { 'ids' : worklogIds[i:i + 1000] })
+                   for i in range(0, len(worklogIds), 1000)]
+
+        worklogsByIssueId = {}
+        for future in futures:
+            for worklog in future.result():
+                if str(worklog['issueId']) in issueIds:
+                    worklogsByIssueId.setdefault(str(worklog['issueId']), []).append(self._trimWorklog(worklog))
+
+        return dict((issue['id'], records.BurnupIssue.fromJson(issue['key'], worklogsByIssueId.get(issue['id'], [])))
+                    for issue in issues)
+
+    def _trimWorklog(self, worklog):
+        return dict((field, worklog[field]) for field in self.worklogFields if field in worklog)
+
+    def _getWorklogsPerIssue(self, issues):
+        ''' Returns the given issues as BurnupIssues with all their worklogs by issue id '''
+        def getWorklogs(issue):
+            return records.BurnupIssue.fromJson(issue['key'],
+                self._getPaged('rest/api/2/issue/%s/worklog' % issue['key'], 'jira6/getWorklogs-%s.json' % issue['key'], 'worklogs'))
+
+        futures = [(issue['id'], instrumentation.submit(self._getRequestPool(), getWorklogs, issue)) for issue in issues]
+
+        return dict((issueId, future.result()) for issueId, future in futures)
+
+    def _addWorklogs(self, issues, sprintStart, sprintEnd, useFeed):
+        ''' Returns the issues as BurnupIssues with all worklogs created
+            during the sprint, instead of the first 20 worklogs of each issue
+            that a search for the worklog field returns. The worklog updated
+            feed is used if useFeed is True and the server supports it,
+            otherwise the worklogs are requested per issue.
+        '''
+        import requests
+
+        burnupIssues = None
+
+        if useFeed and self.worklogFeedAvailable:
+            try:
+                burnupIssues = self._getWorklogsFromFeed(issues, sprintStart)
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code != 404:
+                    raise
+                self.worklogFeedAvailable = False
+
+        if burnupIssues is None:
+            burnupIssues = self._getWorklogsPerIssue(issues)
+
+        return [burnupIssues[issue['id']].createdBetween(timestamp_to_seconds(sprintStart), timestamp_to_seconds(sprintEnd))
+                for issue in issues]
+
+    def useWorklogFeed(self, sprintStart, updatedSince):
+        ''' The worklog updated feed covers all issues in Jira, so it is
+            only cheaper than requesting worklogs per issue for a full
+            refresh of a sprint that started recently.
+        '''
+        return updatedSince is None and dt.datetime.now(dt.timezone.utc) - sprintStart < self.worklogFeedMaxAge
+
+    def setConnectionData(self, url, username, password, burnupIssueQuery):
+        connectionChanged = (url, (username, password)) != (self.url, self.auth)
+
+        self.url = url
+        self.auth = (username, password)
+        self.burnupIssueQuery = burnupIssueQuery
+
+        if connectionChanged:
+            self._createSession()
+
+class Jira6(JiraRest):
+
+    def __init__(self, url, username, burnupIssueQuery, readFromFile = False, writeToFile = False,
+                 pageSize = 1000, maxParallelPages = 4, poolSize = 10, responseCache = None, streamResponses = False,
+                 scheduler = None):
+        super().__init__(url, username, burnupIssueQuery, readFromFile = readFromFile, writeToFile = writeToFile,
+                         pageSize = pageSize, maxParallelPages = maxParallelPages, poolSize = poolSize,
+                         responseCache = responseCache, streamResponses = streamResponses, scheduler = scheduler)
+
+    def setAuth(self, auth):
+        self.auth = auth
+        self.session.auth = auth
+
+    def getScrumBoards(self):
+        jsonData = self._get('rest/greenhopper/1.0/xboard/selectorData', 'jira6/getScrumBoards.json')
+
+        boards = {}
+        for board in jsonData['rapidViews']:
+            if board['sprintSupportEnabled']:
+                boards[board['id']] = board['name']
+
+        return boards
+
+    def getSprints(self, boardId):
+        sprints = {}
+        for sprint in self._getPaged('rest/greenhopper/1.0/sprintquery/%s' % boardId, 'jira6/getSprints.json', 'sprints'):
+            sprints[sprint['id']] = sprint
+
+        return sprints
+
+    def getSprintDates(self, boardId, sprintId):
+        jsonData = self._get('rest/greenhopper/1.0/rapid/charts/sprintreport', 'jira6/getSprintDates.json', params = {
+                'rapidViewId' : boardId,
+                'sprintId' : sprintId
+            })
+
+        return getSprintDatesFromSprintReport(jsonData)
+
+    def getKanbanBoards(self):
+        jsonData = self._get('rest/greenhopper/1.0/xboard/selectorData', 'jira6/getKanbanBoards.json')
+
+        boards = {}
+        for view in jsonData['rapidViews']:
+            if view['sprintSupportEnabled']:
+                boards[view['id']] = view['name']
+
+        return boards
+
+    def getIssues(self, boardId, sprintId, updatedSince = None):
+        jql = 'issuetype = Sub-task and sprint = %s' % sprintId
+        if updatedSince:
+            jql += ' and updated >= %s' % timestamp_to_jqltimestamp(updatedSince)
+
+        return [records.SubTask.fromJson(issue) for issue in self._getPaged('rest/api/2/search', 'jira6/getIssues.json', 'issues', params = {
+                'jql' : jql,
+                'fields' : 'timetracking,resolutiondate'
+            })]
+
+    def getEffortForIssues(self, boardId, issueNames):
+        if not issueNames:
+            return {}
+
+        return getEffortFromIssues(self._getPaged('rest/api/2/search', 'jira6/getEffortForIssues.json', 'issues', params = {
+                'jql' : 'issuekey in (%s)' % ','.join(issueNames),
+                'fields' : 'timetracking'
+            }))
+
+    def getScopeChangeBurndownChart(self, rapidViewId, sprintId):
+        jsonData = self._get('rest/greenhopper/1.0/rapid/charts/scopechangeburndownchart', 'jira6/getScopeChangeBurndownChart.json', params = {
+                'rapidViewId' : rapidViewId,
+                'sprintId' : sprintId
+            })
+
+        return jsonData
+
+    def getIssueWorklogs(self, sprintStart, sprintEnd, updatedSince = None):
+        issues = list(self._getPaged('rest/api/2/search', 'jira6/getIssueWorklogs.json', 'issues', params = {
+                'jql' : getBurnupIssueJql(sprintStart, sprintEnd, updatedSince, self.burnupIssueQuery),
+                'fields' : 'updated'
+            }))
+
+        return self._addWorklogs(issues, sprintStart, sprintEnd, self.useWorklogFeed(sprintStart, updatedSince))
+
+class Jira7(JiraRest):
+
+    def __init__(self, url, username, burnupIssueQuery, readFromFile = False, writeToFile = False,
+                 pageSize = 1000, maxParallelPages = 4, poolSize = 10, responseCache = None, streamResponses = False,
+                 scheduler = None):
+        super().__init__(url, username, burnupIssueQuery, readFromFile = readFromFile, writeToFile = writeToFile,
+                         pageSize = pageSize, maxParallelPages = maxParallelPages, poolSize = poolSize,
+                         responseCache = responseCache, streamResponses = streamResponses, scheduler = scheduler)
+
+    def setAuth(self, auth):
+        self.auth = auth
+        self.session.auth = auth
+
+    def getScrumBoards(self):
+        boards = {}
+        for board in self._getPaged('rest/agile/1.0/board', 'jira7/getScrumBoards.json', 'values', params = {
+                'type' : 'scrum'
+            }):
+            boards[board['id']] = board['name']
+
+        return boards
+
+    def getSprints(self, boardId):
+        sprints = {}
+        for sprint in self._getPaged('rest/agile/1.0/board/%s/sprint' % boardId, 'jira7/getSprints.json', 'values'):
+            sprints[sprint['id']] = sprint
+
+        return sprints
+
+    def getSprintDates(self, boardId, sprintId):
+        from dateutil import parser
+
+        # TODO: get sprint information from jira
+        sprintStart = parser.parse(sprints[sprintId]['startDate'])
+        sprintEnd = parser.parse(sprints[sprintId]['endDate'])
+
+        return sprintStart, sprintEnd
+
+
+    def getKanbanBoards(self):
+        boards = {}
+        for board in self._getPaged('rest/agile/1.0/board', 'jira7/getKanbanBoards.json', 'values', params = {
+                'type' : 'kanban'
+            }):
+            boards[board['id']] = board['name']
+
+        return boards
+
+    def getIssues(self, boardId, sprintId, updatedSince = None):
+        jql = 'issuetype = Sub-task'
+        if updatedSince:
+            jql += ' and updated >= %s' % timestamp_to_jqltimestamp(updatedSince)
+
+        return [records.SubTask.fromJson(issue) for issue in self._getPaged('rest/agile/1.0/board/%s/sprint/%s/issue' % (boardId, sprintId), 'jira7/getIssues.json', 'issues', params = {
+                'jql' : jql,
+                'fields' : 'timetracking,resolutiondate'
+            })]
+
+    def getEffortForIssues(self, boardId, issueNames):
+        return getEffortFromIssues(self._getPaged('rest/agile/1.0/board/%s/issue' % boardId, 'jira7/getEffortForIssues.json', 'issues', params = {
+                'jql' : 'issuekey in (%s)' % ','.join(issueNames),
+                'fields' : 'timetracking'
+            }))
+
+    def getIssueWorklogs(self, boardId, sprintStart, sprintEnd, updatedSince = None):
+        jql = 'worklogDate >= %s and worklogDate <= %s and issuetype = Support' % (sprintStart, sprintEnd)
+        if updatedSince:
+            jql += ' and updated >= %s' % timestamp_to_jqltimestamp(updatedSince)
+
+        issues = list(self._getPaged('rest/agile/1.0/board/%s/issue' % boardId, 'jira7/getIssueWorklogs.json', 'issues', params = {
+                'jql' : jql,
+                'fields' : 'updated'
+            }))
+
+        return self._addWorklogs(issues, sprintStart, sprintEnd, self.useWorklogFeed(sprintStart, updatedSince))
+
+class RetainedIssues():
+    ''' RetainedIssues keeps the issues returned by a query during the
+        previous refresh, so that the next refresh only has to request the
+        issues that were updated since then. Every fullRefreshInterval all
+        issues are requested again to catch changes that do not show up as
+        updates, such as an issue no longer matching the query.
+        If an IssueStore is given, the issues are also kept in it under the
+        given kind and name, so the next RetainedIssues for the same query
+        can continue where this one left off, even after a restart.
+    '''
+
+    # Requests for updated issues overlap with the previous refresh by this
+    # much to allow for clock differences with the server and for JQL
+    # timestamps only having a resolution of minutes.
+    overlap = dt.timedelta(minutes = 5)
+
+    def __init__(self, fullRefreshInterval = dt.timedelta(hours = 1), store = None, kind = None, name = None):
+        self.fullRefreshInterval = fullRefreshInterval
+        self.store = store
+        self.kind = kind
+        self.name = name
+        self.issues = {}
+        self.lastRefresh = None
+        self.lastFullRefresh = None
+
+    def _loadFromStore(self):
+        stored = self.store.load(self.kind, self.name)
+        if stored:
+            issues, lastRefresh, lastFullRefresh = stored
+            localzone = jiratime.getLocalZone()
+            self.issues = dict((issue.key, issue) for issue in issues)
+            self.lastRefresh = lastRefresh.astimezone(localzone)
+            self.lastFullRefresh = lastFullRefresh.astimezone(localzone)
+
+    def refresh(self, fetch):
+        ''' Calls fetch(updatedSince) to request either all issues (when
+            updatedSince is None) or only the updated ones, merges them
+            into the retained issues and returns all retained issues.
+        '''
+        now, updatedSince = self.beginRefresh()
+        return self.endRefresh(now, updatedSince, fetch(updatedSince))
+
+    def beginRefresh(self):
+        ''' Returns the time of a refresh that starts now and the time since
+            which updated issues must be requested for it, or None if all
+            issues must be requested. The retained issues do not change
+            until the refresh is ended with endRefresh.
+        '''
+        now = dt.datetime.now(jiratime.getLocalZone())
+
+        if self.lastRefresh is None and self.store:
+            self._loadFromStore()
+
+        if self.lastRefresh is None or now - self.lastFullRefresh > self.fullRefreshInterval:
+            return now, None
+        else:
+            return now, self.lastRefresh - self.overlap
+
+    def endRefresh(self, now, updatedSince, updatedIssues):
+        ''' Merges the issues requested for a refresh started with
+            beginRefresh into the retained issues and returns all of them.
+        '''
+        fullRefresh = updatedSince is None
+        if fullRefresh:
+            self.issues = dict((issue.key, issue) for issue in updatedIssues)
+            self.lastFullRefresh = now
+        else:
+            log('Merging %d updated issues into %d retained issues' % (len(updatedIssues), len(self.issues)))
+            for issue in updatedIssues:
+                self.issues[issue.key] = issue
+
+        self.lastRefresh = now
+
+        if self.store:
+            self.store.save(self.kind, self.name, updatedIssues, self.lastRefresh, self.lastFullRefresh, replace = fullRefresh)
+
+        return self.getIssues()
+
+    def discard(self, issueNames):
+        discarded = [issueName for issueName in issueNames if self.issues.pop(issueName, None)]
+        if self.store and discarded:
+            self.store.discard(self.kind, self.name, discarded)
+
+    def getIssues(self):
+        return list(self.issues.values())
+
+class Series():
+    ''' Series holds the points of a line in the chart in two arrays: x
+        holds int64 seconds since the epoch and y holds float64 values.
+        Series of tick positions carry a label for each point in labels.
+    '''
+    def __init__(self, x, y, labels = None):
+        self.x = np.asarray(x, dtype = np.int64)
+        self.y = np.asarray(y, dtype = np.float64)
+        self.labels = labels
+
+    @classmethod
+    def fromPoints(cls, points):
+        return cls([timestamp_to_seconds(x) for x, _ in points], [y for _, y in points])
+
+    def __len__(self):
+        return len(self.x)
+
+    def segments(self, connected):
+        ''' Returns the series as horizontal steps from each point to the
+            next. If connected is False the vertical parts are left out by
+            separating the steps with NaN values.
+        '''
+        if len(self.x) < 2:
+            return Series(self.x, self.y)
+
+        if connected:
+            return Series(np.repeat(self.x, 2)[1:], np.repeat(self.y, 2)[:-1])
+
+        # Each point is followed by the end of its step and a NaN
+        x = np.empty(3 * len(self.x) - 2, dtype = np.int64)
+        y = np.empty(3 * len(self.x) - 2, dtype = np.float64)
+        x[0::3] = self.x
+        x[1::3] = self.x[1:]
+        x[2::3] = self.x[1:]
+        y[0::3] = self.y
+        y[1::3] = self.y[:-1]
+        y[2::3] = np.nan
+        return Series(x, y)
+
+def getZeroData(sprintStart, sprintEnd):
+    return Series.fromPoints([[sprintStart, 0], [sprintEnd, 0]])
+
+def parseBurndownTimestamp(ts):
+    localzone = jiratime.getLocalZone()
+    naive = dt.datetime.fromtimestamp(int(ts) / 1000, tz = dt.timezone.utc).replace(tzinfo = None)
+    return localzone.localize(naive)
+
+def getCurrentTimeFromBurndown(scopeChangeBurndownChart):
+    return parseBurndownTimestamp(scopeChangeBurndownChart['now'])
+
+def getScopeChangingIssues(sprintStart, sprintEnd, scopeChangeBurndownChart):
+    ''' Returns the names of all issues that changed the sprint scope and
+        ScopeChanges of the issues added or removed before the start of the
+        sprint ('initial') and during the sprint ('changes').
+    '''
+    initialScope = ([], [], [])
+    scopeChanges = ([], [], [])
+
+    tmpSet = set()
+    issueNames = []
+    alreadyDone = set()
+
+    timestamps = dict((timestamp, timestamp_to_seconds(parseBurndownTimestamp(timestamp))) for timestamp in scopeChangeBurndownChart['changes'])
+    sprintStartSeconds = timestamp_to_seconds(sprintStart)
+    sprintEndSeconds = timestamp_to_seconds(sprintEnd)
+
+    for timestamp, changelist in scopeChangeBurndownChart['changes'].items():
+        timestamp = timestamps[timestamp]
+
+        for change in changelist:
+            if ('column' in change and
+                'done' in change['column'] and
+                timestamp <= sprintStartSeconds):
+                alreadyDone.add(change['key'])
+
+    for timestamp, changelist in scopeChangeBurndownChart['changes'].items():
+        timestamp = timestamps[timestamp]
+
+        for change in changelist:
+            # Skip parent issues
+            if not scopeChangeBurndownChart['issueToParentKeys'][change['key']]:
+                continue
+
+            # Skip changes that are not sprint scope changes
+            if 'added' not in change:
+                continue
+
+            # Ignore issues that were already completed before the sprint had started
+            if change['key'] in alreadyDone:
+                continue
+
+            # Choose whether to add it to the initialScope or to the scopeChanges
+            if timestamp <= sprintStartSeconds:
+                columns = initialScope
+            elif timestamp <= sprintEndSeconds:
+                columns = scopeChanges
+            else:
+                columns = None
+
+            if columns is not None:
+                columns[0].append(timestamp)
+                columns[1].append(change['added'])
+                columns[2].append(change['key'])
+
+            if change['key'] not in tmpSet:
+                tmpSet.add(change['key'])
+                issueNames.append(change['key']);
+
+    return { 'names' : issueNames,
+             'initial' : records.ScopeChanges(*initialScope),
+             'changes' : records.ScopeChanges(*scopeChanges) }
+
+def getIssuesRemovedFromSprint(scopeChangeBurndownChart):
+    ''' Returns the names of issues whose most recent sprint scope change
+        removed them from the sprint.
+    '''
+    inSprint = {}
+
+    for timestamp in sorted(scopeChangeBurndownChart['changes'], key = int):
+        for change in scopeChangeBurndownChart['changes'][timestamp]:
+            if 'added' in change:
+                inSprint[change['key']] = change['added']
+
+    return set(issueName for issueName, added in inSprint.items() if not added)
+
+def getInitialScope(initialIssues, effortForIssues):
+    initialScope = 0
+
+    log('Calculating initial sprint scope')
+
+    for issueName in initialIssues.issueNames:
+        effort = effortForIssues[issueName] / 3600
+        initialScope += effort;
+        if logging:
+            log("  adding %s: %.2f hours" % (issueName, effort))
+
+    log("  Initial sprint scope is %.2f hours" % initialScope)
+
+    return initialScope
+
+def calculateScopeChanges(sprintStart, sprintEnd, scopeChangingIssues, effortForIssues):
+    log('Calculating sprint scope changes')
+
+    timestamps = scopeChangingIssues.timestamps.astype(np.int64)
+    efforts = np.array([effortForIssues[issueName] for issueName in scopeChangingIssues.issueNames], dtype = np.float64) / 3600
+
+    if logging:
+        for issueName, added, effort, timestamp in zip(scopeChangingIssues.issueNames, scopeChangingIssues.added,
+                                                       efforts, scopeChangingIssues.timestamps):
+            log('  %s %s: %.2f hours at %s' % ('added' if added else 'removed', issueName, effort, seconds_to_timestamp(timestamp)))
+
+    efforts[~scopeChangingIssues.added] *= -1
+
+    scope = np.cumsum(efforts)
+    finalScope = scope[-1] if len(scope) else 0
+
+    log('  Overall scope change: %.2f hours' % finalScope)
+
+    return Series(np.concatenate(([timestamp_to_seconds(sprintStart)], timestamps, [timestamp_to_seconds(sprintEnd)])),
+                  np.concatenate(([0], scope, [finalScope])))
+
+def getSprintScopeLine(data):
+    endScope = data.y[-1]
+    return Series(data.x, endScope - data.y).segments(True)
+
+def getIdealBurndown(sprintStart, sprintEnd, finalSprintScope):
+    return Series.fromPoints([ [sprintStart, finalSprintScope], [sprintEnd, 0] ])
+
+def getIdealBurndownValueAtTimestamp(ts, idealBurndownData):
+    startTimestamp = idealBurndownData.x[0]
+    endTimestamp = idealBurndownData.x[-1]
+    finalSprintScope = idealBurndownData.y[0]
+    return (endTimestamp - ts) / (endTimestamp - startTimestamp) * finalSprintScope
+
+def getActualBurndown(sprintStart, sprintEnd, currentTime, finalSprintScope, issues):
+    log('Calculating actual burndown')
+
+    resolvedIssues = [issue for issue in issues if issue.resolved is not None]
+    resolutionTimes = np.fromiter((issue.resolved for issue in resolvedIssues), dtype = np.float64, count = len(resolvedIssues))
+    completedEfforts = np.fromiter((issue.estimate for issue in resolvedIssues), dtype = np.float64, count = len(resolvedIssues)) / 3600
+
+    inSprint = np.flatnonzero((resolutionTimes >= timestamp_to_seconds(sprintStart)) &
+                              (resolutionTimes <= timestamp_to_seconds(sprintEnd)))
+    inSprint = inSprint[np.argsort(resolutionTimes[inSprint], kind = 'stable')]
+
+    if logging:
+        for i in inSprint:
+            log('  completed %s: %.2f hours at %s' % (resolvedIssues[i].key, completedEfforts[i], seconds_to_timestamp(resolutionTimes[i])))
+
+    resolutionTimes = resolutionTimes[inSprint]
+    remainingSprintEffort = finalSprintScope - np.cumsum(completedEfforts[inSprint])
+    finalRemainingSprintEffort = remainingSprintEffort[-1] if len(remainingSprintEffort) else finalSprintScope
+
+    log('  Overall effort completed: %.2f hours' % (finalSprintScope - finalRemainingSprintEffort))
+
+    lastDate = currentTime if currentTime < sprintEnd else sprintEnd
+
+    return Series(np.concatenate(([timestamp_to_seconds(sprintStart)], resolutionTimes, [timestamp_to_seconds(lastDate)])),
+                  np.concatenate(([finalSprintScope], remainingSprintEffort, [finalRemainingSprintEffort])))
+
+def createDayLabels(workCalendar):
+    days = workCalendar.getWorkingDays(hour = 12)
+    return Series([timestamp_to_seconds(day) for day in days], np.zeros(len(days)), [day.strftime('%a') for day in days])
+
+def createDayLines(workCalendar):
+    days = workCalendar.getWorkingDays()
+    return Series([timestamp_to_seconds(day) for day in days], np.zeros(len(days)))
+
+def calculateActualBurnup(sprintStart, sprintEnd, currentTime, issueWorklogs, burnupBudget, pointsPerHour):
+    log('Calculating support burnup')
+
+    createdTimes = np.concatenate([issue.created for issue in issueWorklogs] + [np.empty(0)])
+    timesSpent = np.concatenate([issue.timeSpent for issue in issueWorklogs] + [np.empty(0)])
+
+    inSprint = (createdTimes >= timestamp_to_seconds(sprintStart)) & (createdTimes <= timestamp_to_seconds(sprintEnd))
+
+    if logging:
+        keys = (issue.key for issue in issueWorklogs for _ in range(len(issue.created)))
+        for key, added, timeSpent in zip(keys, inSprint, timesSpent):
+            log('  %s %s: %.2f hours' % ('adding' if added else 'skipping', key, timeSpent / 3600))
+
+    log('  Added a total of %.2f hours from worklogs' % (timesSpent[inSprint].sum() / 3600))
+    log('  Skipped a total of %.2f hours from worklogs' % (timesSpent[~inSprint].sum() / 3600))
+
+    createdTimes = createdTimes[inSprint]
+    order = np.argsort(createdTimes, kind = 'stable')
+    totalTimeSpent = np.cumsum(timesSpent[inSprint][order])
+    burnup = ((totalTimeSpent / 3600) - burnupBudget) * pointsPerHour
+    finalBurnup = burnup[-1] if len(burnup) else -burnupBudget * pointsPerHour
+
+    lastDate = currentTime if currentTime < sprintEnd else sprintEnd
+
+    return Series(np.concatenate(([timestamp_to_seconds(sprintStart)], createdTimes[order], [timestamp_to_seconds(lastDate)])),
+                  np.concatenate(([-burnupBudget * pointsPerHour], burnup, [finalBurnup])))
+
+# This function is a bit different because it calculates data from a line
+# from which the non-working days have already been removed. This makes it easier to
+# calculate the slope of the projected burnup.
+def calculateProjectedBurnup(zeroData, actualBurnupData):
+    burnupStart = actualBurnupData.x[0]
+    burnupStartHeight = actualBurnupData.y[0]
+    burnupEnd = actualBurnupData.x[-1]
+    burnupEndHeight = actualBurnupData.y[-1]
+
+    sprintStart = zeroData.x[0]
+    sprintEnd = zeroData.x[-1]
+
+    # Before any work time has passed, e.g. in the weekend before a sprint
+    # that starts on a Saturday, there is no rate to project, so the burnup
+    # is projected to stay where it is
+    if burnupEnd == burnupStart:
+        projectedBurnupHeight = burnupEndHeight
+    else:
+        projectedBurnupHeight = ((burnupEndHeight - burnupStartHeight) / (burnupEnd - burnupStart)) * (sprintEnd - sprintStart) + burnupStartHeight
+
+    return Series([burnupEnd, sprintEnd], [burnupEndHeight, projectedBurnupHeight])
+
+def calculateIdealBurnup(sprintStart, sprintEnd, burnupBudget):
+    return Series.fromPoints([ [sprintStart, -burnupBudget], [sprintEnd, 0] ])
+
+def calculateExpectedBurndown(sprintStart, sprintEnd, finalSprintScope, projectedBurnupHeight):
+    if projectedBurnupHeight < 0:
+        return Series.fromPoints([ [sprintStart, finalSprintScope], [sprintEnd, projectedBurnupHeight] ])
+    else:
+        return Series([], [])
+
+class FetchPlan():
+    ''' FetchPlan runs a set of named requests concurrently, starting each
+        one as soon as the results of the requests it depends on are
+        available. The results of those requests are passed to it as
+        arguments, in the order in which the dependencies were given.
+        If timings are given, each request is measured as a stage named
+        after it.
+    '''
+    def __init__(self, timings = None):
+        self.tasks = {}
+        self.timings = timings
+
+    def add(self, name, function, *dependencies):
+        self.tasks[name] = (function, dependencies)
+
+    def _run(self, name, function, args):
+        requestscheduler.checkCancelled()
+        with instrumentation.stage(self.timings, 'fetch %s' % name):
+            return function(*args)
+
+    def run(self):
+        results = {}
+        running = {}
+        waiting = dict(self.tasks)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers = max(1, len(self.tasks))) as executor:
+            while waiting or running:
+                for name, (function, dependencies) in list(waiting.items()):
+                    if all(dependency in results for dependency in dependencies):
+                        future = instrumentation.submit(executor, self._run, name, function,
+                                                        [results[dependency] for dependency in dependencies])
+                        running[future] = name
+                        del waiting[name]
+
+                if not running:
+                    raise RuntimeError('Unresolvable dependencies in fetch plan: %s' % ', '.join(waiting))
+
+                done, _ = concurrent.futures.wait(running, return_when = concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+
+        return results
+
+class SprintData():
+    ''' SprintData holds the result of fetchSprintData: everything that was
+        requested from Jira for a sprint. It does not depend on the
+        availability and burnup budget, so charts for other values of those
+        can be calculated from it without contacting Jira again.
+    '''
+    pass
+
+class ChartData():
+    ''' ChartData holds the result of calculateChart: all series that
+        make up a chart, with non-working days already removed, and the values
+        needed to scale and annotate the plot.
+    '''
+    pass
+
+def fetchSprintData(jira, boardId, sprintId, retainedIssues = None, issueStore = None, timings = None):
+    ''' Requests the data needed for the chart of a sprint from Jira. If a
+        dict is passed in retainedIssues, the issues requested are kept in
+        it, so that calling this function again for the same sprint only
+        requests the issues that were updated in the meantime. If an
+        IssueStore is passed as well, the issues are also kept on disk, so
+        the same applies to sprints that were requested before. If Timings
+        are passed, the requests are measured in them and they are kept in
+        the returned SprintData.
+    '''
+    if retainedIssues is None:
+        retainedIssues = {}
+
+    sprintIssues = retainedIssues.setdefault(('issues', boardId, sprintId),
+                                             RetainedIssues(store = issueStore, kind = 'sprint', name = sprintId))
+
+    def getIssueWorklogs(sprintDates):
+        sprintStart, sprintEnd = sprintDates
+        query = '%s|%s|%s' % (sprintStart.isoformat(), sprintEnd.isoformat(), jira.burnupIssueQuery)
+        burnupIssues = retainedIssues.setdefault(('worklogs', query),
+                                                 RetainedIssues(store = issueStore, kind = 'burnup', name = query))
+        return burnupIssues.refresh(lambda updatedSince: jira.getIssueWorklogs(sprintStart, sprintEnd, updatedSince))
+
+    #
+    # Gather all data
+    #
+    # Only the worklogs depend on the sprint dates and only the effort
+    # depends on the scope change chart, so everything else is requested
+    # at the same time.
+    #
+    plan = FetchPlan(timings)
+    plan.add('sprintDates', lambda: jira.getSprintDates(boardId, sprintId))
+    plan.add('scopeChangeBurndownChart', lambda: jira.getScopeChangeBurndownChart(boardId, sprintId))
+    plan.add('issues', lambda: sprintIssues.refresh(lambda updatedSince: jira.getIssues(boardId, sprintId, updatedSince)))
+    plan.add('issueWorklogs', getIssueWorklogs, 'sprintDates')
+    plan.add('scopeChangingIssues', lambda sprintDates, scopeChangeBurndownChart: getScopeChangingIssues(*sprintDates, scopeChangeBurndownChart),
+             'sprintDates', 'scopeChangeBurndownChart')
+    plan.add('effortForIssues', lambda scopeChangingIssues: jira.getEffortForIssues(boardId, scopeChangingIssues['names']),
+             'scopeChangingIssues')
+    with instrumentation.stage(timings, 'fetch'):
+        fetched = plan.run()
+
+    return createSprintData(boardId, sprintId, fetched, sprintIssues, timings)
+
+def createSprintData(boardId, sprintId, fetched, sprintIssues, timings = None):
+    ''' Returns the SprintData of a sprint from the results of the requests
+        for it by name and the RetainedIssues of the sprint.
+    '''
+    sprintData = SprintData()
+    sprintData.boardId = boardId
+    sprintData.sprintId = sprintId
+    sprintData.fetchedAt = time.time()
+    sprintData.timings = timings
+    sprintData.sprintStart, sprintData.sprintEnd = fetched['sprintDates']
+    sprintData.scopeChangeBurndownChart = fetched['scopeChangeBurndownChart']
+    sprintData.scopeChangingIssues = fetched['scopeChangingIssues']
+    sprintData.effortForIssues = fetched['effortForIssues']
+    sprintData.issueWorklogs = fetched['issueWorklogs']
+
+    # Issues that were removed from the sprint are no longer returned,
+    # so they would linger among the retained issues without this.
+    sprintIssues.discard(getIssuesRemovedFromSprint(sprintData.scopeChangeBurndownChart))
+    sprintData.issues = sprintIssues.getIssues()
+
+    return sprintData
+
+def calculateChart(sprintData, burnupBudget, availability, nonWorkingDays = (5, 6), holidays = (), timings = None):
+    ''' Calculates the chart for a sprint from the data returned by
+        fetchSprintData. The days of the week in nonWorkingDays and the
+        dates in holidays are left out of the chart. If Timings are passed,
+        leaving them out is measured in them as the nonWorkingTime stage.
+    '''
+    sprintStart = sprintData.sprintStart
+    sprintEnd = sprintData.sprintEnd
+
+    log("Sprint start is %s" % sprintStart)
+    log("Sprint end   is %s" % sprintEnd)
+
+    workCalendar = workcalendar.WorkCalendar(sprintStart, sprintEnd, nonWorkingDays, holidays)
+
+    zeroData = getZeroData(sprintStart, sprintEnd)
+    axisData = createDayLabels(workCalendar)
+    gridData = createDayLines(workCalendar)
+
+
+    # Burndown
+    scopeChangingIssues = sprintData.scopeChangingIssues
+    currentTime = getCurrentTimeFromBurndown(sprintData.scopeChangeBurndownChart)
+    effortForIssues = sprintData.effortForIssues
+
+    initialSprintScope = getInitialScope(scopeChangingIssues['initial'], effortForIssues)
+    sprintScopeData = calculateScopeChanges(sprintStart, sprintEnd, scopeChangingIssues['changes'], effortForIssues)
+
+    finalSprintScope = initialSprintScope + sprintScopeData.y[-1]
+
+    idealBurndownData = getIdealBurndown(sprintStart, sprintEnd, finalSprintScope)
+
+    actualBurndownData = getActualBurndown(sprintStart, sprintEnd, currentTime, finalSprintScope, sprintData.issues)
+
+
+    # Burnup
+
+    try:
+        pointsPerHour = initialSprintScope / (availability - burnupBudget)
+    except ZeroDivisionError:
+        pointsPerHour = 0
+
+    actualBurnupData = calculateActualBurnup(sprintStart, sprintEnd, currentTime, sprintData.issueWorklogs, burnupBudget, pointsPerHour)
+
+    idealBurnupData = calculateIdealBurnup(sprintStart, sprintEnd, burnupBudget * pointsPerHour)
+
+
+
+    # 
+    # Remove all non-working days
+    #
+    with instrumentation.stage(timings, 'nonWorkingTime'):
+        workCalendar.removeNonWorkingTime(zeroData, sprintScopeData, idealBurndownData, actualBurndownData,
+                                          axisData, gridData, actualBurnupData, idealBurnupData)
+
+    projectedBurnupData = calculateProjectedBurnup(zeroData, actualBurnupData)
+
+    projectedBurnupHeight = projectedBurnupData.y[-1]
+    expectedBurndownData = calculateExpectedBurndown(sprintStart, sprintEnd, finalSprintScope, projectedBurnupHeight)
+    with instrumentation.stage(timings, 'nonWorkingTime'):
+        workCalendar.removeNonWorkingTime(expectedBurndownData)
+
+    chartData = ChartData()
+    chartData.burnupBudget = burnupBudget
+    chartData.pointsPerHour = pointsPerHour
+    chartData.finalSprintScope = finalSprintScope
+    chartData.projectedBurnupHeight = projectedBurnupHeight
+    chartData.zeroData = zeroData
+    chartData.axisData = axisData
+    chartData.gridData = gridData
+    chartData.sprintScopeData = sprintScopeData
+    chartData.idealBurndownData = idealBurndownData
+    chartData.actualBurndownData = actualBurndownData
+    chartData.idealBurnupData = idealBurnupData
+    chartData.actualBurnupData = actualBurnupData
+    chartData.projectedBurnupData = projectedBurnupData
+    chartData.expectedBurndownData = expectedBurndownData
+
+    return chartData
+
+def calculateChartData(jira, boardId, sprintId, burnupBudget, availability, retainedIssues = None, issueStore = None,
+                       nonWorkingDays = (5, 6), holidays = (), timings = None):
+    ''' Requests the data for a sprint from Jira and calculates the chart
+        for it. See fetchSprintData and calculateChart for the arguments.
+        The calculation is measured in timings as the compute stage.
+    '''
+    sprintData = fetchSprintData(jira, boardId, sprintId, retainedIssues, issueStore, timings)
+    with instrumentation.stage(timings, 'compute'):
+        return calculateChart(sprintData, burnupBudget, availability, nonWorkingDays, holidays, timings)
+
+class SprintSummary():
+    ''' SprintSummary holds the figures of one sprint that are shown in the
+        velocity history: the scope committed to at the start, the part of
+        the final scope that was completed, the scope added and removed
+        during the sprint and the hours logged on burnup issues.
+    '''
+    fields = ['name', 'committed', 'completed', 'scopeAdded', 'scopeRemoved', 'hoursSpent']
+
+    def __init__(self, sprintId, closed, **values):
+        self.sprintId = sprintId
+        self.closed = closed
+        for field in self.fields:
+            setattr(self, field, values[field])
+
+    def toDict(self):
+        return dict((field, getattr(self, field)) for field in self.fields)
+
+def getHoursSpent(sprintStart, sprintEnd, issueWorklogs):
+    createdTimes = np.concatenate([issue.created for issue in issueWorklogs] + [np.empty(0)])
+    timesSpent = np.concatenate([issue.timeSpent for issue in issueWorklogs] + [np.empty(0)])
+
+    inSprint = (createdTimes >= timestamp_to_seconds(sprintStart)) & (createdTimes <= timestamp_to_seconds(sprintEnd))
+    return float(timesSpent[inSprint].sum()) / 3600
+
+def summarizeSprint(sprintData, name, closed):
+    sprintStart = sprintData.sprintStart
+    sprintEnd = sprintData.sprintEnd
+    scopeChangingIssues = sprintData.scopeChangingIssues
+    currentTime = getCurrentTimeFromBurndown(sprintData.scopeChangeBurndownChart)
+
+    committed = getInitialScope(scopeChangingIssues['initial'], sprintData.effortForIssues)
+    scopeChanges = np.diff(calculateScopeChanges(sprintStart, sprintEnd, scopeChangingIssues['changes'], sprintData.effortForIssues).y)
+    finalSprintScope = committed + scopeChanges.sum()
+    actualBurndownData = getActualBurndown(sprintStart, sprintEnd, currentTime, finalSprintScope, sprintData.issues)
+
+    return SprintSummary(sprintData.sprintId, closed,
+                         name = name,
+                         committed = committed,
+                         completed = float(finalSprintScope - actualBurndownData.y[-1]),
+                         scopeAdded = float(scopeChanges[scopeChanges > 0].sum()),
+                         scopeRemoved = float(-scopeChanges[scopeChanges < 0].sum()),
+                         hoursSpent = getHoursSpent(sprintStart, sprintEnd, sprintData.issueWorklogs))
+
+def getVelocityHistory(jira, boardId, count, issueStore = None, maxWorkers = 4):
+    ''' Returns SprintSummaries of the last count sprints of a board that
+        have started, oldest first. The sprints are requested and summarized
+        concurrently by up to maxWorkers threads. If an IssueStore is given,
+        the summaries of closed sprints are kept in it and never calculated
+        again.
+    '''
+    sprints = jira.getSprints(boardId)
+    sprintIds = sorted(sprintId for sprintId, sprint in sprints.items()
+                       if sprint.get('state', '').lower() != 'future')[-count:]
+
+    def isClosed(sprintId):
+        return sprints[sprintId].get('state', '').lower() == 'closed'
+
+    stored = issueStore.getSprintSummaries(sprintIds, jira.burnupIssueQuery) if issueStore and sprintIds else {}
+    summaries = dict((sprintId, SprintSummary(sprintId, True, **stored[sprintId]))
+                     for sprintId in sprintIds if sprintId in stored and isClosed(sprintId))
+
+    def summarize(sprintId):
+        sprintData = fetchSprintData(jira, boardId, sprintId, {}, issueStore)
+        return summarizeSprint(sprintData, sprints[sprintId]['name'], isClosed(sprintId))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = maxWorkers) as executor:
+        futures = [instrumentation.submit(executor, summarize, sprintId) for sprintId in sprintIds if sprintId not in summaries]
+        for future in futures:
+            summary = future.result()
+            summaries[summary.sprintId] = summary
+            if issueStore and summary.closed:
+                issueStore.saveSprintSummary(summary.sprintId, jira.burnupIssueQuery, summary.toDict())
+
+    return [summaries[sprintId] for sprintId in sprintIds]
+
+class HoursManager():
+    ''' HoursManager maintains the availability and burnupBudget associated
+        with each sprint.
+    '''
+    def __init__(self, hours):
+        self.hours = copy.deepcopy(hours)
+
+    def getHours(self, boardId, sprintId):
+        if boardId not in self.hours:
+            self.hours[boardId] = {}
+
+        if sprintId not in self.hours[boardId]:
+            self.hours[boardId][sprintId] = (0, 0)
+
+        return self.hours[boardId][sprintId]
+
+    def findBurnupBudget(self, boardId, sprintId):
+        ''' Returns the burnupBudget of a sprint or None if it has not been
+            set, without adding the sprint like getHours does
+        '''
+        _, burnupBudget = self.hours.get(boardId, {}).get(sprintId, (0, 0))
+        return burnupBudget or None
+
+    def setAvailability(self, boardId, sprintId, availability):
+        _, old_budget = self.getHours(boardId, sprintId)
+        self.hours[boardId][sprintId] = (availability, old_budget)
+
+    def setBurnupBudget(self, boardId, sprintId, burnupBudget):
+        old_avail, _ = self.getHours(boardId, sprintId)
+        self.hours[boardId][sprintId] = (old_avail, burnupBudget)
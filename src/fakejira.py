@@ -15,54 +15,302 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from http.server import SimpleHTTPRequestHandler
-from socketserver import TCPServer
+# Serves the responses of a Jira 6 server from memory, e.g.
+#
+#   python fakejira.py
+#   python fakejira.py --generate --subtasks 20000 --worklogs 200000
+#   python fakejira.py --generate --latency 200 --bandwidth 500 --error-rate 0.05
+#
+# The first serves the json files in the jira6 subdirectory. To get those
+# files run jiraburnupanddown against a real Jira instance with writeToFile
+# set to True or generate them with jiradataset.py. The second serves a
+# generated sprint without writing it to disk. The third also delays each
+# response by 200 ms, limits each response to 500 kB/s and fails 5% of the
+# requests.
+
+import argparse
+import bisect
+import fnmatch
+import glob
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
 import re
+import threading
+import time
 import urllib.parse as urlparse
 
+try:
+    from . import jiradataset
+    from . import jiratime
+except ImportError:
+    import jiradataset
+    import jiratime
+
 port = 8080
 jiraversion = 6
 
-class JiraRequestHandler(SimpleHTTPRequestHandler):
+# Resources of which the items stored under the given key are returned
+# page by page, like Jira does
+pagedItems = { 'getIssues.json' : 'issues',
+               'getEffortForIssues.json' : 'issues',
+               'getIssueWorklogs.json' : 'issues',
+               'getWorklogs-*.json' : 'worklogs' }
+
+# The number of worklogs Jira returns per page of the worklog updated feed
+feedPageSize = 1000
+
+def loadDataset(directory):
+    ''' Returns a dict from file name to the JSON data of all json files in directory '''
+    dataset = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        with open(path, 'rt') as f:
+            dataset[os.path.basename(path)] = json.load(f)
+    return dataset
+
+class FakeJira(ThreadingHTTPServer):
+    ''' FakeJira serves a dataset as returned by loadDataset or
+        jiradataset.generateDataset from memory, with each request handled in
+        a thread of its own. Search results and worklogs are split into
+        pages of at most maxResults items. Each response is delayed by
+        latency seconds plus a random part of jitter seconds and, if
+        bandwidth is given, sent at no more than bandwidth bytes per second.
+        A random errorRate part of the requests fail with errorStatus.
+    '''
+
+    daemon_threads = True
+
+    # Asynchronous clients open dozens of connections at once, which would
+    # overflow the default listen backlog of 5 and be retried a second later
+    request_queue_size = 128
+
+    def __init__(self, address, dataset, maxResults = 1000, latency = 0, jitter = 0, bandwidth = None,
+                 errorRate = 0, errorStatus = 503, useGzip = True, verbose = True):
+        super().__init__(address, JiraRequestHandler)
+
+        self.dataset = dataset
+        self.maxResults = maxResults
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.useGzip = useGzip
+        self.verbose = verbose
+
+        # Encoded responses by resource and page, so that every page is
+        # only serialized and compressed once
+        self.lock = threading.Lock()
+        self.responses = {}
+
+        # The worklog updated feed lists all worklogs by the time they were
+        # last updated
+        worklogs = [worklog for filename, data in dataset.items() if re.match(r'getWorklogs-.*\.json', filename)
+                            for worklog in data['worklogs']]
+        self.worklogsById = dict((int(worklog['id']), worklog) for worklog in worklogs)
+        feed = sorted((int(jiratime.parseJiraTimestamp(worklog['updated']) * 1000), int(worklog['id'])) for worklog in worklogs)
+        self.feedTimes = [updatedTime for updatedTime, _ in feed]
+        self.feedIds = [worklogId for _, worklogId in feed]
+
+    def getPage(self, filename, startAt, maxResults):
+        ''' Returns the body, the gzipped body and the ETag of a page of a
+            resource, or of the whole resource if it is not paged
+        '''
+        key = (filename, startAt, maxResults)
+        with self.lock:
+            if key in self.responses:
+                return self.responses[key]
+
+        data = self.dataset[filename]
+        itemsKey = next((itemsKey for pattern, itemsKey in pagedItems.items() if fnmatch.fnmatch(filename, pattern)), None)
+        if itemsKey:
+            maxResults = min(maxResults, self.maxResults)
+            data = dict(data, startAt = startAt, maxResults = maxResults, total = len(data[itemsKey]))
+            data[itemsKey] = data[itemsKey][startAt:startAt + maxResults]
+
+        body = json.dumps(data).encode('utf-8')
+        response = (body, gzip.compress(body, compresslevel = 6), '"%s"' % hashlib.md5(body).hexdigest())
+
+        with self.lock:
+            self.responses[key] = response
+        return response
+
+    def getUpdatedWorklogs(self, since):
+        ''' Returns a page of the worklog updated feed. All worklogs that were
+            updated at the same time end up on the same page, so the next
+            page can be requested from the last time on this page.
+        '''
+        start = bisect.bisect_right(self.feedTimes, since)
+        end = min(start + feedPageSize, len(self.feedTimes))
+        while end < len(self.feedTimes) and self.feedTimes[end] == self.feedTimes[end - 1]:
+            end += 1
+
+        return { 'values' : [ { 'worklogId' : worklogId, 'updatedTime' : updatedTime }
+                              for worklogId, updatedTime in zip(self.feedIds[start:end], self.feedTimes[start:end]) ],
+                 'since' : since,
+                 'until' : self.feedTimes[end - 1] if end > start else since,
+                 'lastPage' : end == len(self.feedTimes) }
+
+class JiraRequestHandler(BaseHTTPRequestHandler):
+
+    # Keep connections alive between requests, like Jira does. The headers
+    # and body are written separately, so Nagle's algorithm would hold
+    # back the body until the client acknowledges the headers.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    # To make this work, make sure that the data files named below are in the dataset
+    resources = [
+        (r'rest/greenhopper/1.0/xboard/selectorData', {}, 'getScrumBoards.json'),
+        (r'rest/greenhopper/1.0/sprintquery/[0-9]+', {}, 'getSprints.json'),
+        (r'rest/greenhopper/1.0/rapid/charts/sprintreport', {}, 'getSprintDates.json'),
+        (r'rest/api/2/search', { 'jql' : r'issuetype = Sub-task .*' }, 'getIssues.json'),
+        (r'rest/api/2/search', { 'jql' : r'issuekey in .*' }, 'getEffortForIssues.json'),
+        (r'rest/greenhopper/1.0/rapid/charts/scopechangeburndownchart', {}, 'getScopeChangeBurndownChart.json'),
+        (r'rest/api/2/search', { 'jql' : r'.*resolved >= .* or resolution = unresolved.*' }, 'getIssueWorklogs.json'),
+        (r'rest/api/2/issue/([^/]+)/worklog', {}, r'getWorklogs-\1.json')
+    ]
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
 
     def do_GET(self):
         o = urlparse.urlparse(self.path)
         query_components = urlparse.parse_qs(o.query)
 
-        # To make this work, make sure that the json files named below are stored in a jira6 subdirectory.
-        # To get those files run burnupdown.py against a real Jira instance with writeToFile set to True.
-        resources = [
-            (r'rest/greenhopper/1.0/xboard/selectorData', {}, 'getScrumBoards.json'),
-            (r'rest/greenhopper/1.0/sprintquery/[0-9]+', {}, 'getSprints.json'),
-            (r'rest/greenhopper/1.0/rapid/charts/sprintreport', {}, 'getSprintDates.json'),
-            (r'rest/api/2/search', { 'jql' : r'issuetype = Sub-task .*' }, 'getIssues.json'),
-            (r'rest/api/2/search', { 'jql' : r'issuekey in .*' }, 'getEffortForIssues.json'),
-            (r'rest/greenhopper/1.0/rapid/charts/scopechangeburndownchart', {}, 'getScopeChangeBurndownChart.json'),
-            (r'rest/api/2/search', { 'jql' : r'.*resolved >= .* or resolution = unresolved.*' }, 'getIssueWorklogs.json')
-        ]
-
-        for resource, query, datafile in resources:
-            if re.match(resource, o.path[1:]) and \
+        if self._failRandomly():
+            return
+
+        if o.path[1:] == 'rest/api/2/worklog/updated':
+            since = int(query_components.get('since', ['0'])[0])
+            self._sendJson(json.dumps(self.server.getUpdatedWorklogs(since)).encode('utf-8'))
+            return
+
+        for resource, query, datafile in self.resources:
+            match = re.match(resource, o.path[1:])
+            if match and \
                all([(key in query_components and re.match(value, query_components[key][0]))
                     for key, value in query.items()]):
-                with open('jira%d/%s' % (jiraversion, datafile), 'rt') as f:
-                    data = f.read().encode("utf-8")
+                datafile = match.expand(datafile)
+                if datafile not in self.server.dataset:
+                    break
+
+                startAt = int(query_components.get('startAt', ['0'])[0])
+                maxResults = int(query_components.get('maxResults', [str(self.server.maxResults)])[0])
+                body, gzipped, etag = self.server.getPage(datafile, startAt, maxResults)
 
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Content-length', len(data))
+                if self.headers.get('If-None-Match') == etag:
+                    self._delay()
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', 0)
                     self.end_headers()
-                    self.wfile.write(data)
-                    return
+                else:
+                    self._sendJson(body, gzipped, etag)
+                return
 
+        self._delay()
         self.send_error(404, 'Data was requested for an unknown resource: %s' % self.path)
 
+    def do_POST(self):
+        o = urlparse.urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if self._failRandomly():
+            return
+
+        if o.path[1:] == 'rest/api/2/worklog/list':
+            ids = json.loads(body.decode('utf-8'))['ids']
+            worklogs = [self.server.worklogsById[worklogId] for worklogId in ids if worklogId in self.server.worklogsById]
+            self._sendJson(json.dumps(worklogs).encode('utf-8'))
+            return
+
+        self._delay()
+        self.send_error(404, 'Data was posted to an unknown resource: %s' % self.path)
+
+    def _delay(self):
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(server.latency + server.jitter * random.random())
+
+    def _failRandomly(self):
+        if self.server.errorRate and random.random() < self.server.errorRate:
+            self._delay()
+            self.send_response(self.server.errorStatus)
+            if self.server.errorStatus in (429, 503):
+                self.send_header('Retry-After', 1)
+            self.send_header('Content-Length', 0)
+            self.end_headers()
+            return True
+        return False
+
+    def _sendJson(self, data, gzipped = None, etag = None):
+        encoding = None
+        if self.server.useGzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            encoding = 'gzip'
+            data = gzipped or gzip.compress(data, compresslevel = 6)
+
+        self._delay()
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-length', len(data))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+
+        # Send chunks of a tenth of a second each, each one after the time
+        # it would have taken to transfer it
+        chunkSize = max(1, int(bandwidth / 10))
+        for i in range(0, len(data), chunkSize):
+            chunk = data[i:i + chunkSize]
+            time.sleep(len(chunk) / bandwidth)
+            self.wfile.write(chunk)
+
 def main():
-    httpd = TCPServer(("", port), JiraRequestHandler)
+    parser = argparse.ArgumentParser(description = 'Serve the responses of a Jira 6 server from memory')
+    parser.add_argument('--port', type = int, default = port)
+    parser.add_argument('--directory', default = 'jira%d' % jiraversion, help = 'directory with the json files to serve')
+    parser.add_argument('--generate', action = 'store_true', help = 'serve a generated sprint instead of the json files')
+    parser.add_argument('--subtasks', type = int, default = 1000)
+    parser.add_argument('--worklogs', type = int, default = 10000)
+    parser.add_argument('--scope-changes', type = int, default = 200)
+    parser.add_argument('--burnup-issues', type = int, default = 100)
+    parser.add_argument('--max-results', type = int, default = 1000, help = 'maximum number of items per page')
+    parser.add_argument('--latency', type = float, default = 0, help = 'delay of each response in milliseconds')
+    parser.add_argument('--jitter', type = float, default = 0, help = 'maximum random delay added to the latency in milliseconds')
+    parser.add_argument('--bandwidth', type = float, help = 'maximum speed of each response in kB/s')
+    parser.add_argument('--error-rate', type = float, default = 0, help = 'part of the requests that fail')
+    parser.add_argument('--error-status', type = int, default = 503, help = 'HTTP status of failed requests')
+    parser.add_argument('--no-gzip', action = 'store_true', help = 'do not compress responses')
+    parser.add_argument('--quiet', action = 'store_true', help = 'do not log requests')
+    args = parser.parse_args()
+
+    if args.generate:
+        dataset = jiradataset.generateDataset(subtasks = args.subtasks, worklogs = args.worklogs,
+                                              scopeChanges = args.scope_changes, burnupIssues = args.burnup_issues)
+    else:
+        dataset = loadDataset(args.directory)
 
-    print('Fake JIRA server running on port', port)
+    httpd = FakeJira(('', args.port), dataset, maxResults = args.max_results,
+                     latency = args.latency / 1000, jitter = args.jitter / 1000,
+                     bandwidth = args.bandwidth * 1000 if args.bandwidth else None,
+                     errorRate = args.error_rate, errorStatus = args.error_status,
+                     useGzip = not args.no_gzip, verbose = not args.quiet)
+
+    print('Fake JIRA server running on port', args.port)
     httpd.serve_forever()
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,174 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures where the time of updating a chart goes. Code that wants to be
+# measured enters a stage of a Timings object with stage(timings, name).
+# Requests made and responses parsed while a stage is active are counted
+# in that stage without the Timings having to be passed down to them.
+# Without a Timings none of this costs more than a context variable lookup.
+
+import contextlib
+import contextvars
+import json
+import threading
+import time
+
+# The Timings and the name of the stage that the running code is part of.
+# Executors do not carry this over to their threads, so work that is
+# submitted from within a stage must be submitted with submit.
+current = contextvars.ContextVar('current', default = None)
+
+class Stage():
+    ''' Stage holds what was measured for one stage of a Timings: the wall
+        time spent in it, the number of times it was entered, the number of
+        requests made to Jira and the bytes those received before and after
+        decompression.
+    '''
+    __slots__ = ('name', 'seconds', 'calls', 'requests', 'bytesReceived', 'bytesDecoded')
+
+    fields = ['seconds', 'calls', 'requests', 'bytesReceived', 'bytesDecoded']
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+        self.requests = 0
+        self.bytesReceived = 0
+        self.bytesDecoded = 0
+
+    def toDict(self):
+        return dict([('name', self.name)] + [(field, getattr(self, field)) for field in self.fields])
+
+class Timings():
+    ''' Timings records Stages by name, in the order they were first
+        entered. Stages can be entered from several threads at the same
+        time and can be nested. The time of a nested stage is part of the
+        time of the stage around it as well, but requests are only counted
+        in the innermost stage. The parse stage is the time spent decoding
+        JSON, summed over all threads that did so.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def _getStage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(name)
+        return stage
+
+    def add(self, name, seconds = 0, calls = 0, requests = 0, bytesReceived = 0, bytesDecoded = 0):
+        with self.lock:
+            stage = self._getStage(name)
+            stage.seconds += seconds
+            stage.calls += calls
+            stage.requests += requests
+            stage.bytesReceived += bytesReceived
+            stage.bytesDecoded += bytesDecoded
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self.add(name)
+        token = current.set((self, name))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, seconds = time.perf_counter() - start, calls = 1)
+            current.reset(token)
+
+    def copy(self):
+        timings = Timings()
+        with self.lock:
+            for name, stage in self.stages.items():
+                timings.add(name, **dict((field, getattr(stage, field)) for field in Stage.fields))
+        return timings
+
+    def getTotals(self):
+        ''' Returns the number of requests and bytes of all stages together '''
+        with self.lock:
+            return dict((field, sum(getattr(stage, field) for stage in self.stages.values()))
+                        for field in ('requests', 'bytesReceived', 'bytesDecoded'))
+
+    def toDict(self):
+        with self.lock:
+            stages = [stage.toDict() for stage in self.stages.values()]
+        return { 'stages' : stages, 'totals' : self.getTotals() }
+
+    def dump(self, f):
+        json.dump(self.toDict(), f, indent = 2)
+
+    def summarize(self):
+        ''' Returns a line with the time of each stage that is not part of
+            fetching a particular resource, followed by the totals.
+        '''
+        with self.lock:
+            parts = ['%s %s' % (stage.name, formatSeconds(stage.seconds))
+                     for stage in self.stages.values() if ' ' not in stage.name]
+        totals = self.getTotals()
+        parts.append('%d requests, %s received' % (totals['requests'], formatBytes(totals['bytesReceived'])))
+        return ', '.join(parts)
+
+    def describe(self):
+        ''' Returns a line per stage with everything measured for it '''
+        with self.lock:
+            stages = list(self.stages.values())
+        return '\n'.join('%s: %s in %d calls, %d requests, %s received, %s decompressed' %
+                         (stage.name, formatSeconds(stage.seconds), stage.calls, stage.requests,
+                          formatBytes(stage.bytesReceived), formatBytes(stage.bytesDecoded))
+                         for stage in stages)
+
+def formatSeconds(seconds):
+    return '%.2f s' % seconds if seconds >= 1 else '%d ms' % round(seconds * 1000)
+
+def formatBytes(count):
+    return '%.1f MB' % (count / 2**20) if count >= 2**20 else '%.1f kB' % (count / 2**10)
+
+def stage(timings, name):
+    ''' Returns a context that measures a stage of timings, which may be None '''
+    return timings.stage(name) if timings else contextlib.nullcontext()
+
+def countRequest(bytesReceived, bytesDecoded):
+    active = current.get()
+    if active:
+        timings, name = active
+        timings.add(name, requests = 1, bytesReceived = bytesReceived, bytesDecoded = bytesDecoded)
+
+def addParseTime(seconds):
+    active = current.get()
+    if active:
+        active[0].add('parse', seconds = seconds, calls = 1)
+
+@contextlib.contextmanager
+def parsing():
+    ''' Measures the time spent in the block as parse time of the Timings
+        of the running code, if there is one.
+    '''
+    if not current.get():
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        addParseTime(time.perf_counter() - start)
+
+def submit(executor, function, *args):
+    ''' Submits function to executor to run as part of the current stage,
+        with the request priority of the current code
+    '''
+    return executor.submit(contextvars.copy_context().run, function, *args)
@@ -0,0 +1,250 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime as dt
+import hashlib
+import os
+import sqlite3
+import threading
+
+try:
+    from . import records
+except ImportError:
+    import records
+
+def formatTimestamp(seconds):
+    ''' Returns seconds since the epoch in the format of the text columns '''
+    if seconds is None:
+        return None
+    return dt.datetime.fromtimestamp(seconds, dt.timezone.utc).isoformat()
+
+schema = '''
+    create table if not exists estimates (
+        issue_key text primary key,
+        seconds integer
+    );
+
+    create table if not exists resolutions (
+        issue_key text primary key,
+        resolved text,
+        resolved_at real
+    );
+
+    create table if not exists worklogs (
+        id text primary key,
+        issue_key text not null,
+        created text not null,
+        created_at real not null,
+        seconds integer not null
+    );
+    create index if not exists worklogs_by_issue on worklogs (issue_key);
+
+    create table if not exists sprint_issues (
+        sprint_id integer not null,
+        issue_key text not null,
+        primary key (sprint_id, issue_key)
+    );
+
+    create table if not exists burnup_issues (
+        query text not null,
+        issue_key text not null,
+        primary key (query, issue_key)
+    );
+    create index if not exists burnup_issues_by_issue on burnup_issues (issue_key);
+
+    create table if not exists sprint_summaries (
+        sprint_id integer not null,
+        query text not null,
+        name text not null,
+        committed real not null,
+        completed real not null,
+        scope_added real not null,
+        scope_removed real not null,
+        hours_spent real not null,
+        primary key (sprint_id, query)
+    );
+
+    create table if not exists refreshes (
+        name text primary key,
+        last_refresh text not null,
+        last_full_refresh text not null
+    );
+
+    -- The chart is calculated from the records returned by getSprintIssues
+    -- and getBurnupIssues, which never search on time
+    drop index if exists resolutions_by_time;
+    drop index if exists worklogs_by_time;
+'''
+
+class IssueStore():
+    ''' IssueStore keeps the issues of sprints and the worklogs of burnup
+        issues in an SQLite database, so they survive switching to another
+        sprint and restarting the application. The database is indexed on
+        sprint id and issue key.
+
+        Sprint issues are stored per sprint id and burnup issues per query,
+        the query being a string that identifies the JQL and sprint window
+        that were used to find them. Both are stored and returned as the
+        SubTask and BurnupIssue records that the chart is calculated from.
+
+        The lock only keeps the threads that share an IssueStore apart.
+        Other IssueStores and other processes, like those of batchrender,
+        may use the same database at the same time. So the database is
+        kept in WAL mode, in which reading never waits for writing. A
+        writer waits up to busyTimeout seconds for the others, which keep
+        their transactions short.
+    '''
+
+    busyTimeout = 60
+    issuesPerTransaction = 100
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout = self.busyTimeout, check_same_thread = False)
+        self.db.execute('pragma journal_mode = wal')
+        self.db.executescript(schema)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def _saveSprintIssues(self, issues):
+        for issue in issues:
+            self.db.execute('insert or replace into estimates values (?, ?)', (issue.key, issue.estimate))
+            self.db.execute('insert or replace into resolutions values (?, ?, ?)',
+                            (issue.key, formatTimestamp(issue.resolved), issue.resolved))
+
+    def _saveBurnupIssues(self, issues):
+        for issue in issues:
+            self.db.execute('delete from worklogs where issue_key = ?', (issue.key,))
+            self.db.executemany('insert or replace into worklogs values (?, ?, ?, ?, ?)',
+                                (('%s:%d' % (issue.key, index), issue.key, formatTimestamp(created), created, int(timeSpent))
+                                 for index, (created, timeSpent) in enumerate(zip(issue.created.tolist(), issue.timeSpent.tolist()))))
+
+    def getSprintIssues(self, sprintId):
+        ''' Returns the issues of a sprint ordered by resolution date, with
+            unresolved issues first.
+        '''
+        with self.lock:
+            rows = self.db.execute('''
+                select s.issue_key, coalesce(e.seconds, 0), r.resolved_at
+                from sprint_issues s
+                left join estimates e on e.issue_key = s.issue_key
+                left join resolutions r on r.issue_key = s.issue_key
+                where s.sprint_id = ?
+                order by coalesce(r.resolved_at, 0)''', (sprintId,)).fetchall()
+
+        return [records.SubTask(key, seconds, resolved) for key, seconds, resolved in rows]
+
+    def getBurnupIssues(self, query):
+        with self.lock:
+            rows = self.db.execute('''
+                select b.issue_key, w.created_at, w.seconds
+                from burnup_issues b
+                left join worklogs w on w.issue_key = b.issue_key
+                where b.query = ?
+                order by b.issue_key, w.created_at''', (query,)).fetchall()
+
+        worklogs = {}
+        for key, created, seconds in rows:
+            issueWorklogs = worklogs.setdefault(key, ([], []))
+            if created is not None:
+                issueWorklogs[0].append(created)
+                issueWorklogs[1].append(seconds)
+
+        return [records.BurnupIssue(key, created, timeSpent) for key, (created, timeSpent) in worklogs.items()]
+
+    def getSprintSummaries(self, sprintIds, query):
+        ''' Returns the stored summaries of the given sprints for a burnup
+            query by sprint id. Sprints without a stored summary are left out.
+        '''
+        with self.lock:
+            rows = self.db.execute('''
+                select sprint_id, name, committed, completed, scope_added, scope_removed, hours_spent
+                from sprint_summaries
+                where query = ? and sprint_id in (%s)''' % ', '.join('?' * len(sprintIds)),
+                (query,) + tuple(sprintIds)).fetchall()
+
+        return dict((row[0], { 'name' : row[1],
+                               'committed' : row[2],
+                               'completed' : row[3],
+                               'scopeAdded' : row[4],
+                               'scopeRemoved' : row[5],
+                               'hoursSpent' : row[6] })
+                    for row in rows)
+
+    def saveSprintSummary(self, sprintId, query, summary):
+        ''' Stores the summary of a sprint, which must be a dict in the form
+            returned by getSprintSummaries.
+        '''
+        with self.lock, self.db:
+            self.db.execute('insert or replace into sprint_summaries values (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (sprintId, query, summary['name'], summary['committed'], summary['completed'],
+                             summary['scopeAdded'], summary['scopeRemoved'], summary['hoursSpent']))
+
+    def discard(self, kind, name, issueNames):
+        table, column = ('sprint_issues', 'sprint_id') if kind == 'sprint' else ('burnup_issues', 'query')
+        with self.lock, self.db:
+            self.db.executemany('delete from %s where %s = ? and issue_key = ?' % (table, column),
+                                ((name, issueName) for issueName in issueNames))
+
+    def load(self, kind, name):
+        ''' Returns the issues stored for a sprint (kind 'sprint', named by
+            its id) or a burnup query (kind 'burnup', named by the query)
+            together with the times of the last refresh and last full
+            refresh, or None if nothing was stored under that name.
+        '''
+        with self.lock:
+            row = self.db.execute('select last_refresh, last_full_refresh from refreshes where name = ?',
+                                  ('%s:%s' % (kind, name),)).fetchone()
+        if not row:
+            return None
+
+        lastRefresh, lastFullRefresh = (dt.datetime.fromisoformat(ts) for ts in row)
+        issues = self.getSprintIssues(name) if kind == 'sprint' else self.getBurnupIssues(name)
+
+        return issues, lastRefresh, lastFullRefresh
+
+    def save(self, kind, name, issues, lastRefresh, lastFullRefresh, replace):
+        ''' Stores issues for a sprint or burnup query. If replace is True
+            they replace all issues stored earlier under the same name,
+            otherwise they are merged with them.
+
+            The estimates, resolutions and worklogs of the issues are
+            written a few issues per transaction, replacing those of each
+            issue at once. Which issues belong to the sprint or query is
+            written in the last transaction together with the time of the
+            refresh, so readers see either the old or the new issues.
+        '''
+        issues = list(issues)
+        saveIssues = self._saveSprintIssues if kind == 'sprint' else self._saveBurnupIssues
+        for start in range(0, len(issues), self.issuesPerTransaction):
+            with self.lock, self.db:
+                saveIssues(issues[start:start + self.issuesPerTransaction])
+
+        table, column = ('sprint_issues', 'sprint_id') if kind == 'sprint' else ('burnup_issues', 'query')
+        with self.lock, self.db:
+            if replace:
+                self.db.execute('delete from %s where %s = ?' % (table, column), (name,))
+            self.db.executemany('insert or replace into %s values (?, ?)' % table,
+                                ((name, issue.key) for issue in issues))
+            self.db.execute('insert or replace into refreshes values (?, ?, ?)',
+                            ('%s:%s' % (kind, name), lastRefresh.isoformat(), lastFullRefresh.isoformat()))
+
+def openIssueStore(directory, url):
+    ''' Opens the IssueStore for the Jira server at url '''
+    os.makedirs(directory, exist_ok = True)
+    serverHash = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+    return IssueStore(os.path.join(directory, 'issues-%s.sqlite' % serverHash))
@@ -15,795 +15,197 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import atexit
-import copy
+import collections
 import datetime as dt
-from dateutil import parser
-import json
 import numpy as np
-import os.path
-import pkg_resources
 import PyQt5 # import PyQt5 explicitly before pyqtgraph to stop it from using PyQt4
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtGui
-import pytz
-import requests
 import sys
+import threading
 import time
-import tzlocal
-
-jiraVersion = 6
-
-logging = False
-
-config_file = os.path.expanduser('~/.jira-burn-up-and-down.rc')
-config = {}
-
-def saveConfiguration():
-    with open(config_file, 'wt') as f:
-        json.dump(config, f, indent = 2)
-
-def key_strings_to_int(d):
-    return dict( (int(k),(key_strings_to_int(v) if isinstance(v, dict) else v)) for k,v in d.items())
-
-def loadConfiguration():
-    global config
-    try:
-        with open(config_file, 'rt') as f:
-            config = json.load(f)
-    except (ValueError, FileNotFoundError):
-        config = {}
-
-    if 'hours' not in config:
-        config['hours'] = {}
-    config['hours'] = key_strings_to_int(config['hours'])
-
-    if 'jiraurl' not in config:
-        config['jiraurl'] = 'http://127.0.0.1:8080'
-        
-    if 'username' not in config:
-        config['username'] = ''
-
-    if 'currentBoard' not in config:
-        config['currentBoard'] = None
-
-    if 'currentSprint' not in config:
-        config['currentSprint'] = None
-
-    if 'burnupIssueQuery' not in config:
-        config['burnupIssueQuery'] = ''
-
-def log(msg):
-    print(msg)
-
-def timestamp_to_seconds(timestamp):
-    epoch = dt.datetime.fromtimestamp(0, pytz.utc)
-    return (timestamp - epoch).total_seconds()
-
-def x_timestamps_to_seconds(x_y_data):
-    return [[timestamp_to_seconds(x), y] for x, y in x_y_data]
-
-def x_timestamps_to_seconds_np(x_y_data):
-    return np.array([[timestamp_to_seconds(x), y] for x, y in x_y_data])
-    
-def timestamp_to_jqltimestamp(ts):
-    localzone = tzlocal.get_localzone()
-    if str(ts.tzinfo) != str(localzone):
-        raise RuntimeError('Timezone of timestamp (%s) is not equal to local timezone (%s)' % (repr(ts.tzinfo), repr(localzone)))
-    return ts.strftime('"%Y-%m-%d %H:%M"')
-
-class JiraRest:
-
-    def __init__(self, url, username, burnupIssueQuery, readFromFile = False, writeToFile = False):
-        self.url = url
-        self.read = readFromFile
-        self.write = writeToFile
-        self.auth = (username, '')
-        self.burnupIssueQuery = burnupIssueQuery
-
-    def _get(self, resource, filename, params = None):
-        if self.read:
-            with open(filename, 'rt') as f:
-                jsonData = json.load(f)
-        else:
-            print('--------------------------------\n%s/%s %s' % (self.url, resource, params))
-            r = requests.get('%s/%s' % (self.url, resource), params=params, auth=self.auth, verify=False)
-            r.raise_for_status()
-            jsonData = r.json()
-
-            if self.write:
-                with open(filename, 'wt') as f:
-                    json.dump(jsonData, f)
-
-        return jsonData
-        
-    def setConnectionData(self, url, username, password, burnupIssueQuery):
-        self.url = url
-        self.auth = (username, password)
-        self.burnupIssueQuery = burnupIssueQuery
-
-class Jira6(JiraRest):
-
-    def __init__(self, url, username, burnupIssueQuery, readFromFile = False, writeToFile = False):
-        super().__init__(url, username, burnupIssueQuery, readFromFile = readFromFile, writeToFile = writeToFile)
-
-    def setAuth(self, auth):
-        self.auth = auth
-
-    def getScrumBoards(self):
-        jsonData = self._get('rest/greenhopper/1.0/xboard/selectorData', 'jira6/getScrumBoards.json')
-
-        boards = {}
-        for board in jsonData['rapidViews']:
-            if board['sprintSupportEnabled']:
-                boards[board['id']] = board['name']
-
-        return boards
-
-    def getSprints(self, boardId):
-        jsonData = self._get('rest/greenhopper/1.0/sprintquery/%s' % boardId, 'jira6/getSprints.json', params = {
-                'startAt' : 0,
-                'maxResults' : 1000
-            })
-
-        sprints = {}
-        for sprint in jsonData['sprints']:
-            sprints[sprint['id']] = sprint
-
-        return sprints
-
-    def getSprintDates(self, boardId, sprintId):
-        jsonData = self._get('rest/greenhopper/1.0/rapid/charts/sprintreport', 'jira6/getSprintDates.json', params = {
-                'rapidViewId' : boardId,
-                'sprintId' : sprintId
-            })
-
-        endDate = jsonData['sprint']['completeDate']
-        if endDate == 'None':
-            endDate = jsonData['sprint']['endDate']
-
-        localzone = tzlocal.get_localzone()
-
-        sprintStart = localzone.localize(parser.parse(jsonData['sprint']['startDate']))
-        sprintEnd = localzone.localize(parser.parse(endDate))
-
-        return sprintStart, sprintEnd
-
-    def getKanbanBoards(self):
-        jsonData = self._get('rest/greenhopper/1.0/xboard/selectorData', 'jira6/getKanbanBoards.json')
-
-        boards = {}
-        for view in jsonData['rapidViews']:
-            if view['sprintSupportEnabled']:
-                boards[view['id']] = view['name']
-
-        return boards
-
-    def getIssues(self, boardId, sprintId) :
-        jsonData = self._get('rest/api/2/search', 'jira6/getIssues.json', params = {
-                'startAt' : 0,
-                'maxResults' : 1000,
-                'jql' : 'issuetype = Sub-task and sprint = %s' % sprintId,
-                'fields' : 'timetracking,resolutiondate'
-            })
-
-        return jsonData['issues']
-
-    def getEffortForIssues(self, boardId, issueNames):
-        effortForIssues = {}
-        if issueNames:
-            jsonData = self._get('rest/api/2/search', 'jira6/getEffortForIssues.json', params = {
-                    'startAt' : 0,
-                    'maxResults' : 1000,
-                    'jql' : 'issuekey in (%s)' % ','.join(issueNames),
-                    'fields' : 'timetracking,resolutiondate'
-                })
-
-            for issue in jsonData['issues']:
-                if 'originalEstimateSeconds' in issue['fields']['timetracking']:
-                    effortForIssues[issue['key']] = issue['fields']['timetracking']['originalEstimateSeconds']
-                else:
-                    effortForIssues[issue['key']] = 0
-
-        return effortForIssues
-
-    def getScopeChangeBurndownChart(self, rapidViewId, sprintId):
-        jsonData = self._get('rest/greenhopper/1.0/rapid/charts/scopechangeburndownchart', 'jira6/getScopeChangeBurndownChart.json', params = {
-                'rapidViewId' : rapidViewId,
-                'sprintId' : sprintId
-            })
-
-        return jsonData
-
-    def getIssueWorklogs(self, sprintStart, sprintEnd):
-        queryParts = [ '(resolved >= %s or resolution = unresolved)' % timestamp_to_jqltimestamp(sprintStart),
-                       '(created <= %s)' % timestamp_to_jqltimestamp(sprintEnd),
-                       '(updated >= %s)' % timestamp_to_jqltimestamp(sprintStart) ]
-                       
-        if self.burnupIssueQuery:
-            queryParts.append(self.burnupIssueQuery)
-    
-        jsonData = self._get('rest/api/2/search', 'jira6/getIssueWorklogs.json', params = {
-                'startAt' : 0,
-                'maxResults' : 1000,
-                'jql' : ' and '.join(queryParts),
-                'fields' : 'worklog'
-            })
-
-        return jsonData['issues']
-
-class Jira7(JiraRest):
-
-    def __init__(self, url, username, burnupIssueQuery, readFromFile = False, writeToFile = False):
-        super().__init__(url, username, burnupIssueQuery, readFromFile = readFromFile, writeToFile = writeToFile)
-
-    def setAuth(self, auth):
-        self.auth = auth
-
-    def getScrumBoards(self):
-        jsonData = self._get('rest/agile/1.0/board', 'jira7/getScrumBoards.json', params = {
-                'startAt' : 0,
-                'maxResults' : 1000,
-                'type' : 'scrum'
-            })
-
-        boards = {}
-        for board in jsonData['values']:
-            boards[board['id']] = board['name']
-
-        return boards
-
-    def getSprints(self, boardId):
-        jsonData = self._get('rest/agile/1.0/board/%s/sprint' % boardId, 'jira7/getSprints.json', params = {
-                'startAt' : 0,
-                'maxResults' : 1000
-            })
-
-        sprints = {}
-        for sprint in jsonData['values']:
-            sprints[sprint['id']] = sprint
-
-        return sprints
-
-    def getSprintDates(self, boardId, sprintId):
-        # TODO: get sprint information from jira
-        sprintStart = parser.parse(sprints[sprintId]['startDate'])
-        sprintEnd = parser.parse(sprints[sprintId]['endDate'])
-
-        return sprintStart, sprintEnd
-
-
-    def getKanbanBoards(self):
-        jsonData = self._get('rest/agile/1.0/board', 'jira7/getKanbanBoards.json', params = {
-                'startAt' : 0,
-                'maxResults' : 1000,
-                'type' : 'kanban'
-            })
-
-        boards = {}
-        for board in jsonData['values']:
-            boards[board['id']] = board['name']
-
-        return boards
-
-    def getIssues(self, boardId, sprintId):
-        jsonData = self._get('rest/agile/1.0/board/%s/sprint/%s/issue' % (boardId, sprintId), 'jira7/getIssues.json', params = {
-                'startAt' : 0,
-                'maxResults' : 1000,
-                'jql' : 'issuetype = Sub-task',
-                'fields' : 'timetracking,resolutiondate'
-            })
-
-        return jsonData['issues']
-
-    def getEffortForIssues(self, boardId, issueNames):
-        jsonData = self._get('rest/agile/1.0/board/%s/issue' % boardId, 'jira7/getEffortForIssues.json', params = {
-                'startAt' : 0,
-                'maxResults' : 1000,
-                'jql' : 'issuekey in (%s)' % ','.join(issueNames),
-                'fields' : 'timetracking'
-            })
-
-        effortForIssues = {}
-        for issue in jsonData['issues']:
-            if 'originalEstimateSeconds' in issue['fields']['timetracking']:
-                effortForIssues[issue['key']] = issue['fields']['timetracking']['originalEstimateSeconds']
-            else:
-                effortForIssues[issue['key']] = 0
-
-        return effortForIssues
-
-    def getIssueWorklogs(self, boardId, sprintStart, sprintEnd):
-        jsonData = self._get('rest/agile/1.0/board/%s/issue' % boardId, 'jira7/getIssueWorklogs.json', params = {
-                'startAt' : 0,
-                'maxResults' : 1000,
-                'jql' : 'worklogDate >= %s and worklogDate <= %s and issuetype = Support' % (sprintStart, sprintEnd),
-                'fields' : 'worklog'
-            })
-
-        return jsonDate['issues']
-
-def byTimestamp(x):
-    return timestamp_to_seconds(x[0])
-
-def byResolutionDate(x):
-    if x['fields']['resolutiondate']:
-        result = timestamp_to_seconds(parser.parse(x['fields']['resolutiondate']))
-    else:
-        result = 0
-
-    return result
-
-def createSegments(inputdata, connected):
-    dataSet = [ inputdata[0] ]
-    previousY = inputdata[0][1]
-
-    for value in inputdata[1:]:
-        dataSet.append([value[0], previousY])
-        if not connected:
-            dataSet.append(None)
-        dataSet.append(value)
-        previousY = value[1]
-
-    return dataSet
-
-def getZeroData(sprintStart, sprintEnd):
-    return [[sprintStart, 0], [sprintEnd, 0]]
-
-def createZeroLine(plotItem, zeroData):
+import traceback
+
+try:
+    from . import asyncjira
+    from . import core
+    from . import instrumentation
+    from . import issuestore
+    from . import requestscheduler
+    from . import responsecache
+except ImportError:
+    import asyncjira
+    import core
+    import instrumentation
+    import issuestore
+    import requestscheduler
+    import responsecache
+
+def createCurve(plotItem, pen, connect = 'finite'):
+    return plotItem.plot(pen = pen, connect = connect)
+
+def setCurveData(curve, series):
+    curve.setData(x = series.x, y = series.y)
+
+def createZeroLine(plotItem):
     pen = pg.mkPen('k', width=1, style=QtCore.Qt.DashLine)
     pen.setDashPattern([10, 10])
 
-    plotItem.plot(x_timestamps_to_seconds_np(zeroData), pen = pen)
-
-def parseBurndownTimestamp(ts):
-    localzone = tzlocal.get_localzone()
-    naive = dt.datetime.fromtimestamp(int(ts) / 1000, tz = pytz.utc).replace(tzinfo = None)
-    return localzone.localize(naive)
-
-def getCurrentTimeFromBurndown(scopeChangeBurndownChart):
-    return parseBurndownTimestamp(scopeChangeBurndownChart['now'])
-
-def getScopeChangingIssues(sprintStart, sprintEnd, scopeChangeBurndownChart):
-    initialScope = []
-    scopeChanges = []
-
-    tmpSet = set()
-    issueNames = []
-    alreadyDone = set()
-
-    for timestamp, changelist in scopeChangeBurndownChart['changes'].items():
-        timestamp = parseBurndownTimestamp(timestamp)
-
-        for change in changelist:
-            if ('column' in change and
-                'done' in change['column'] and
-                timestamp <= sprintStart):
-                alreadyDone.add(change['key'])
-
-    for timestamp, changelist in scopeChangeBurndownChart['changes'].items():
-        timestamp = parseBurndownTimestamp(timestamp)
-
-        for change in changelist:
-            # Skip parent issues
-            if not scopeChangeBurndownChart['issueToParentKeys'][change['key']]:
-                continue
-
-            # Skip changes that are not sprint scope changes
-            if 'added' not in change:
-                continue
-
-            # Ignore issues that were already completed before the sprint had started
-            if change['key'] in alreadyDone:
-                continue
-
-            # Choose whether to add it to the initialScope or to the scopeChanges
-            if timestamp <= sprintStart:
-                initialScope.append( { 'timestamp' : timestamp,
-                                       'added'     : change['added'],
-                                       'issueName' : change['key'] } )
-            elif timestamp <= sprintEnd:
-                scopeChanges.append( { 'timestamp' : timestamp,
-                                       'added'     : change['added'],
-                                       'issueName' : change['key'] } )
-
-            if change['key'] not in tmpSet:
-                tmpSet.add(change['key'])
-                issueNames.append(change['key']);
-
-    initialScope.sort(key = lambda x: timestamp_to_seconds(x['timestamp']))
-    scopeChanges.sort(key = lambda x: timestamp_to_seconds(x['timestamp']))
-
-    return { 'names' : issueNames,
-             'initial' : initialScope,
-             'changes' : scopeChanges }
-
-def getInitialScope(initialIssues, effortForIssues):
-    initialScope = 0
-
-    log('Calculating initial sprint scope')
-
-    for issue in initialIssues:
-        effort = effortForIssues[issue['issueName']] / 3600
-        initialScope += effort;
-        log("  adding %s: %.2f hours" % (issue['issueName'], effort))
-
-    log("  Initial sprint scope is %.2f hours" % initialScope)
-
-    return initialScope
-
-def calculateScopeChanges(sprintStart, sprintEnd, scopeChangingIssues, effortForIssues):
-    scope = 0
-    scopeChanges = []
-
-    log('Calculating sprint scope changes')
-
-    scopeChanges.append( [ copy.deepcopy(sprintStart), 0 ] );
-
-    for scopeChange in scopeChangingIssues:
-        effort = effortForIssues[scopeChange['issueName']] / 3600
-
-        if scopeChange['added']:
-            scope += effort
-            log('  added %s: %.2f hours at %s' % (scopeChange['issueName'], effort, scopeChange['timestamp']))
-        else:
-            scope -= effort
-            log('  removed %s: %.2f hours at %s' % (scopeChange['issueName'], effort, scopeChange['timestamp']))
-
-        scopeChanges.append( [ copy.deepcopy(scopeChange['timestamp']), scope ] )
-
-    log('  Overall scope change: %.2f hours' % scope)
-
-    scopeChanges.append( [ copy.deepcopy(sprintEnd), scope ] )
-
-    return scopeChanges
-
-def createSprintScopeLine(plotItem, data):
-    endScope = data[-1][1];
-    lineData = [[value[0], endScope - value[1]] for value in data]
+    return createCurve(plotItem, pen)
 
+def createSprintScopeLine(plotItem):
     pen = pg.mkPen('k', width=2)
-    plotItem.plot(x_timestamps_to_seconds_np(createSegments(lineData, True)), pen = pen)
-
-def getIdealBurndown(sprintStart, sprintEnd, finalSprintScope):
-    return [ [copy.deepcopy(sprintStart), finalSprintScope], [copy.deepcopy(sprintEnd), 0] ]
+    return createCurve(plotItem, pen)
 
-def getIdealBurndownValueAtTimestamp(ts, idealBurndownData):
-    startTimestamp = idealBurndownData[0][0]
-    endTimestamp = idealBurndownData[-1][0]
-    finalSprintScope = idealBurndownData[0][1]
-    return (endTimestamp - ts) / (endTimestamp - startTimestamp) * finalSprintScope
-
-def createIdealBurndownLine(plotItem, idealBurndownData):
+def createIdealBurndownLine(plotItem):
     pen = pg.mkPen('#c0c0c0', width=2)
-    plotItem.plot(x_timestamps_to_seconds_np(idealBurndownData), pen = pen)
-
-def getActualBurndown(sprintStart, sprintEnd, currentTime, finalSprintScope, issues):
-    totalEffortCompleted = 0
-    remainingSprintEffort = finalSprintScope
-    actual = [ [sprintStart, remainingSprintEffort] ]
-
-    log('Calculating actual burndown')
-
-    for value in issues:
-        if not value['fields']['resolutiondate']:
-            continue
-        else:
-            resolutionDate = parser.parse(value['fields']['resolutiondate'])
-            if resolutionDate >= sprintStart and \
-               resolutionDate <= sprintEnd:
-                completedEffort = value['fields']['timetracking'].get('originalEstimateSeconds', 0) / 3600
-                totalEffortCompleted += completedEffort
-                remainingSprintEffort -= completedEffort
-                actual.append([resolutionDate, remainingSprintEffort])
-                log('  completed %s: %.2f hours at %s' % (value['key'], completedEffort, resolutionDate))
+    return createCurve(plotItem, pen)
 
-    log('  Overall effort completed: %.2f hours' % totalEffortCompleted)
-
-    lastDate = currentTime if currentTime < sprintEnd else sprintEnd
-
-    actual.append([copy.deepcopy(lastDate), remainingSprintEffort])
-
-    return actual
-
-def createActualBurndownLine(plotItem, actualBurndownData):
+def createActualBurndownLine(plotItem):
     pen = pg.mkPen('b', width=2)
-    plotItem.plot(x_timestamps_to_seconds_np(createSegments(actualBurndownData, True)), pen = pen)
-
-def adjustForHiddenWeekends(points, weekends):
-    upcomingWeekends = weekends[:]
-    pointIndex = 0;
-
-    accumulatedOffset = dt.timedelta(0)
-
-    while pointIndex < len(points):
-        nextPoint = points[pointIndex]
-
-        if upcomingWeekends:
-            nextWeekend = upcomingWeekends[0]
-        else:
-            nextWeekend = None
-
-        if nextWeekend and nextPoint[0] > nextWeekend['start']:
-            if nextPoint[0] > nextWeekend['start'] + nextWeekend['duration']:
-                accumulatedOffset += nextWeekend['duration']
-                upcomingWeekends.pop(0)
-            else:
-                nextPoint[0] = nextWeekend['start'] - accumulatedOffset
-                pointIndex += 1
-        else:
-            nextPoint[0] -= accumulatedOffset
-            pointIndex += 1
-
-    return points
-
-def determineSprintWeekends(sprintStart, sprintEnd):
-    endOfWeek = sprintStart.replace(hour = 0, minute = 0, second = 0, microsecond = 0) + \
-                dt.timedelta(days = 7 - sprintStart.weekday())
-    startOfWeekend = endOfWeek - dt.timedelta(days = 2)
-    weekends = []
-
-    while startOfWeekend < sprintEnd:
-        startOfNonWork = max(sprintStart, startOfWeekend)
-        endOfNonWork = min(sprintEnd, endOfWeek)
-
-        weekends.append( { 'start' : startOfNonWork,
-                           'duration' : endOfNonWork - startOfNonWork } )
-
-        endOfWeek += dt.timedelta(weeks = 1)
-        startOfWeekend = endOfWeek - dt.timedelta(days = 2)
-    return weekends
-
-def createDayLabels(sprintStart, sprintEnd):
-    labels = []
-    day = sprintStart.replace(hour=12, minute=0, second = 0, microsecond = 0)
-    if day < sprintStart:
-        day += dt.timedelta(days = 1)
-
-    while day < sprintEnd:
-        if day.weekday() not in [5, 6]:
-            labels.append([copy.deepcopy(day), day.strftime('%a')])
-
-        day += dt.timedelta(days = 1)
-
-    return labels
-
-def createDayLines(sprintStart, sprintEnd):
-    lines = []
-    day = sprintStart.replace(hour = 0, minute = 0, second = 0, microsecond = 0)
-    if day < sprintStart:
-        day += dt.timedelta(days = 1)
-
-    while day < sprintEnd:
-        if day.weekday() not in [5, 6]:
-            lines.append([copy.deepcopy(day), None])
-
-        day += dt.timedelta(days = 1)
-
-    return lines
-
-def createGridLineMarkings(plotItem, gridData):
-    targetRect = plotItem.getViewBox().targetRect()
-    min_y = targetRect.top()
-    max_y = targetRect.bottom()
-
-    markings = [ [ (value[0], min_y), (value[0], max_y) ] for value in gridData ]
+    return createCurve(plotItem, pen)
 
+def createGridLineMarkings(plotItem):
     pen = pg.mkPen('#e0e0e0', width=1)
-    for marking in markings:
-        plotItem.plot(x_timestamps_to_seconds_np(marking), pen = pen)
-
-def calculateActualBurnup(sprintStart, sprintEnd, currentTime, issueWorklogs, burnupBudget, pointsPerHour):
-    totalHoursIn = 0
-    totalHoursOut = 0
-    timeSpent = []
-
-    log('Calculating support burnup')
-
-    for issue in issueWorklogs:
-        for worklog in issue['fields']['worklog']['worklogs']:
-            created = parser.parse(worklog['created'])
-            if created >= sprintStart and created <= sprintEnd:
-                timeSpent.append([created, worklog['timeSpentSeconds']])
-                totalHoursIn += worklog['timeSpentSeconds'] / 3600
-                log('  adding %s: %.2f hours' % (issue['key'], worklog['timeSpentSeconds'] / 3600))
-            else:
-                totalHoursOut += worklog['timeSpentSeconds'] / 3600;
-                log('  skipping %s: %.2f hours' % (issue['key'], worklog['timeSpentSeconds'] / 3600))
-
-    log('  Added a total of %.2f hours from worklogs' % totalHoursIn)
-    log('  Skipped a total of %.2f hours from worklogs' % totalHoursOut)
+    return createCurve(plotItem, pen, connect = 'pairs')
 
-    timeSpent.sort(key=byTimestamp)
+def setGridLineData(gridLines, gridData, min_y, max_y):
+    # All lines are drawn by a single curve that connects pairs of points
+    gridLines.setData(x = np.repeat(gridData.x, 2), y = np.tile([min_y, max_y], len(gridData.x)))
 
-    totalTimeSpent = 0
-    burnup = [ [sprintStart, -burnupBudget * pointsPerHour] ]
-    for ts in timeSpent:
-        totalTimeSpent += ts[1]
-        burnup.append([ts[0], ((totalTimeSpent / 3600) - burnupBudget) * pointsPerHour])
-
-    lastDate = currentTime if currentTime < sprintEnd else sprintEnd
-    burnup.append([copy.deepcopy(lastDate), ((totalTimeSpent / 3600) - burnupBudget) * pointsPerHour]);
-
-    return burnup
-
-def createActualBurnupLine(plotItem, actualBurnupData):
+def createActualBurnupLine(plotItem):
     pen = pg.mkPen('r', width=2)
-    plotItem.plot(x_timestamps_to_seconds_np(createSegments(actualBurnupData, True)), pen = pen)
-
-# This function is a bit different because it calculates data from a line
-# from which the weekends have already been removed. This makes it easier to
-# calculate the slope of the projected burnup.
-def calculateProjectedBurnup(zeroData, actualBurnupData):
-    burnupStart = actualBurnupData[0][0];
-    burnupStartHeight = actualBurnupData[0][1];
-    burnupEnd = actualBurnupData[-1][0];
-    burnupEndHeight = actualBurnupData[-1][1];
+    return createCurve(plotItem, pen)
 
-    sprintStart = zeroData[0][0];
-    sprintEnd = zeroData[-1][0];
-
-    projectedBurnupHeight = ((burnupEndHeight - burnupStartHeight) / (burnupEnd - burnupStart).total_seconds()) * (sprintEnd - sprintStart).total_seconds() + burnupStartHeight;
-
-    return [ [copy.deepcopy(burnupEnd), burnupEndHeight], [copy.deepcopy(sprintEnd), projectedBurnupHeight] ]
-
-def createProjectedBurnupLine(plotItem, projectedBurnupData):
+def createProjectedBurnupLine(plotItem):
     pen = pg.mkPen('r', width=1, style=QtCore.Qt.DashLine)
     pen.setDashPattern([10, 10])
-    plotItem.plot(x_timestamps_to_seconds_np(projectedBurnupData), pen = pen)
+    return createCurve(plotItem, pen)
 
-def calculateIdealBurnup(sprintStart, sprintEnd, burnupBudget):
-    return [ [copy.deepcopy(sprintStart), -burnupBudget], [copy.deepcopy(sprintEnd), 0] ]
-
-def createIdealBurnupLine(plotItem, idealBurnupData):
+def createIdealBurnupLine(plotItem):
     pen = pg.mkPen('#c0c0c0', width=2)
-    plotItem.plot(x_timestamps_to_seconds_np(idealBurnupData), pen = pen)
+    return createCurve(plotItem, pen)
 
-def calculateExpectedBurndown(sprintStart, sprintEnd, finalSprintScope, projectedBurnupHeight):
-    if projectedBurnupHeight < 0:
-        return [ [copy.deepcopy(sprintStart), finalSprintScope], [copy.deepcopy(sprintEnd), projectedBurnupHeight] ]
-    else:
-        return []
-
-def createExpectedBurndownLine(plotItem, expectedBurndownData):
+def createExpectedBurndownLine(plotItem):
     pen = pg.mkPen('#008000', width=2)
-    plotItem.plot(x_timestamps_to_seconds_np(expectedBurndownData), pen = pen)
+    return createCurve(plotItem, pen)
+
+
+class VerticalAnnotatedArrow():
+    ''' VerticalAnnotatedArrow is a vertical double-headed arrow with a text
+        next to it. Its items are added to the plotItem once and moved to
+        where the arrow is needed, or hidden when it is not.
+    '''
 
+    def __init__(self, plotItem, xanchor):
 
-def drawVerticalAnnotatedArrow(plotItem, x, y1, y2, text, xanchor):
+        # draw arrows in light gray so they don't look like part of the burndown when seen from a distance
+        arrowColor = '#c0c0c0'
+        pen = pg.mkPen(arrowColor, width=1)
 
-    # draw arrows in light gray so they don't look like part of the burndown when seen from a distance
-    arrowColor = '#c0c0c0'
-    pen = pg.mkPen(arrowColor, width=1)
+        self.arrowLine = plotItem.plot(pen = pen)
+        self.topArrow = pg.ArrowItem(angle = 90, tipAngle = 40, headLen=10, pen = None, brush = arrowColor)
+        self.bottomArrow = pg.ArrowItem(angle = -90, tipAngle = 40, headLen=10, pen = None, brush = arrowColor)
+        self.textItem = pg.TextItem(color='k', anchor=(xanchor, 0.5))
 
-    # How much space should be left between the tips of the arrows and the specified Y positions
-    # This is to make it even clearer that the arrow is not part of the burndown when seen from a distance
-    arrowOffset = 0.25
+        self.items = [self.arrowLine, self.topArrow, self.bottomArrow, self.textItem]
+        for item in self.items[1:]:
+            plotItem.addItem(item)
+        self.hide()
 
-    arrowTop = max(y1, y2) - arrowOffset
-    arrowBottom = min(y1, y2) + arrowOffset
+    def show(self, x, y1, y2, text):
+        # How much space should be left between the tips of the arrows and the specified Y positions
+        # This is to make it even clearer that the arrow is not part of the burndown when seen from a distance
+        arrowOffset = 0.25
 
-    arrowLine = [ (x, arrowTop),
-                  (x, arrowBottom) ]
-    plotItem.plot(np.array(arrowLine), pen = pen)
+        arrowTop = max(y1, y2) - arrowOffset
+        arrowBottom = min(y1, y2) + arrowOffset
 
-    plotItem.addItem(pg.ArrowItem(pos = (x, arrowTop), angle = 90, tipAngle = 40, headLen=10, pen = None, brush = arrowColor))
-    plotItem.addItem(pg.ArrowItem(pos = (x, arrowBottom), angle = -90, tipAngle = 40, headLen=10, pen = None, brush = arrowColor))
+        self.arrowLine.setData(x = [x, x], y = [arrowTop, arrowBottom])
+        self.topArrow.setPos(x, arrowTop)
+        self.bottomArrow.setPos(x, arrowBottom)
+        self.textItem.setText(text)
+        self.textItem.setPos(x, (arrowTop + arrowBottom) / 2)
 
-    textItem = pg.TextItem(text=text, color='k', anchor=(xanchor, 0.5))
-    textItem.setPos(x, (arrowTop + arrowBottom) / 2)
-    plotItem.addItem(textItem)
+        for item in self.items:
+            item.show()
 
-def annotateBudgetOverrun(plotItem, max_x, projectedBurnupHeight):
-    max_x = timestamp_to_seconds(max_x)
+    def hide(self):
+        for item in self.items:
+            item.hide()
 
+def annotateBudgetOverrun(arrow, max_x, projectedBurnupHeight):
     points = round(abs(projectedBurnupHeight))
     if points >= 2:
-        drawVerticalAnnotatedArrow(plotItem, max_x, 0, projectedBurnupHeight, '%d pts' % points, 0)
-
-def annotatePointsBehind(plotItem, currentTimestamp, currentIdealBurndownValue, currentActualBurndownValue):
-    x = timestamp_to_seconds(currentTimestamp)
+        arrow.show(max_x, 0, projectedBurnupHeight, '%d pts' % points)
+    else:
+        arrow.hide()
 
+def annotatePointsBehind(arrow, currentTimestamp, currentIdealBurndownValue, currentActualBurndownValue):
     points = round(abs(currentIdealBurndownValue - currentActualBurndownValue))
     if points >= 2:
-        drawVerticalAnnotatedArrow(plotItem, x, currentIdealBurndownValue, currentActualBurndownValue, '%d pts' % points, 1)
-
-def updateChart(jira, plotItem, boardId, sprintId, burnupBudget, availability):
-    #
-    # Gather all data
-    #
-    sprintStart, sprintEnd = jira.getSprintDates(boardId, sprintId)
-
-    log("Sprint start is %s" % sprintStart)
-    log("Sprint end   is %s" % sprintEnd)
-
-    weekends = determineSprintWeekends(sprintStart, sprintEnd)
-
-    zeroData = getZeroData(sprintStart, sprintEnd)
-    axisData = createDayLabels(sprintStart, sprintEnd)
-    gridData = createDayLines(sprintStart, sprintEnd)
-
-
-    # Burndown
-    scopeChangeBurndownChart = jira.getScopeChangeBurndownChart(boardId, sprintId)
-    scopeChangingIssues = getScopeChangingIssues(sprintStart, sprintEnd, scopeChangeBurndownChart)
-    currentTime = getCurrentTimeFromBurndown(scopeChangeBurndownChart)
-    effortForIssues = jira.getEffortForIssues(boardId, scopeChangingIssues['names'])
-
-    initialSprintScope = getInitialScope(scopeChangingIssues['initial'], effortForIssues)
-    sprintScopeData = calculateScopeChanges(sprintStart, sprintEnd, scopeChangingIssues['changes'], effortForIssues)
-
-    finalSprintScope = initialSprintScope + sprintScopeData[-1][1]
-
-    idealBurndownData = getIdealBurndown(sprintStart, sprintEnd, finalSprintScope)
-
-    issues = jira.getIssues(boardId, sprintId)
-    issues.sort(key=byResolutionDate)
-    actualBurndownData = getActualBurndown(sprintStart, sprintEnd, currentTime, finalSprintScope, issues)
-
-
-    # Burnup
-
-    try:
-        pointsPerHour = initialSprintScope / (availability - burnupBudget)
-    except ZeroDivisionError:
-        pointsPerHour = 0
-
-    issueWorklogs = jira.getIssueWorklogs(sprintStart, sprintEnd)
-    actualBurnupData = calculateActualBurnup(sprintStart, sprintEnd, currentTime, issueWorklogs, burnupBudget, pointsPerHour)
-
-    idealBurnupData = calculateIdealBurnup(sprintStart, sprintEnd, burnupBudget * pointsPerHour)
-
-
-
-    # 
-    # Remove all weekends
-    #
-    adjustForHiddenWeekends(zeroData, weekends)
-    adjustForHiddenWeekends(sprintScopeData, weekends)
-    adjustForHiddenWeekends(idealBurndownData, weekends)
-    adjustForHiddenWeekends(actualBurndownData, weekends)
-    adjustForHiddenWeekends(axisData, weekends)
-    adjustForHiddenWeekends(gridData, weekends)
-    adjustForHiddenWeekends(actualBurnupData, weekends)
-    adjustForHiddenWeekends(idealBurnupData, weekends)
-
-    projectedBurnupData = calculateProjectedBurnup(zeroData, actualBurnupData)
-
-    projectedBurnupHeight = projectedBurnupData[-1][1]
-    expectedBurndownData = calculateExpectedBurndown(sprintStart, sprintEnd, finalSprintScope, projectedBurnupHeight)
-    adjustForHiddenWeekends(expectedBurndownData, weekends)
-
-
-    # 
-    # Plot
-    #
-
-    plotItem.clear()
-    plotItem.getAxis('bottom').setTicks([x_timestamps_to_seconds(axisData)])
+        arrow.show(currentTimestamp, currentIdealBurndownValue, currentActualBurndownValue, '%d pts' % points)
+    else:
+        arrow.hide()
 
-    min_x = timestamp_to_seconds(zeroData[0][0])
-    max_x = timestamp_to_seconds(zeroData[-1][0]) + 24 * 3600
-    min_y = -burnupBudget * pointsPerHour * 1.1
-    max_y = finalSprintScope * 1.05
+class ChartPlot():
+    ''' ChartPlot draws ChartData on a plotItem. The curves and annotations
+        are created once and updated with setData for every chart that is
+        plotted, so redrawing does not create and destroy any Qt objects.
+    '''
 
-    plotItem.setRange(QtCore.QRectF(min_x, min_y, max_x - min_x, max_y - min_y), padding = 0)
+    def __init__(self, plotItem):
+        self.plotItem = plotItem
 
-    createGridLineMarkings(plotItem, gridData)
-    createIdealBurndownLine(plotItem, idealBurndownData)
-    createIdealBurnupLine(plotItem, idealBurnupData)
-    createZeroLine(plotItem, zeroData)
-    createSprintScopeLine(plotItem, sprintScopeData)
-    createActualBurndownLine(plotItem, actualBurndownData)
-    createActualBurnupLine(plotItem, actualBurnupData)
-    createProjectedBurnupLine(plotItem, projectedBurnupData)
-    createExpectedBurndownLine(plotItem, expectedBurndownData)
+        self.plotItem.hideButtons()
+        self.plotItem.setMenuEnabled(enableMenu = False)
+        self.plotItem.getViewBox().setMouseEnabled(x = False, y = False)
 
-    currentTimestamp, currentActualBurndownValue = actualBurndownData[-1]
-    currentIdealBurndownValue = getIdealBurndownValueAtTimestamp(currentTimestamp, idealBurndownData)
+        self.plotItem.showGrid(x = False, y = True, alpha = 0.3)
+        self.plotItem.getAxis('bottom').setStyle(tickLength = 0)
+        self.plotItem.getAxis('left').setStyle(tickLength = 0)
 
-    annotateBudgetOverrun(plotItem, zeroData[-1][0], projectedBurnupHeight)
-    annotatePointsBehind(plotItem, currentTimestamp, currentIdealBurndownValue, currentActualBurndownValue)
+        self.gridLines = createGridLineMarkings(plotItem)
+        self.idealBurndownLine = createIdealBurndownLine(plotItem)
+        self.idealBurnupLine = createIdealBurnupLine(plotItem)
+        self.zeroLine = createZeroLine(plotItem)
+        self.sprintScopeLine = createSprintScopeLine(plotItem)
+        self.actualBurndownLine = createActualBurndownLine(plotItem)
+        self.actualBurnupLine = createActualBurnupLine(plotItem)
+        self.projectedBurnupLine = createProjectedBurnupLine(plotItem)
+        self.expectedBurndownLine = createExpectedBurndownLine(plotItem)
+
+        self.budgetOverrunArrow = VerticalAnnotatedArrow(plotItem, 0)
+        self.pointsBehindArrow = VerticalAnnotatedArrow(plotItem, 1)
+
+    def plot(self, chartData):
+        self.plotItem.getAxis('bottom').setTicks([list(zip(chartData.axisData.x, chartData.axisData.labels))])
+
+        min_x = chartData.zeroData.x[0]
+        max_x = chartData.zeroData.x[-1] + 24 * 3600
+        min_y = -chartData.burnupBudget * chartData.pointsPerHour * 1.1
+        max_y = chartData.finalSprintScope * 1.05
+
+        self.plotItem.setRange(QtCore.QRectF(min_x, min_y, max_x - min_x, max_y - min_y), padding = 0)
+
+        setGridLineData(self.gridLines, chartData.gridData, min_y, max_y)
+        setCurveData(self.idealBurndownLine, chartData.idealBurndownData)
+        setCurveData(self.idealBurnupLine, chartData.idealBurnupData)
+        setCurveData(self.zeroLine, chartData.zeroData)
+        setCurveData(self.sprintScopeLine, core.getSprintScopeLine(chartData.sprintScopeData))
+        setCurveData(self.actualBurndownLine, chartData.actualBurndownData.segments(True))
+        setCurveData(self.actualBurnupLine, chartData.actualBurnupData.segments(True))
+        setCurveData(self.projectedBurnupLine, chartData.projectedBurnupData)
+        setCurveData(self.expectedBurndownLine, chartData.expectedBurndownData)
+
+        currentTimestamp = chartData.actualBurndownData.x[-1]
+        currentActualBurndownValue = chartData.actualBurndownData.y[-1]
+        currentIdealBurndownValue = core.getIdealBurndownValueAtTimestamp(currentTimestamp, chartData.idealBurndownData)
+
+        annotateBudgetOverrun(self.budgetOverrunArrow, chartData.zeroData.x[-1], chartData.projectedBurnupHeight)
+        annotatePointsBehind(self.pointsBehindArrow, currentTimestamp, currentIdealBurndownValue, currentActualBurndownValue)
 
 class ConnectionDialog(QtGui.QDialog):
 
@@ -882,6 +284,7 @@ class Gui(QtCore.QObject):
     burnupBudgetChanged = QtCore.pyqtSignal(int)
     connectionDataChanged = QtCore.pyqtSignal(str, str, str, str)
     refreshButtonClicked = QtCore.pyqtSignal()
+    historyButtonClicked = QtCore.pyqtSignal()
 
     def __init__(self, jiraUrl, username, password, burnupIssueQuery):
         super().__init__()
@@ -890,6 +293,7 @@ class Gui(QtCore.QObject):
         self.username = username
         self.password = password
         self.burnupIssueQuery = burnupIssueQuery
+        self.timings = None
 
         self.main_window = QtGui.QMainWindow()
         self.main_window.setWindowTitle('JIRA burn-up-and-down')
@@ -907,6 +311,17 @@ class Gui(QtCore.QObject):
         refreshButton = QtGui.QPushButton('Refresh')
         refreshButton.clicked.connect(self._refreshButtonClicked)
 
+        historyButton = QtGui.QPushButton('Velocity history...')
+        historyButton.clicked.connect(self.historyButtonClicked.emit)
+
+        timingsLabel = QtGui.QLabel('Last update')
+        self.timingsText = QtGui.QLabel('')
+        self.timingsText.setWordWrap(True)
+
+        self.saveTimingsButton = QtGui.QPushButton('Save timings...')
+        self.saveTimingsButton.setEnabled(False)
+        self.saveTimingsButton.clicked.connect(self._saveTimings)
+
         boardLabel = QtGui.QLabel('Scrum board')
         sprintLabel = QtGui.QLabel('Sprint')
         availabilityLabel = QtGui.QLabel('Availability (hours)')
@@ -936,7 +351,8 @@ class Gui(QtCore.QObject):
 
         gridLayout.addWidget(configConnectionButton, 0, 0, 1, 2)
         gridLayout.addWidget(connectionStatusLabel, 0, 2)
-        gridLayout.addWidget(self.connectionStatusText, 0, 3, 1, 2)
+        gridLayout.addWidget(self.connectionStatusText, 0, 3)
+        gridLayout.addWidget(historyButton, 0, 4)
         gridLayout.addWidget(refreshButton, 0, 5)
         
         gridLayout.addWidget(boardLabel, 1, 0)
@@ -948,6 +364,9 @@ class Gui(QtCore.QObject):
         gridLayout.addWidget(burnupBudgetLabel, 2, 2)
         gridLayout.addWidget(self.burnupBudgetEdit, 2, 3, 1, 3)
         gridLayout.addWidget(graphFrame, 3, 0, 1, 6)
+        gridLayout.addWidget(timingsLabel, 4, 0)
+        gridLayout.addWidget(self.timingsText, 4, 1, 1, 4)
+        gridLayout.addWidget(self.saveTimingsButton, 4, 5)
 
         self.main_window.show()
 
@@ -989,6 +408,7 @@ class Gui(QtCore.QObject):
                 pixmap = getGraphPixmap()
                 pixmap.save(filename)
 
+        import pkg_resources
         iconsDir = pkg_resources.resource_filename(__name__, 'icons')
 
         saveas_btn.setIcon(QtGui.QIcon('%s/document-save-as.png' % iconsDir))
@@ -1037,6 +457,18 @@ class Gui(QtCore.QObject):
 
     def setConnectionStatus(self, text):
         self.connectionStatusText.setText(text)
+
+    def setTimings(self, timings):
+        self.timings = timings
+        self.timingsText.setText(timings.summarize())
+        self.timingsText.setToolTip(timings.describe())
+        self.saveTimingsButton.setEnabled(True)
+
+    def _saveTimings(self):
+        filename, _ = QtGui.QFileDialog.getSaveFileName(None, 'Save Timings', '', 'JSON (*.json)')
+        if filename:
+            with open(filename, 'wt') as f:
+                self.timings.dump(f)
     
     def setAvailability(self, availability):
         self.availabilityEdit.setText(availability)
@@ -1087,63 +519,641 @@ class Gui(QtCore.QObject):
             self.jiraUrl, self.username, self.password, self.burnupIssueQuery = connectionDialog.getConnectionData()
             self.connectionDataChanged.emit(self.jiraUrl, self.username, self.password, self.burnupIssueQuery)
             
-class Chart():
+class IssueStores():
+    ''' IssueStores opens the IssueStore of each Jira server in
+        storeDirectory the first time it is asked for and keeps it open
+        until close is called. One IssueStores is shared by the workers of
+        all threads, so they use the same connection to the database
+        instead of getting in each other's way with one each. Without a
+        storeDirectory there is no store.
+    '''
+
+    def __init__(self, storeDirectory = None):
+        self.storeDirectory = storeDirectory
+        self.lock = threading.Lock()
+        self.issueStores = {}
+
+    def get(self, url):
+        if not self.storeDirectory:
+            return None
+        with self.lock:
+            if url not in self.issueStores:
+                self.issueStores[url] = issuestore.openIssueStore(self.storeDirectory, url)
+            return self.issueStores[url]
+
+    def close(self):
+        with self.lock:
+            for issueStore in self.issueStores.values():
+                issueStore.close()
+            self.issueStores = {}
+
+class ChartWorker(QtCore.QObject):
+    ''' ChartWorker lives in a background thread and performs the Jira
+        requests for a chart, so the GUI thread does not block while they
+        are in progress. The outcome of each request is reported through
+        the finished or failed signal together with the requestId it was
+        started with. Requests that were replaced by a newer one while they
+        were queued are dropped without being reported.
+    '''
+
+    finished = QtCore.pyqtSignal(int, object)
+    failed = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, jira, issueStores = None):
+        super().__init__()
+        self.jira = jira
+
+        # Issues of the sprint that was requested last, so that refreshes
+        # of that sprint only have to request the issues that were updated
+        self.retainedSprint = None
+        self.retainedIssues = {}
+
+        # Issues of all sprints that were requested before are kept on
+        # disk in a separate store for each Jira server
+        self.issueStores = issueStores or IssueStores()
+
+        # The id of the most recent request, which is set from the GUI
+        # thread as soon as the request is made
+        self.latestRequestId = 0
+
+    def setLatestRequestId(self, requestId):
+        self.latestRequestId = requestId
+
+    def _getIssueStore(self):
+        return self.issueStores.get(self.jira.url)
+
+    def _getRetainedIssues(self, boardId, sprintId):
+        # Retained issues are only valid for the server they came from
+        if (self.jira.url, boardId, sprintId) != self.retainedSprint:
+            self.retainedSprint = (self.jira.url, boardId, sprintId)
+            self.retainedIssues = {}
+        return self.retainedIssues
+
+    @QtCore.pyqtSlot(int, int, int)
+    def fetch(self, requestId, boardId, sprintId):
+        if requestId < self.latestRequestId:
+            return
+
+        retainedIssues = self._getRetainedIssues(boardId, sprintId)
+
+        try:
+            issueStore = self._getIssueStore()
+            sprintData = core.fetchSprintData(self.jira, boardId, sprintId, retainedIssues, issueStore,
+                                              instrumentation.Timings())
+        except Exception as e:
+            self.failed.emit(requestId, e)
+        else:
+            self.finished.emit(requestId, sprintData)
+
+class PrefetchWorker(QtCore.QObject):
+    ''' PrefetchWorker requests the data of sprints that are likely to be
+        selected next, in a background thread of its own. The data of each
+        sprint is reported through the prefetched signal. A batch of
+        sprints can be cancelled from any thread, after which no more
+        requests are sent for it, not even for the sprint that is being
+        requested. Its requests are sent with background priority, so they
+        never hold up the requests of the chart.
+    '''
+
+    prefetched = QtCore.pyqtSignal(object)
+
+    def __init__(self, jira, issueStores = None):
+        super().__init__()
+        self.jira = jira
+        self.issueStores = issueStores or IssueStores()
+
+        # Batches with a lower id than this have been cancelled
+        self.firstValidBatchId = 0
+
+    def cancel(self, batchId):
+        self.firstValidBatchId = batchId + 1
+
+    @QtCore.pyqtSlot(int, object)
+    def prefetch(self, batchId, targets):
+        ''' Requests the data of the (boardId, sprintId) pairs in targets.
+            A sprintId of None stands for the active sprint of the board.
+        '''
+        def isCancelled():
+            return batchId < self.firstValidBatchId
+
+        for boardId, sprintId in targets:
+            if isCancelled():
+                return
+
+            # Prefetching is only an optimization, so failures are ignored
+            try:
+                with requestscheduler.background(), requestscheduler.cancellable(isCancelled):
+                    if sprintId is None:
+                        sprintId = getActiveSprintId(self.jira.getSprints(boardId))
+                        if sprintId is None:
+                            continue
+                    sprintData = core.fetchSprintData(self.jira, boardId, sprintId, {}, self.issueStores.get(self.jira.url),
+                                                      instrumentation.Timings())
+            except requestscheduler.Cancelled:
+                return
+            except Exception as e:
+                core.log('Prefetching sprint %s of board %s failed: %s' % (sprintId, boardId, e))
+            else:
+                self.prefetched.emit(sprintData)
+
+class AsyncChartWorker(ChartWorker):
+    ''' AsyncChartWorker performs the Jira requests for a chart with an
+        AsyncJira6 on the asyncio event loop of the GUI thread instead of in
+        a thread of its own. A fetch that is still in progress when the
+        next one is started is cancelled, because only the result of the
+        most recent request is plotted anyway.
+    '''
+
+    def __init__(self, jira, issueStores = None):
+        super().__init__(jira, issueStores)
+        self.task = None
+
+    def fetch(self, requestId, boardId, sprintId):
+        if self.task:
+            self.task.cancel()
+        self.task = asyncio.ensure_future(self._fetch(requestId, boardId, sprintId))
+
+    def cancel(self):
+        if self.task:
+            self.task.cancel()
+
+    async def _fetch(self, requestId, boardId, sprintId):
+        retainedIssues = self._getRetainedIssues(boardId, sprintId)
+
+        try:
+            issueStore = self._getIssueStore()
+            sprintData = await asyncjira.fetchSprintData(self.jira, boardId, sprintId, retainedIssues, issueStore,
+                                                         instrumentation.Timings())
+        except Exception as e:
+            self.failed.emit(requestId, e)
+        else:
+            self.finished.emit(requestId, sprintData)
+
+class AsyncPrefetchWorker(QtCore.QObject):
+    ''' AsyncPrefetchWorker requests the data of the sprints of a batch with
+        an AsyncJira6 on the asyncio event loop of the GUI thread, one sprint
+        after the other and with background priority, so prefetching only
+        ever takes up a few of its connections. Cancelling a batch cancels
+        the requests that are still in progress for it.
+    '''
+
+    prefetched = QtCore.pyqtSignal(object)
+
+    def __init__(self, jira, issueStores = None):
+        super().__init__()
+        self.jira = jira
+        self.issueStores = issueStores or IssueStores()
+
+        # Batches with a lower id than this have been cancelled
+        self.firstValidBatchId = 0
+        self.tasks = {}
+
+    def cancel(self, batchId):
+        self.firstValidBatchId = batchId + 1
+        for cancelledBatchId in [b for b in self.tasks if b <= batchId]:
+            self.tasks.pop(cancelledBatchId).cancel()
+
+    def prefetch(self, batchId, targets):
+        if batchId < self.firstValidBatchId:
+            return
+        self.tasks[batchId] = asyncio.ensure_future(self._prefetch(batchId, targets))
+
+    async def _prefetch(self, batchId, targets):
+        try:
+            with requestscheduler.background():
+                for boardId, sprintId in targets:
+                    await self._prefetchSprint(boardId, sprintId)
+        finally:
+            self.tasks.pop(batchId, None)
+
+    async def _prefetchSprint(self, boardId, sprintId):
+        # Prefetching is only an optimization, so failures are ignored
+        try:
+            if sprintId is None:
+                sprintId = getActiveSprintId(await self.jira.getSprints(boardId))
+                if sprintId is None:
+                    return
+            sprintData = await asyncjira.fetchSprintData(self.jira, boardId, sprintId, {}, self.issueStores.get(self.jira.url),
+                                                         instrumentation.Timings())
+        except Exception as e:
+            core.log('Prefetching sprint %s of board %s failed: %s' % (sprintId, boardId, e))
+        else:
+            self.prefetched.emit(sprintData)
+
+def getActiveSprintId(sprints):
+    ''' Returns the id of the active sprint or the last sprint if none is active '''
+    active = [sprintId for sprintId, sprint in sprints.items() if sprint.get('state', '').lower() == 'active']
+    return max(active or sprints, default = None)
+
+class Prefetcher(QtCore.QObject):
+    ''' Prefetcher keeps the data of recently shown and prefetched sprints in
+        a cache of at most maxSprints sprints. When no chart has been
+        requested for idleDelay milliseconds, it prefetches the sprints
+        before and after the current sprint and the active sprints of the
+        boards that were used recently, using a PrefetchWorker in a
+        low-priority thread. Prefetching is cancelled as soon as a chart is
+        requested. If an AsyncJira6 is passed in asyncJira, the sprints are
+        requested with it by an AsyncPrefetchWorker instead.
+    '''
+
+    prefetchRequested = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, jira, issueStores = None, recentBoards = (), maxSprints = 10, maxRecentBoards = 3, idleDelay = 2000,
+                 asyncJira = None):
+        super().__init__()
+
+        self.jira = jira
+        self.maxSprints = maxSprints
+        self.maxRecentBoards = maxRecentBoards
+        self.recentBoards = list(recentBoards)[:maxRecentBoards]
+
+        self.cache = collections.OrderedDict()
+        self.sprintIds = []
+        self.current = None
+        self.lastBatchId = 0
+
+        self.idleTimer = QtCore.QTimer()
+        self.idleTimer.setSingleShot(True)
+        self.idleTimer.setInterval(idleDelay)
+        self.idleTimer.timeout.connect(self._prefetch)
+
+        if asyncJira:
+            self.workerThread = None
+            self.worker = AsyncPrefetchWorker(asyncJira, issueStores)
+        else:
+            self.workerThread = QtCore.QThread()
+            self.worker = PrefetchWorker(jira, issueStores)
+            self.worker.moveToThread(self.workerThread)
+        self.prefetchRequested.connect(self.worker.prefetch)
+        self.worker.prefetched.connect(self.put)
+        if self.workerThread:
+            self.workerThread.start(QtCore.QThread.LowestPriority)
+
+    def shutdown(self):
+        self.idleTimer.stop()
+        self.worker.cancel(self.lastBatchId)
+        if self.workerThread:
+            self.workerThread.quit()
+            self.workerThread.wait()
+
+    def get(self, boardId, sprintId):
+        key = (self.jira.url, boardId, sprintId)
+        if key not in self.cache:
+            return None
+        self.cache.move_to_end(key)
+        return self.cache[key]
+
+    def put(self, sprintData):
+        key = (self.jira.url, sprintData.boardId, sprintData.sprintId)
+        self.cache[key] = sprintData
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.maxSprints:
+            self.cache.popitem(last = False)
+
+    def setSprints(self, sprints):
+        ''' Sets the (id, name) pairs of the sprints of the current board '''
+        self.sprintIds = sorted(sprintId for sprintId, _ in sprints)
+
+    def foregroundStarted(self):
+        self.idleTimer.stop()
+        self.worker.cancel(self.lastBatchId)
+
+    def foregroundFinished(self, boardId, sprintId):
+        self.current = (boardId, sprintId)
+
+        if boardId in self.recentBoards:
+            self.recentBoards.remove(boardId)
+        self.recentBoards.insert(0, boardId)
+        del self.recentBoards[self.maxRecentBoards:]
+
+        self.idleTimer.start()
+
+    def _prefetch(self):
+        boardId, sprintId = self.current
+        targets = []
+
+        if sprintId in self.sprintIds:
+            index = self.sprintIds.index(sprintId)
+            targets.extend((boardId, neighbour) for neighbour in self.sprintIds[max(0, index - 1):index + 2]
+                           if neighbour != sprintId)
+
+        # Boards of which any sprint is cached are skipped, because the
+        # active sprint of a board is only known after requesting it
+        cachedBoards = set(cachedBoardId for _, cachedBoardId, _ in self.cache)
+        targets.extend((recentBoard, None) for recentBoard in self.recentBoards if recentBoard not in cachedBoards)
+
+        targets = [target for target in targets if (self.jira.url,) + target not in self.cache]
+        if targets:
+            self.lastBatchId += 1
+            self.prefetchRequested.emit(self.lastBatchId, targets)
+
+class Chart(QtCore.QObject):
     ''' Chart draws a burndown chart on a plotItem given a boardId, sprintId,
         availability and burnupBudget. It requests all other data about the
-        given sprint from Jira.
+        given sprint from Jira using a ChartWorker in a background thread
+        and emits updateFailed with the exception if that fails.
+
+        The data of the sprint is kept after it has been requested, so a
+        change of only the availability or burnupBudget is drawn right away
+        without contacting Jira. The data of other sprints that were shown
+        or prefetched recently is kept by a Prefetcher, so selecting one of
+        those sprints draws its chart right away as well. It is requested
+        again in the background if it is older than maxCachedAge seconds.
+
+        Every time a chart is drawn, the Timings of calculating and drawing
+        it are emitted with timingsChanged, together with those of requesting
+        its data if the data was requested for this update. Charts that are
+        drawn again or drawn from kept data only include the former.
+
+        If an AsyncJira6 is passed in asyncJira, the data is requested with
+        it on the asyncio event loop of the GUI thread instead.
     '''
-    def __init__(self, jira, plotItem):
+
+    maxCachedAge = 60
+
+    fetchRequested = QtCore.pyqtSignal(int, int, int)
+    updateFailed = QtCore.pyqtSignal(object)
+    timingsChanged = QtCore.pyqtSignal(object)
+
+    def __init__(self, jira, plotItem, issueStores = None, nonWorkingDays = (5, 6), holidays = (), recentBoards = (),
+                 asyncJira = None):
+        super().__init__()
+
         self.jira = jira
         self.plotItem = plotItem
+        self.nonWorkingDays = nonWorkingDays
+        self.holidays = holidays
 
         self.boardId = None
         self.sprintId = None
         self.burnupBudget = 0
         self.availability = 0
 
-        self.plotItem.hideButtons()
-        self.plotItem.setMenuEnabled(enableMenu = False)
-        self.plotItem.getViewBox().setMouseEnabled(x = False, y = False)
+        # The data of the sprint that was requested last
+        self.sprintData = None
 
-        self.plotItem.showGrid(x = False, y = True, alpha = 0.3)
-        self.plotItem.getAxis('bottom').setStyle(tickLength = 0)
-        self.plotItem.getAxis('left').setStyle(tickLength = 0)
+        # Only the result of the most recent request is plotted
+        self.lastRequestId = 0
+
+        self.chartPlot = ChartPlot(self.plotItem)
+
+        self.prefetcher = Prefetcher(jira, issueStores, recentBoards, asyncJira = asyncJira)
+
+        if asyncJira:
+            self.workerThread = None
+            self.worker = AsyncChartWorker(asyncJira, issueStores)
+        else:
+            self.workerThread = QtCore.QThread()
+            self.worker = ChartWorker(jira, issueStores)
+            self.worker.moveToThread(self.workerThread)
+        self.fetchRequested.connect(self.worker.fetch)
+        self.worker.finished.connect(self._fetchFinished)
+        self.worker.failed.connect(self._fetchFailed)
+        if self.workerThread:
+            self.workerThread.start()
+
+    def shutdown(self):
+        self.prefetcher.shutdown()
+        if self.workerThread:
+            self.workerThread.quit()
+            self.workerThread.wait()
+        else:
+            self.worker.cancel()
 
     def updateChart(self, boardId, sprintId, availability, burnupBudget):
+        sprintChanged = (boardId, sprintId) != (self.boardId, self.sprintId)
+
         self.boardId = boardId
         self.sprintId = sprintId
         self.availability = availability
         self.burnupBudget = burnupBudget
+
+        # A refresh of the current sprint always requests its data again
+        if sprintChanged:
+            cached = self.prefetcher.get(boardId, sprintId)
+            if cached:
+                self.sprintData = cached
+                self._plotIfPossible()
+                if time.time() - cached.fetchedAt < self.maxCachedAge:
+                    self.lastRequestId += 1
+                    self.worker.setLatestRequestId(self.lastRequestId)
+                    self.prefetcher.foregroundFinished(boardId, sprintId)
+                    return
+
         self._updateChartIfPossible()
 
+    def setHours(self, availability, burnupBudget):
+        self.availability = availability
+        self.burnupBudget = burnupBudget
+        self._plotIfPossible()
+
     def _updateChartIfPossible(self):
         if (self.boardId != None and
             self.sprintId != None):
-            updateChart(self.jira, self.plotItem, self.boardId, self.sprintId, self.burnupBudget, self.availability)
+            self.lastRequestId += 1
+            self.worker.setLatestRequestId(self.lastRequestId)
+            self.prefetcher.foregroundStarted()
+            self.fetchRequested.emit(self.lastRequestId, self.boardId, self.sprintId)
+
+    def _plotIfPossible(self, includeFetch = False):
+        if (self.sprintData and
+            (self.sprintData.boardId, self.sprintData.sprintId) == (self.boardId, self.sprintId)):
+            # The Timings of the data are copied, because the data may be
+            # drawn again from the prefetcher's cache
+            if includeFetch and self.sprintData.timings:
+                timings = self.sprintData.timings.copy()
+            else:
+                timings = instrumentation.Timings()
+            try:
+                with timings.stage('compute'):
+                    chartData = core.calculateChart(self.sprintData, self.burnupBudget, self.availability,
+                                                    self.nonWorkingDays, self.holidays, timings)
+            except Exception as e:
+                self.updateFailed.emit(e)
+            else:
+                with timings.stage('plot'):
+                    self.chartPlot.plot(chartData)
+                self.timingsChanged.emit(timings)
+
+    def _fetchFinished(self, requestId, sprintData):
+        self.prefetcher.put(sprintData)
+        if requestId == self.lastRequestId:
+            self.sprintData = sprintData
+            self._plotIfPossible(includeFetch = True)
+            self.prefetcher.foregroundFinished(sprintData.boardId, sprintData.sprintId)
+
+    def _fetchFailed(self, requestId, exception):
+        if requestId == self.lastRequestId:
+            self.updateFailed.emit(exception)
+
+class HistoryPlot():
+    ''' HistoryPlot draws a list of SprintSummaries on two plotItems: the
+        committed, completed, added and removed points of each sprint as
+        grouped bars on the first and the hours by which each sprint
+        exceeded its burnup budget on the second. Sprints without a burnup
+        budget get no overrun bar.
+    '''
 
-class HoursManager():
-    ''' HoursManager maintains the availability and burnupBudget associated
-        with each sprint.
+    barWidth = 0.2
+
+    def __init__(self, pointsPlotItem, overrunPlotItem):
+        self.pointsPlotItem = pointsPlotItem
+        self.overrunPlotItem = overrunPlotItem
+
+        for plotItem in (pointsPlotItem, overrunPlotItem):
+            plotItem.hideButtons()
+            plotItem.setMenuEnabled(enableMenu = False)
+            plotItem.getViewBox().setMouseEnabled(x = False, y = False)
+            plotItem.showGrid(x = False, y = True, alpha = 0.3)
+            plotItem.getAxis('bottom').setStyle(tickLength = 0)
+            plotItem.getAxis('left').setStyle(tickLength = 0)
+
+        pointsPlotItem.setLabel('left', 'Points')
+        overrunPlotItem.setLabel('left', 'Budget overrun (hours)')
+        overrunPlotItem.setXLink(pointsPlotItem)
+
+        pointsPlotItem.addLegend(offset = (-10, 10))
+        self.pointsBars = []
+        for i, (name, color) in enumerate([('Committed', (100, 100, 100)),
+                                           ('Completed', (0, 150, 0)),
+                                           ('Added', (0, 0, 200)),
+                                           ('Removed', (200, 150, 0))]):
+            bars = pg.BarGraphItem(x = [], height = [], width = self.barWidth, brush = pg.mkBrush(color), pen = None, name = name)
+            pointsPlotItem.addItem(bars)
+            self.pointsBars.append(((i - 1.5) * self.barWidth, bars))
+
+        self.overrunBars = pg.BarGraphItem(x = [], height = [], width = 4 * self.barWidth, pen = None)
+        overrunPlotItem.addItem(self.overrunBars)
+
+    def plot(self, summaries, burnupBudgets):
+        x = np.arange(len(summaries))
+        ticks = [list(zip(x, [summary.name for summary in summaries]))]
+        self.pointsPlotItem.getAxis('bottom').setTicks(ticks)
+        self.overrunPlotItem.getAxis('bottom').setTicks(ticks)
+
+        values = [[summary.committed for summary in summaries],
+                  [summary.completed for summary in summaries],
+                  [summary.scopeAdded for summary in summaries],
+                  [summary.scopeRemoved for summary in summaries]]
+        for (offset, bars), heights in zip(self.pointsBars, values):
+            bars.setOpts(x = x + offset, height = heights)
+
+        overruns = [summary.hoursSpent - burnupBudget if burnupBudget is not None else 0
+                    for summary, burnupBudget in zip(summaries, burnupBudgets)]
+        self.overrunBars.setOpts(x = x, height = overruns,
+                                 brushes = [pg.mkBrush('r' if overrun > 0 else 'g') for overrun in overruns])
+
+        self.pointsPlotItem.setXRange(-0.5, len(summaries) - 0.5, padding = 0)
+
+class HistoryWorker(QtCore.QObject):
+    ''' HistoryWorker calculates the velocity history of a board in a
+        background thread and reports the list of SprintSummaries through
+        the finished signal. Its requests are sent with background priority.
     '''
-    def __init__(self, hours):
-        self.hours = copy.deepcopy(hours)
 
-    def getHours(self, boardId, sprintId):
-        if boardId not in self.hours:
-            self.hours[boardId] = {}
+    finished = QtCore.pyqtSignal(int, object)
+    failed = QtCore.pyqtSignal(int, object)
 
-        if sprintId not in self.hours[boardId]:
-            self.hours[boardId][sprintId] = (0, 0)
+    def __init__(self, jira, issueStores = None):
+        super().__init__()
+        self.jira = jira
+        self.issueStores = issueStores or IssueStores()
 
-        return self.hours[boardId][sprintId]
+    @QtCore.pyqtSlot(int, int, int)
+    def summarize(self, requestId, boardId, count):
+        try:
+            with requestscheduler.background():
+                summaries = core.getVelocityHistory(self.jira, boardId, count, self.issueStores.get(self.jira.url))
+        except Exception as e:
+            self.failed.emit(requestId, e)
+        else:
+            self.finished.emit(requestId, summaries)
+
+class VelocityHistory(QtCore.QObject):
+    ''' VelocityHistory shows a window with the velocity history of the last
+        sprints of a board. The history is calculated by a HistoryWorker in
+        a background thread and emits updateFailed with the exception if
+        that fails. The budget overrun of each sprint is calculated from
+        the burnup budget in the HoursManager whenever it is plotted, so a
+        change of the budget does not require the history to be
+        calculated again. Looking up the budgets does not add the sprints
+        to the HoursManager.
+    '''
 
-    def setAvailability(self, boardId, sprintId, availability):
-        _, old_budget = self.getHours(boardId, sprintId)
-        self.hours[boardId][sprintId] = (availability, old_budget)
+    historyRequested = QtCore.pyqtSignal(int, int, int)
+    updateFailed = QtCore.pyqtSignal(object)
 
-    def setBurnupBudget(self, boardId, sprintId, burnupBudget):
-        old_avail, _ = self.getHours(boardId, sprintId)
-        self.hours[boardId][sprintId] = (old_avail, burnupBudget)
+    def __init__(self, jira, hoursManager, issueStores = None, sprintCount = 8):
+        super().__init__()
+
+        self.hoursManager = hoursManager
+        self.boardId = None
+        self.summaries = []
+        self.lastRequestId = 0
+
+        self.window = QtGui.QWidget()
+        self.window.setWindowTitle('Velocity history')
+
+        sprintCountLabel = QtGui.QLabel('Number of sprints')
+        self.sprintCountSpinBox = QtGui.QSpinBox()
+        self.sprintCountSpinBox.setRange(1, 50)
+        self.sprintCountSpinBox.setValue(sprintCount)
+        self.sprintCountSpinBox.editingFinished.connect(self._updateHistoryIfPossible)
+        self.statusLabel = QtGui.QLabel('')
+
+        layoutWidget = pg.GraphicsLayoutWidget()
+        self.historyPlot = HistoryPlot(layoutWidget.addPlot(row = 0, col = 0), layoutWidget.addPlot(row = 1, col = 0))
+
+        gridLayout = QtGui.QGridLayout()
+        self.window.setLayout(gridLayout)
+        gridLayout.addWidget(sprintCountLabel, 0, 0)
+        gridLayout.addWidget(self.sprintCountSpinBox, 0, 1)
+        gridLayout.addWidget(self.statusLabel, 0, 2)
+        gridLayout.addWidget(layoutWidget, 1, 0, 1, 3)
+        gridLayout.setColumnStretch(2, 1)
+        self.window.resize(800, 600)
+
+        self.workerThread = QtCore.QThread()
+        self.worker = HistoryWorker(jira, issueStores)
+        self.worker.moveToThread(self.workerThread)
+        self.historyRequested.connect(self.worker.summarize)
+        self.worker.finished.connect(self._historyFinished)
+        self.worker.failed.connect(self._historyFailed)
+        self.workerThread.start()
+
+    def shutdown(self):
+        self.window.close()
+        self.workerThread.quit()
+        self.workerThread.wait()
+
+    def show(self, boardId):
+        self.window.show()
+        self.window.raise_()
+        if boardId != self.boardId:
+            self.boardId = boardId
+            self._updateHistoryIfPossible()
+
+    def replot(self):
+        if self.summaries:
+            burnupBudgets = [self.hoursManager.findBurnupBudget(self.boardId, summary.sprintId) for summary in self.summaries]
+            self.historyPlot.plot(self.summaries, burnupBudgets)
+
+    def _updateHistoryIfPossible(self):
+        if self.boardId != None:
+            self.lastRequestId += 1
+            self.statusLabel.setText('Calculating...')
+            self.historyRequested.emit(self.lastRequestId, self.boardId, self.sprintCountSpinBox.value())
+
+    def _historyFinished(self, requestId, summaries):
+        if requestId == self.lastRequestId:
+            self.statusLabel.setText('')
+            self.summaries = summaries
+            self.replot()
+
+    def _historyFailed(self, requestId, exception):
+        if requestId == self.lastRequestId:
+            self.statusLabel.setText('Failed')
+            self.updateFailed.emit(exception)
 
 class Model(QtCore.QObject):
     ''' Model maintains the available boards and sprints as well as the
@@ -1161,6 +1171,7 @@ class Model(QtCore.QObject):
     boardListChanged = QtCore.pyqtSignal(list)
     sprintListChanged = QtCore.pyqtSignal(list)
     selectedSprintChanged = QtCore.pyqtSignal(int, int, int, int)
+    hoursChanged = QtCore.pyqtSignal(int, int)
 
     def __init__(self, jira, hoursManager, currentBoard, currentSprint):
         super().__init__()
@@ -1206,8 +1217,11 @@ class Model(QtCore.QObject):
 
         self._updateHours()
 
-    def _updateHours(self):
+    def _getHours(self):
         self.availability, self.burnupBudget = self.hoursManager.getHours(self.currentBoard, self.currentSprint) if self.currentBoard != None and self.currentSprint != None else (0, 0)
+
+    def _updateHours(self):
+        self._getHours()
         self.selectedSprintChanged.emit(self.currentBoard, self.currentSprint, self.availability, self.burnupBudget)
 
     def setBoard(self, boardId):
@@ -1222,16 +1236,21 @@ class Model(QtCore.QObject):
 
     def setAvailability(self, availability):
         self.hoursManager.setAvailability(self.currentBoard, self.currentSprint, availability)
-        self._updateHours()
+        self._getHours()
+        self.hoursChanged.emit(self.availability, self.burnupBudget)
 
     def setBurnupBudget(self, burnupBudget):
         self.hoursManager.setBurnupBudget(self.currentBoard, self.currentSprint, burnupBudget)
-        self._updateHours()
+        self._getHours()
+        self.hoursChanged.emit(self.availability, self.burnupBudget)
 
 def main():
+    import requests
+
     app = QtGui.QApplication([])
 
-    loadConfiguration()
+    core.loadConfiguration()
+    core.logging = core.config['logging']
 
     pg.setConfigOption('background', 'w')
     pg.setConfigOption('foreground', 'k')
@@ -1246,15 +1265,50 @@ def main():
     # The second is to start up the fakejira.py script and have this script
     # connect to localhost:8080.
 
-    jiraClass = Jira6 if jiraVersion == 6 else Jira7
-    jira = jiraClass(config['jiraurl'], config['username'], config['burnupIssueQuery'], readFromFile = False, writeToFile = False)
+    jiraClass = core.Jira6 if core.jiraVersion == 6 else core.Jira7
+    responseCache = responsecache.ResponseCache(core.cache_dir)
+    scheduler = requestscheduler.RequestScheduler(core.config['requestsPerSecond'], core.config['requestBurst'])
+    # The Model requests the boards and sprints from the GUI thread, which
+    # must not sleep when Jira throttles requests. Those requests fail
+    # instead and are made again when the timer below goes off.
+    requestscheduler.mayWait.set(False)
+    jira = jiraClass(core.config['jiraurl'], core.config['username'], core.config['burnupIssueQuery'], readFromFile = False, writeToFile = False,
+                     responseCache = responseCache, streamResponses = core.config['streamResponses'], scheduler = scheduler)
+
+    # Charts can be requested on an asyncio event loop that runs Qt's
+    # event loop as well, so the GUI stays responsive without a thread per
+    # request. The board and sprint lists and the velocity history are
+    # still requested with jira.
+    loop = None
+    asyncJira = None
+    requestErrors = (requests.exceptions.ConnectionError, requests.exceptions.HTTPError, requestscheduler.Throttled)
+    connectionErrors = (requests.exceptions.ConnectionError,)
+    if core.config['asyncRequests']:
+        try:
+            import aiohttp
+            import qasync
+        except ImportError as e:
+            core.log('Not using asynchronous requests: %s' % e)
+        else:
+            if core.jiraVersion == 6:
+                loop = qasync.QEventLoop(app)
+                asyncio.set_event_loop(loop)
+                asyncJira = asyncjira.AsyncJira6(core.config['jiraurl'], core.config['username'], core.config['burnupIssueQuery'],
+                                                 responseCache = responseCache, scheduler = scheduler)
+                requestErrors += (aiohttp.ClientConnectionError, aiohttp.ClientResponseError)
+                connectionErrors += (aiohttp.ClientConnectionError,)
+            else:
+                core.log('Not using asynchronous requests: they are only supported for Jira 6')
 
-    hoursManager = HoursManager(config['hours'])
-    model = Model(jira, hoursManager, config['currentBoard'], config['currentSprint'])
-    gui = Gui(config['jiraurl'], config['username'], '', config['burnupIssueQuery'])
-    chart = Chart(jira, gui.getPlotWidget().getPlotItem())
+    hoursManager = core.HoursManager(core.config['hours'])
+    model = Model(jira, hoursManager, core.config['currentBoard'], core.config['currentSprint'])
+    gui = Gui(core.config['jiraurl'], core.config['username'], '', core.config['burnupIssueQuery'])
+    # All workers share one connection to the issue store of a server
+    issueStores = IssueStores(core.cache_dir)
+    chart = Chart(jira, gui.getPlotWidget().getPlotItem(), issueStores, core.config['nonWorkingDays'],
+                  [dt.date.fromisoformat(holiday) for holiday in core.config['holidays']], core.config['recentBoards'],
+                  asyncJira = asyncJira)
 
-    gui.boardChanged.connect(model.setBoard)
     gui.sprintChanged.connect(model.setSprint)
     gui.availabilityChanged.connect(model.setAvailability)
     gui.burnupBudgetChanged.connect(model.setBurnupBudget)
@@ -1263,69 +1317,125 @@ def main():
     model.sprintListChanged.connect(gui.updateAvailableSprints)
     model.selectedSprintChanged.connect(gui.updateHours)
 
+    model.sprintListChanged.connect(chart.prefetcher.setSprints)
     model.selectedSprintChanged.connect(chart.updateChart)
+    model.hoursChanged.connect(chart.setHours)
+
+    history = VelocityHistory(jira, hoursManager, issueStores)
+    gui.historyButtonClicked.connect(lambda: history.show(model.currentBoard))
+    model.hoursChanged.connect(history.replot)
 
     # Create a timer for updating the chart automatically from time to time
     timer = QtCore.QTimer()
     timer.setSingleShot(True)
 
+    def handleRequestError(e):
+        ''' Shows the error in the GUI and returns True if it was handled '''
+        gui.setConnectionStatus(str(e))
+
+        if isinstance(e, connectionErrors):
+            gui.openConnectionDialog()
+            return True
+
+        # Errors of aiohttp carry the status and headers themselves
+        response = getattr(e, 'response', e)
+        status_code = getattr(response, 'status_code', getattr(response, 'status', None))
+
+        if status_code == 400: # Bad Request
+            gui.openConnectionDialog('The server reported a bad request. Please check your burnup issue query for invalid JQL.')
+        elif status_code == 401: # Unauthorized
+            gui.openConnectionDialog()
+        elif status_code == 403: # Forbidden
+            header_name = 'X-Authentication-Denied-Reason'
+            header_value = response.headers[header_name]
+            gui.setConnectionStatus(str(e) + '\n\n%s: %s' % (header_name, header_value))
+            gui.openConnectionDialog('Please log in manually in a browser and solve the CAPTCHA before logging in here.')
+        elif status_code == 404: # Not Found
+            timer.start(5000)
+        elif status_code in (429, 503) or isinstance(e, requestscheduler.Throttled): # Too Many Requests, Service Unavailable
+            # Requests of the GUI thread are not retried and those of the
+            # workers were retried for as long as the scheduler allows, so
+            # wait a while longer before trying again
+            gui.setConnectionStatus(str(e) + '\n\nJira is throttling requests, trying again in a minute.')
+            timer.start(60 * 1000)
+        else:
+            return False
+
+        return True
+
     def reconnect():
         try:
             model.update()
             gui.setConnectionStatus('OK')
             timer.start(5 * 60 * 1000)
-        except requests.exceptions.ConnectionError as e:
-            gui.setConnectionStatus(str(e))
-            gui.openConnectionDialog()
-        except requests.exceptions.HTTPError as e:
-            gui.setConnectionStatus(str(e))
-            status_code = e.response.status_code
-
-            # This code is disabled because the Bad Request does not arrive here.
-            # Instead of the other errors that are the result of failed requests performed by the model,
-            # the Bad Request comes from a request done by updateChart, which is used as a slot.
-            # This exception is not propagated to the code that triggers the signal, moreover
-            # not handling exceptions in a slot results in undefined behaviour according to the
-            # PyQt documentation. Probably all requests for data should move to the model.
-            #
-            #if status_code == 400: # Bad Request
-            #    gui.openConnectionDialog('The server reported a bad request. Please check your burnup issue query for invalid JQL.')
-            if status_code == 401: # Unauthorized
-                gui.openConnectionDialog()
-            elif status_code == 403: # Forbidden
-                header_name = 'X-Authentication-Denied-Reason'
-                header_value = e.response.headers[header_name]
-                gui.setConnectionStatus(str(e) + '\n\n%s: %s' % (header_name, header_value))
-                gui.openConnectionDialog('Please log in manually in a browser and solve the CAPTCHA before logging in here.')
-            elif status_code == 404: # Not Found
-                timer.start(5000)
-            else:
+        except requestErrors as e:
+            if not handleRequestError(e):
+                raise
+
+    # Selecting a board requests its sprints
+    def setBoard(boardId):
+        try:
+            model.setBoard(boardId)
+        except requestErrors as e:
+            if not handleRequestError(e):
                 raise
-                
+
+    # Errors from the chart are reported by its worker thread. They are
+    # delivered in a slot, so they are shown rather than re-raised.
+    def chartUpdateFailed(e):
+        if isinstance(e, requestErrors):
+            handleRequestError(e)
+        else:
+            traceback.print_exception(type(e), e, e.__traceback__)
+            gui.setConnectionStatus('Failed to update chart: %s' % e)
+
+    def refresh():
+        # The user wants to see what is in Jira now, e.g. a board or sprint
+        # that was just created, so no cached response is used unchecked
+        responseCache.expireAll()
+        reconnect()
+
     def connect(jiraUrl, username, password, burnupIssueQuery):
         jira.setConnectionData(jiraUrl, username, password, burnupIssueQuery)
+        if asyncJira:
+            asyncJira.setConnectionData(jiraUrl, username, password, burnupIssueQuery)
         reconnect()
     
     # Use a queued connection for connectionData changed, because it is
     # triggered by the connection dialog and can open one at the same time.
     # This could cause endless recursion.
     gui.connectionDataChanged.connect(connect, QtCore.Qt.QueuedConnection)
-    gui.refreshButtonClicked.connect(reconnect)
+    gui.boardChanged.connect(setBoard)
+    gui.refreshButtonClicked.connect(refresh)
     timer.timeout.connect(reconnect)
+    chart.updateFailed.connect(chartUpdateFailed)
+    chart.timingsChanged.connect(gui.setTimings)
+    history.updateFailed.connect(chartUpdateFailed)
     
     gui.openConnectionDialog()
     
     if (sys.flags.interactive != 1) or not hasattr(QtCore, 'PYQT_VERSION'):
-        QtGui.QApplication.instance().exec_()
-
-    config['jiraurl'] = jira.url
-    config['username'] = jira.auth[0]
-    config['burnupIssueQuery'] = jira.burnupIssueQuery
-    config['hours'] = hoursManager.hours
-    config['currentBoard'] = model.currentBoard
-    config['currentSprint'] = model.currentSprint
-
-    saveConfiguration()
+        if loop:
+            loop.run_forever()
+        else:
+            QtGui.QApplication.instance().exec_()
+
+    chart.shutdown()
+    history.shutdown()
+    if loop:
+        loop.run_until_complete(asyncJira.close())
+        loop.close()
+    issueStores.close()
+
+    core.config['jiraurl'] = jira.url
+    core.config['username'] = jira.auth[0]
+    core.config['burnupIssueQuery'] = jira.burnupIssueQuery
+    core.config['hours'] = hoursManager.hours
+    core.config['currentBoard'] = model.currentBoard
+    core.config['currentSprint'] = model.currentSprint
+    core.config['recentBoards'] = chart.prefetcher.recentBoards
+
+    core.saveConfiguration()
 
 def delay_exit_after_exception():
     time.sleep(5)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Generates the responses of a Jira 6 server for a single sprint at any
+# scale, e.g.
+#
+#   python jiradataset.py --subtasks 10000 --worklogs 100000 -o data
+#
+# writes the responses as data/jira6/*.json, the same files that the Jira6
+# class writes with writeToFile set to True. They can be served by
+# fakejira.py or read back with readFromFile set to True.
+
+import argparse
+import datetime as dt
+import json
+import os
+import random
+
+storyPrefix = 'STORY'
+subtaskPrefix = 'SUB'
+burnupPrefix = 'SUP'
+
+def formatJiraTimestamp(timestamp):
+    return timestamp.strftime('%Y-%m-%dT%H:%M:%S.000%z')
+
+def formatMilliseconds(timestamp):
+    return str(int(timestamp.timestamp() * 1000))
+
+def formatSprintReportDate(timestamp):
+    return timestamp.strftime('%d/%b/%y %I:%M %p')
+
+def searchResult(issues):
+    return { 'startAt' : 0, 'maxResults' : len(issues), 'total' : len(issues), 'issues' : issues }
+
+def generateDataset(subtasks = 1000, worklogs = 10000, scopeChanges = 200, burnupIssues = 100,
+                    boardId = 1, sprintId = 1, sprintStart = dt.datetime(2016, 3, 7, 9, 0), sprintDays = 12,
+                    progress = 0.6, seed = 0):
+    ''' Returns the responses of a Jira 6 server for one sprint of one board
+        as a dict from the file names used by the Jira6 class to the JSON
+        data. The sprint starts at sprintStart in the local timezone, lasts
+        sprintDays days and progress is the part of it that has passed.
+
+        The sprint has the given number of sub-tasks, in stories of ten.
+        Most are added before the sprint starts, the rest during the
+        sprint, and scopeChanges more times a sub-task is removed from or
+        added back to the sprint. The given number of worklogs is spread
+        over burnupIssues issues outside of the sprint. The same arguments
+        always produce the same dataset.
+    '''
+    rng = random.Random(seed)
+
+    sprintStart = sprintStart.astimezone()
+    sprintEnd = sprintStart + dt.timedelta(days = sprintDays - 1, hours = 8)
+    now = sprintStart + (sprintEnd - sprintStart) * progress
+
+    def randomTime(start, end):
+        return start + (end - start) * rng.random()
+
+    # Sub-tasks of the sprint, with their estimates and the times at which
+    # they were added to the sprint and resolved
+    subtaskKeys = ['%s-%d' % (subtaskPrefix, i + 1) for i in range(subtasks)]
+    parentKeys = dict((key, '%s-%d' % (storyPrefix, i // 10 + 1)) for i, key in enumerate(subtaskKeys))
+    estimates = dict((key, rng.choice([0, 1, 1, 2, 2, 3, 5, 8]) * 3600) for key in subtaskKeys)
+    addedAt = dict((key, randomTime(sprintStart - dt.timedelta(days = 3), sprintStart - dt.timedelta(minutes = 1))
+                         if rng.random() < 0.8 else randomTime(sprintStart, now))
+                   for key in subtaskKeys)
+    resolvedAt = {}
+    for key in subtaskKeys:
+        if rng.random() < progress:
+            resolvedAt[key] = randomTime(max(sprintStart, addedAt[key]), now)
+
+    changes = {}
+    def addChange(timestamp, change):
+        changes.setdefault(formatMilliseconds(timestamp), []).append(change)
+
+    for key in subtaskKeys:
+        addChange(addedAt[key], { 'key' : key, 'added' : True })
+        if key in resolvedAt:
+            addChange(resolvedAt[key], { 'key' : key, 'column' : { 'notDone' : False, 'done' : True, 'newStatus' : '10001' } })
+
+    # Churn: sub-tasks that leave the sprint and usually come back later
+    removed = set()
+    for timestamp in sorted(randomTime(sprintStart, now) for _ in range(scopeChanges)):
+        key = rng.choice(subtaskKeys)
+        if key in removed:
+            removed.remove(key)
+            addChange(timestamp, { 'key' : key, 'added' : True })
+        elif addedAt[key] < timestamp and resolvedAt.get(key, now) > timestamp:
+            removed.add(key)
+            addChange(timestamp, { 'key' : key, 'added' : False })
+
+    issueToParentKeys = dict(parentKeys)
+    issueToParentKeys.update((parentKey, None) for parentKey in set(parentKeys.values()))
+
+    def subtaskIssue(i, key):
+        fields = { 'timetracking' : {}, 'resolutiondate' : None }
+        if estimates[key]:
+            fields['timetracking'] = { 'originalEstimate' : '%dh' % (estimates[key] // 3600),
+                                       'originalEstimateSeconds' : estimates[key] }
+        if key in resolvedAt:
+            fields['resolutiondate'] = formatJiraTimestamp(resolvedAt[key])
+        return { 'id' : str(10000 + i), 'key' : key, 'fields' : fields }
+
+    allSubtasks = [subtaskIssue(i, key) for i, key in enumerate(subtaskKeys)]
+
+    sprint = { 'id' : sprintId,
+               'name' : 'Sprint %d' % sprintId,
+               'state' : 'ACTIVE',
+               'startDate' : formatSprintReportDate(sprintStart),
+               'endDate' : formatSprintReportDate(sprintEnd),
+               'completeDate' : 'None' }
+
+    dataset = {
+        'getScrumBoards.json' : { 'rapidViews' : [ { 'id' : boardId, 'name' : 'Board %d' % boardId, 'sprintSupportEnabled' : True } ] },
+        'getSprints.json' : { 'rapidViewId' : boardId, 'sprints' : [ dict((k, sprint[k]) for k in ('id', 'name', 'state')) ] },
+        'getSprintDates.json' : { 'sprint' : sprint },
+        'getScopeChangeBurndownChart.json' : { 'changes' : changes,
+                                               'issueToParentKeys' : issueToParentKeys,
+                                               'startTime' : int(formatMilliseconds(sprintStart)),
+                                               'endTime' : int(formatMilliseconds(sprintEnd)),
+                                               'now' : int(formatMilliseconds(now)) },
+        'getIssues.json' : searchResult([issue for issue in allSubtasks if issue['key'] not in removed]),
+        'getEffortForIssues.json' : searchResult(allSubtasks),
+    }
+
+    # Burnup issues and their worklogs, some of them from before the sprint
+    burnupKeys = ['%s-%d' % (burnupPrefix, i + 1) for i in range(burnupIssues)]
+    worklogsByIssue = [[] for _ in burnupKeys]
+    for i in range(worklogs):
+        issue = rng.randrange(burnupIssues)
+        created = randomTime(sprintStart - dt.timedelta(days = 2), now)
+        worklogsByIssue[issue].append({ 'id' : str(20000 + i),
+                                        'issueId' : str(30000 + issue),
+                                        'author' : { 'name' : 'user%d' % rng.randrange(8) },
+                                        'started' : formatJiraTimestamp(created),
+                                        'created' : formatJiraTimestamp(created),
+                                        'updated' : formatJiraTimestamp(created),
+                                        'timeSpentSeconds' : rng.randrange(1, 17) * 900 })
+
+    burnupSearch = []
+    for i, key in enumerate(burnupKeys):
+        issueWorklogs = sorted(worklogsByIssue[i], key = lambda worklog: worklog['created'])
+        updated = issueWorklogs[-1]['updated'] if issueWorklogs else formatJiraTimestamp(sprintStart)
+        burnupSearch.append({ 'id' : str(30000 + i), 'key' : key, 'fields' : { 'updated' : updated } })
+        dataset['getWorklogs-%s.json' % key] = { 'startAt' : 0,
+                                                 'maxResults' : len(issueWorklogs),
+                                                 'total' : len(issueWorklogs),
+                                                 'worklogs' : issueWorklogs }
+
+    dataset['getIssueWorklogs.json'] = searchResult(burnupSearch)
+
+    return dataset
+
+def writeDataset(dataset, directory):
+    ''' Writes the files of a dataset to the jira6 subdirectory of directory '''
+    os.makedirs(os.path.join(directory, 'jira6'), exist_ok = True)
+    for filename, data in dataset.items():
+        with open(os.path.join(directory, 'jira6', filename), 'wt') as f:
+            json.dump(data, f)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Generate the responses of a Jira 6 server for a sprint')
+    parser.add_argument('-o', '--output-directory', default = '.', help = 'directory to create the jira6 directory in')
+    parser.add_argument('--subtasks', type = int, default = 1000)
+    parser.add_argument('--worklogs', type = int, default = 10000)
+    parser.add_argument('--scope-changes', type = int, default = 200)
+    parser.add_argument('--burnup-issues', type = int, default = 100)
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+
+    writeDataset(generateDataset(subtasks = args.subtasks, worklogs = args.worklogs, scopeChanges = args.scope_changes,
+                                 burnupIssues = args.burnup_issues, seed = args.seed),
+                 args.output_directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import calendar
+import datetime as dt
+import functools
+import numpy as np
+import re
+
+EPOCH = dt.datetime.fromtimestamp(0, dt.timezone.utc)
+
+# Jira formats all timestamps in its REST API like 2016-08-22T14:03:21.000+0200
+jiraTimestampPattern = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)\.(\d{3})([+-])(\d\d)(\d\d)$')
+
+@functools.lru_cache(maxsize = None)
+def getLocalZone():
+    import tzlocal
+    return tzlocal.get_localzone()
+
+@functools.lru_cache(maxsize = 65536)
+def parseJiraTimestamp(timestamp):
+    ''' Returns a timestamp from the Jira REST API as seconds since the
+        epoch. Timestamps in another format than the one Jira normally uses
+        are parsed by dateutil.
+    '''
+    m = jiraTimestampPattern.match(timestamp)
+    if not m:
+        from dateutil import parser
+        return parser.parse(timestamp).timestamp()
+
+    year, month, day, hour, minute, second, millisecond, sign, offsetHours, offsetMinutes = m.groups()
+    offset = (int(offsetHours) * 3600 + int(offsetMinutes) * 60) * (-1 if sign == '-' else 1)
+    return calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second))) + \
+           int(millisecond) / 1000 - offset
+
+def parseJiraTimestamps(timestamps):
+    ''' Returns a list of timestamps from the Jira REST API as a float64
+        array of seconds since the epoch. Timestamps in the format Jira
+        normally uses are converted all at once by numpy.
+    '''
+    timestamps = list(timestamps)
+
+    if not all(len(ts) == 28 and jiraTimestampPattern.match(ts) for ts in timestamps):
+        return np.array([parseJiraTimestamp(ts) for ts in timestamps], dtype = np.float64)
+
+    localTimes = np.array([ts[:23] for ts in timestamps], dtype = 'datetime64[ms]').astype(np.int64) / 1000
+    offsets = np.array([(int(ts[24:26]) * 3600 + int(ts[26:28]) * 60) * (-1 if ts[23] == '-' else 1) for ts in timestamps],
+                       dtype = np.float64)
+
+    return localTimes - offsets
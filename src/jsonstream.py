@@ -0,0 +1,124 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import codecs
+import json
+
+whitespace = ' \t\n\r'
+
+# Characters that may continue a number. A number directly followed by one
+# of these, like 1 in '1.' or '1e', was cut off at the end of a chunk.
+numberCharacters = '0123456789+-.eE'
+
+# The part of the buffer that has been parsed is dropped once it is larger
+# than this, so the buffer never holds much more than one item
+maxParsedBytes = 64 * 1024
+
+class JsonStream():
+    ''' JsonStream parses JSON text that arrives in chunks of bytes. Values
+        are decoded with the json module as soon as they are complete, so
+        only the text of the value that is being parsed is kept.
+    '''
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+
+    def _readMore(self):
+        if self.pos > maxParsedBytes:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+
+        for chunk in self.chunks:
+            text = self.utf8.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+
+        self.buffer += self.utf8.decode(b'', final = True)
+        return False
+
+    def peek(self):
+        ''' Skips whitespace and returns the next character or '' at the end '''
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in whitespace:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._readMore():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError('Expected one of %r at %r' % (characters, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+        return character
+
+    def value(self):
+        ''' Returns the next complete value. A value must be followed by
+            another character that cannot be part of it before it is known
+            to be complete, because a number at the end of the buffer may
+            continue in the next chunk.
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                following = end
+                while following < len(self.buffer) and self.buffer[following] in whitespace:
+                    following += 1
+                if following < len(self.buffer) and self.buffer[end] not in numberCharacters:
+                    self.pos = end
+                    return value
+            except ValueError:
+                pass
+
+            if not self._readMore():
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+
+def iterItems(chunks, itemsKey, members):
+    ''' Yields the items of the array stored under itemsKey in the JSON
+        object that arrives in chunks of bytes, one at a time as they are
+        parsed. The other members of the object are added to members as
+        they are parsed, so the members before the array are available
+        when the first item is yielded and all of them when the last item
+        has been yielded.
+    '''
+    stream = JsonStream(chunks)
+
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        if key == itemsKey:
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.expect(']')
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.expect(',]') == ']':
+                        break
+        else:
+            members[key] = stream.value()
+
+        if stream.expect(',}') == '}':
+            return
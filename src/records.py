@@ -0,0 +1,92 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The issues, worklogs and scope changes that the chart is calculated from.
+# They are converted from the JSON returned by Jira as soon as it has been
+# received, keeping only the fields that are used. Times are stored as
+# seconds since the epoch and the many small values of worklogs and scope
+# changes in numpy arrays.
+
+import numpy as np
+
+try:
+    from . import jiratime
+except ImportError:
+    import jiratime
+
+class SubTask():
+    ''' SubTask is a sub-task of a sprint with its original estimate in
+        seconds (0 if it has none) and the time at which it was resolved
+        (None if it is unresolved).
+    '''
+    __slots__ = ('key', 'estimate', 'resolved')
+
+    def __init__(self, key, estimate, resolved):
+        self.key = key
+        self.estimate = estimate
+        self.resolved = resolved
+
+    @classmethod
+    def fromJson(cls, issue):
+        fields = issue['fields']
+        resolved = fields.get('resolutiondate')
+        return cls(issue['key'],
+                   fields.get('timetracking', {}).get('originalEstimateSeconds', 0),
+                   jiratime.parseJiraTimestamp(resolved) if resolved else None)
+
+class BurnupIssue():
+    ''' BurnupIssue is an issue whose worklogs count towards the burnup. The
+        creation times and the time spent in seconds of its worklogs are
+        kept in two float64 arrays.
+    '''
+    __slots__ = ('key', 'created', 'timeSpent')
+
+    def __init__(self, key, created, timeSpent):
+        self.key = key
+        self.created = np.asarray(created, dtype = np.float64)
+        self.timeSpent = np.asarray(timeSpent, dtype = np.float64)
+
+    @classmethod
+    def fromJson(cls, key, worklogs):
+        ''' Returns a BurnupIssue with worklogs in the form Jira returns them '''
+        worklogs = list(worklogs)
+        return cls(key,
+                   jiratime.parseJiraTimestamps(worklog['created'] for worklog in worklogs),
+                   [worklog['timeSpentSeconds'] for worklog in worklogs])
+
+    def createdBetween(self, start, end):
+        ''' Returns a BurnupIssue with only the worklogs created between
+            start and end, in seconds since the epoch.
+        '''
+        selected = (self.created >= start) & (self.created <= end)
+        return BurnupIssue(self.key, self.created[selected], self.timeSpent[selected])
+
+class ScopeChanges():
+    ''' ScopeChanges holds issues being added to or removed from a sprint,
+        ordered by time. The times are kept in a float64 array of seconds
+        since the epoch, whether an issue was added in a bool array and the
+        names of the issues in a list.
+    '''
+    __slots__ = ('timestamps', 'added', 'issueNames')
+
+    def __init__(self, timestamps, added, issueNames):
+        timestamps = np.asarray(timestamps, dtype = np.float64)
+        order = np.argsort(timestamps, kind = 'stable')
+        self.timestamps = timestamps[order]
+        self.added = np.asarray(added, dtype = bool)[order]
+        self.issueNames = [issueNames[i] for i in order]
+
+    def __len__(self):
+        return len(self.timestamps)
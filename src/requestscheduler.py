@@ -0,0 +1,255 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Decides when requests to Jira may be sent. Jira servers that throttle
+# their users answer with 429 Too Many Requests or 503 Service Unavailable,
+# often with a Retry-After header, and may block accounts that keep going
+# regardless. All requests of a client, from whichever thread or coroutine,
+# pass through one RequestScheduler that keeps them within a budget and
+# backs off when the server says so.
+
+import contextlib
+import contextvars
+import email.utils
+import random
+import threading
+import time
+
+FOREGROUND = 0
+BACKGROUND = 1
+
+# The priority of the requests made by the running code. Executors do not
+# carry this over to their threads, so work must be submitted to them with
+# instrumentation.submit.
+priority = contextvars.ContextVar('priority', default = FOREGROUND)
+
+@contextlib.contextmanager
+def background():
+    ''' Makes the requests made in the block wait for foreground requests '''
+    token = priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        priority.reset(token)
+
+# Whether the running code may be held back to keep within the budget. The
+# GUI thread sets this to False, because it must never sleep; its requests
+# are then sent right away or, while the server is throttling requests,
+# fail with Throttled.
+mayWait = contextvars.ContextVar('mayWait', default = True)
+
+class Throttled(Exception):
+    ''' Raised instead of waiting by code that may not wait, when requests
+        are held back because the server is throttling them
+    '''
+    def __init__(self, delay):
+        super().__init__('Jira is throttling requests, they are held back for another %.0f s' % delay)
+        self.delay = delay
+
+class Cancelled(Exception):
+    ''' Raised instead of sending a request of work that was cancelled '''
+    pass
+
+# A function that returns whether the work of the running code has been
+# cancelled, or None. Like priority, it is only carried over to executor
+# threads by instrumentation.submit.
+cancelledCheck = contextvars.ContextVar('cancelledCheck', default = None)
+
+@contextlib.contextmanager
+def cancellable(isCancelled):
+    ''' Makes the requests made in the block raise Cancelled as soon as
+        isCancelled returns True
+    '''
+    token = cancelledCheck.set(isCancelled)
+    try:
+        yield
+    finally:
+        cancelledCheck.reset(token)
+
+def checkCancelled():
+    ''' Raises Cancelled if the work of the running code has been cancelled '''
+    isCancelled = cancelledCheck.get()
+    if isCancelled and isCancelled():
+        raise Cancelled()
+
+def parseRetryAfter(value):
+    ''' Returns the number of seconds in a Retry-After header, which is
+        either a number of seconds or an HTTP date, or None if there is none.
+    '''
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RequestScheduler():
+    ''' RequestScheduler keeps requests within a budget of
+        requestsPerSecond on average (None means no limit), of which up to
+        burst requests may be sent at once after a quiet period, like the
+        token bucket that Jira itself uses for rate limiting. Background
+        requests wait as long as foreground requests are waiting. Requests
+        of cancelled work raise Cancelled instead of waiting any longer.
+
+        A request that is answered with a status in retryStatuses is retried
+        up to maxRetries times. Before that, all requests are held back for
+        as long as the Retry-After header of the response asks or, without
+        one, for a random time of up to baseDelay * 2 ** attempt seconds,
+        but never longer than maxDelay. Each throttled response also halves the rate
+        at which requests are sent, after which every successful response
+        raises it again by a twentieth of the budget. That way the rate
+        settles just below what the server accepts.
+    '''
+
+    retryStatuses = (429, 503)
+    cancelCheckInterval = 0.1
+
+    def __init__(self, requestsPerSecond = None, burst = 1, maxRetries = 5, baseDelay = 1.0, maxDelay = 60.0):
+        self.requestsPerSecond = requestsPerSecond
+        self.burst = burst
+        self.maxRetries = maxRetries
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+
+        self.condition = threading.Condition()
+        self.rate = requestsPerSecond
+        self.tokens = burst
+        self.lastRefill = time.monotonic()
+        self.blockedUntil = 0.0
+        self.waitingForeground = 0
+
+        self.throttledResponses = 0
+
+    def _tryAcquire(self, requestPriority):
+        ''' Takes a token for a request and returns 0 or, if the request must
+            wait, returns how long it should wait before trying again.
+            Must be called with the condition held.
+        '''
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.lastRefill) * self.rate)
+        self.lastRefill = now
+
+        if self.blockedUntil > now:
+            return self.blockedUntil - now
+        if requestPriority != FOREGROUND and self.waitingForeground:
+            return 1 / self.rate if self.rate else 0.01
+        if not self.rate:
+            return 0
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+
+        self.tokens -= 1
+        return 0
+
+    def acquire(self):
+        ''' Blocks until a request with the priority of the running code may
+            be sent. If the running code may not wait, the request may be
+            sent right away, unless requests are held back after a throttled
+            response, in which case Throttled is raised.
+        '''
+        requestPriority = priority.get()
+        if not mayWait.get():
+            with self.condition:
+                now = time.monotonic()
+                if self.blockedUntil > now:
+                    raise Throttled(self.blockedUntil - now)
+                # The request is counted, so the other requests make up for it
+                self.tokens -= 1
+            return
+
+        with self.condition:
+            if requestPriority == FOREGROUND:
+                self.waitingForeground += 1
+            try:
+                while True:
+                    checkCancelled()
+                    delay = self._tryAcquire(requestPriority)
+                    if not delay:
+                        break
+                    # Cancellable code wakes up now and then to see if it
+                    # has been cancelled, which nothing else would tell it
+                    if cancelledCheck.get():
+                        delay = min(delay, self.cancelCheckInterval)
+                    self.condition.wait(delay)
+            finally:
+                if requestPriority == FOREGROUND:
+                    self.waitingForeground -= 1
+                    self.condition.notify_all()
+
+    async def acquireAsync(self):
+        ''' The coroutine version of acquire. The condition is only held
+            briefly, so taking it does not hold up the event loop.
+        '''
+        # Only imported here, because asyncio takes long to import and is not
+        # needed by the synchronous clients
+        import asyncio
+
+        requestPriority = priority.get()
+        with self.condition:
+            if requestPriority == FOREGROUND:
+                self.waitingForeground += 1
+        try:
+            while True:
+                checkCancelled()
+                with self.condition:
+                    delay = self._tryAcquire(requestPriority)
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            if requestPriority == FOREGROUND:
+                with self.condition:
+                    self.waitingForeground -= 1
+                    self.condition.notify_all()
+
+    def getRetryDelay(self, status, retryAfter, attempt):
+        ''' Returns how many seconds all requests are held back before the
+            request that got a response with status and Retry-After header
+            retryAfter on its attempt-th try (counting from 0) is retried,
+            or None if the response must be used as it is.
+        '''
+        if status not in self.retryStatuses:
+            with self.condition:
+                if self.rate and self.rate < self.requestsPerSecond:
+                    self.rate = min(self.requestsPerSecond, self.rate + self.requestsPerSecond / 20)
+            return None
+
+        if attempt >= self.maxRetries:
+            return None
+
+        delay = parseRetryAfter(retryAfter)
+        if delay is None:
+            delay = random.uniform(0, self.baseDelay * 2 ** attempt)
+        delay = min(self.maxDelay, delay)
+
+        with self.condition:
+            self.throttledResponses += 1
+            if self.rate:
+                self.rate = max(self.requestsPerSecond / 20, self.rate / 2)
+                self.tokens = 0
+            self.blockedUntil = max(self.blockedUntil, time.monotonic() + delay)
+            self.condition.notify_all()
+
+        return delay
+
+    def getStatistics(self):
+        with self.condition:
+            return { 'throttledResponses' : self.throttledResponses,
+                     'requestsPerSecond' : self.rate }
@@ -0,0 +1,266 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    from . import instrumentation
+except ImportError:
+    import instrumentation
+
+# How long a response may be used without asking the server whether it has
+# changed. The first pattern that matches the resource is used. Responses
+# for resources with a time to live of 0 are always revalidated. That
+# includes the scope change burndown chart, which has to be as current as
+# the sprint issues that are requested with it.
+defaultTimesToLive = [
+    (r'rest/greenhopper/1.0/xboard/selectorData', 4 * 3600),
+    (r'rest/agile/1.0/board$', 4 * 3600),
+    (r'rest/greenhopper/1.0/sprintquery/', 15 * 60),
+    (r'rest/agile/1.0/board/[0-9]+/sprint$', 15 * 60),
+    (r'rest/greenhopper/1.0/rapid/charts/sprintreport', 10 * 60),
+    (r'.*', 0)
+]
+
+class CacheEntry():
+    ''' CacheEntry is a response stored in the cache together with the
+        validators needed to ask the server whether it is still current.
+    '''
+    def __init__(self, data, etag, lastModified, storedAt):
+        self.data = data
+        self.etag = etag
+        self.lastModified = lastModified
+        self.storedAt = storedAt
+        self.fresh = False
+
+    def getValidationHeaders(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.lastModified:
+            headers['If-Modified-Since'] = self.lastModified
+        return headers
+
+class ResponseCache():
+    ''' ResponseCache stores JSON responses on disk, keyed on the server
+        and user, the resource and the request parameters. Responses are used as-is until
+        their time to live has expired, or until expireAll is called, after
+        which they are revalidated with the ETag or Last-Modified header the
+        server sent with them.
+        The least recently used responses are removed when the total size
+        of the cache exceeds maxBytes.
+
+        Each response is stored in two files: the JSON data in <key>.json and
+        the validators and the time it was stored or last revalidated in a
+        small <key>.meta next to it. Revalidating a response only rewrites
+        the latter, however large the data is.
+    '''
+
+    def __init__(self, directory, maxBytes = 100 * 1024 * 1024, timesToLive = defaultTimesToLive):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.timesToLive = [(re.compile(pattern), ttl) for pattern, ttl in timesToLive]
+
+        self.lock = threading.Lock()
+        self.sizes = collections.OrderedDict()
+        self.totalBytes = 0
+
+        # Responses stored before this time are revalidated however long
+        # their time to live is
+        self.expiredBefore = 0
+
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok = True)
+        self._loadIndex()
+        self._evict()
+
+    def _loadIndex(self):
+        # The modification time of a file is updated whenever it is used,
+        # so sorting on it restores the order of use of the previous run.
+        files = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.json'):
+                stat = os.stat(os.path.join(self.directory, filename))
+                files.append((stat.st_mtime, filename[:-len('.json')], stat.st_size))
+
+        for _, key, size in sorted(files):
+            self.sizes[key] = size
+            self.totalBytes += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, '%s.json' % key)
+
+    def _metaPath(self, key):
+        return os.path.join(self.directory, '%s.meta' % key)
+
+    def getKey(self, scope, resource, params):
+        keyData = json.dumps([scope, resource, sorted((params or {}).items())], default = str)
+        return hashlib.sha1(keyData.encode('utf-8')).hexdigest()
+
+    def getTimeToLive(self, resource):
+        for pattern, ttl in self.timesToLive:
+            if pattern.match(resource):
+                return ttl
+        return 0
+
+    def lookup(self, key):
+        ''' Returns the CacheEntry stored under key or None '''
+        with self.lock:
+            if key not in self.sizes:
+                return None
+            self.sizes.move_to_end(key)
+
+        # Responses stored by older versions, which kept everything in the
+        # .json file, have no .meta file and are dropped
+        try:
+            with open(self._metaPath(key), 'rt') as f:
+                meta = json.load(f)
+            with open(self._path(key), 'rt') as f, instrumentation.parsing():
+                data = json.load(f)
+            os.utime(self._path(key))
+        except (ValueError, OSError):
+            self._remove(key)
+            return None
+
+        return CacheEntry(data, meta['etag'], meta['lastModified'], meta['storedAt'])
+
+    def isFresh(self, resource, entry):
+        return entry.storedAt > self.expiredBefore and time.time() - entry.storedAt < self.getTimeToLive(resource)
+
+    def expireAll(self):
+        ''' Makes all responses that are stored now be revalidated the next
+            time they are used, e.g. when the user asks for a refresh.
+        '''
+        self.expiredBefore = time.time()
+
+    def store(self, key, resource, data, etag = None, lastModified = None):
+        # Without a time to live or a validator a stored response could never be used
+        if etag or lastModified or self.getTimeToLive(resource):
+            self._write(key, CacheEntry(data, etag, lastModified, time.time()))
+
+    def _replace(self, path, value):
+        ''' Writes value to path as JSON, so readers see either the old or
+            the new file and never a partial one
+        '''
+        tmpPath = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmpPath, 'wt') as f:
+            json.dump(value, f)
+        os.replace(tmpPath, path)
+
+    def _writeMeta(self, key, entry):
+        self._replace(self._metaPath(key), { 'etag' : entry.etag,
+                                             'lastModified' : entry.lastModified,
+                                             'storedAt' : entry.storedAt })
+
+    def _write(self, key, entry):
+        # The data is written first, so the validators that are read never
+        # belong to older data than what is read with them
+        path = self._path(key)
+        self._replace(path, entry.data)
+        self._writeMeta(key, entry)
+
+        with self.lock:
+            self.totalBytes -= self.sizes.pop(key, 0)
+            self.sizes[key] = os.path.getsize(path)
+            self.totalBytes += self.sizes[key]
+        self._evict()
+
+    def get(self, scope, resource, params, request):
+        ''' Returns the JSON data for a resource, either from the cache or
+            by calling request(headers). The scope identifies the server and
+            user the data belongs to. The request function must perform the
+            request with the given additional headers and return the
+            response.
+        '''
+        key = self.getKey(scope, resource, params)
+        entry = self.lookupFresh(key, resource)
+
+        if entry and entry.fresh:
+            return entry.data
+
+        r = request(entry.getValidationHeaders() if entry else {})
+
+        if entry and r.status_code == 304: # Not Modified
+            return self.revalidated(key, entry)
+
+        r.raise_for_status()
+        with instrumentation.parsing():
+            data = r.json()
+
+        return self.received(key, resource, data, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+
+    # The steps of get, for callers that cannot pass a request function
+
+    def lookupFresh(self, key, resource):
+        ''' Returns the CacheEntry stored under key with fresh set to whether
+            it can be used without revalidating it, or None.
+        '''
+        entry = self.lookup(key)
+        if entry:
+            entry.fresh = self.isFresh(resource, entry)
+            if entry.fresh:
+                with self.lock:
+                    self.hits += 1
+        return entry
+
+    def revalidated(self, key, entry):
+        ''' Marks an entry as current after the server said it has not
+            changed and returns its data.
+        '''
+        with self.lock:
+            self.revalidations += 1
+        entry.storedAt = time.time()
+        self._writeMeta(key, entry)
+        return entry.data
+
+    def received(self, key, resource, data, etag, lastModified):
+        ''' Stores a response that was received from the server and returns its data '''
+        with self.lock:
+            self.misses += 1
+        self.store(key, resource, data, etag, lastModified)
+        return data
+
+    def _remove(self, key):
+        with self.lock:
+            self.totalBytes -= self.sizes.pop(key, 0)
+        for path in (self._path(key), self._metaPath(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        while True:
+            with self.lock:
+                if self.totalBytes <= self.maxBytes or not self.sizes:
+                    return
+                key = next(iter(self.sizes))
+            self._remove(key)
+
+    def getStatistics(self):
+        return { 'hits' : self.hits,
+                 'revalidations' : self.revalidations,
+                 'misses' : self.misses,
+                 'entries' : len(self.sizes),
+                 'bytes' : self.totalBytes }
@@ -0,0 +1,91 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime as dt
+import numpy as np
+
+class WorkCalendar():
+    ''' WorkCalendar knows which days of a sprint are working days and maps
+        times during the sprint to work time, which is the time with all
+        non-working days removed. Non-working days are the days of the week
+        in nonWorkingDays (Monday is 0) and the dates in holidays.
+
+        The non-working periods are kept as sorted arrays of start times and
+        durations in seconds, so any number of times can be mapped at once
+        with a single binary search.
+    '''
+
+    def __init__(self, sprintStart, sprintEnd, nonWorkingDays = (5, 6), holidays = ()):
+        self.sprintStart = sprintStart
+        self.sprintEnd = sprintEnd
+        self.nonWorkingDays = frozenset(nonWorkingDays)
+        self.holidays = frozenset(holidays)
+
+        # Midnight of every day that overlaps with the sprint
+        self.days = []
+        day = sprintStart.replace(hour = 0, minute = 0, second = 0, microsecond = 0)
+        while day < sprintEnd:
+            self.days.append(day)
+            day += dt.timedelta(days = 1)
+
+        starts = []
+        durations = []
+        for day in self.days:
+            if not self.isWorkingDay(day):
+                start = max(sprintStart, day)
+                end = min(sprintEnd, day + dt.timedelta(days = 1))
+                starts.append(int(start.timestamp()))
+                durations.append(int((end - start).total_seconds()))
+
+        self.starts = np.array(starts, dtype = np.int64)
+        self.durations = np.array(durations, dtype = np.int64)
+        # Total duration of the non-working periods before each one
+        self.offsets = np.cumsum(self.durations) - self.durations
+
+    def isWorkingDay(self, day):
+        return day.weekday() not in self.nonWorkingDays and day.date() not in self.holidays
+
+    def getWorkingDays(self, hour = 0):
+        ''' Returns the given hour of each working day, as far as it falls
+            within the sprint.
+        '''
+        return [ day.replace(hour = hour) for day in self.days
+                 if self.isWorkingDay(day) and self.sprintStart <= day.replace(hour = hour) < self.sprintEnd ]
+
+    def toWorkTime(self, seconds):
+        ''' Maps an array of times in seconds since the epoch to work time.
+            Times during a non-working period are moved to its start.
+        '''
+        seconds = np.asarray(seconds, dtype = np.int64)
+
+        # The last non-working period that started before each time
+        last = np.searchsorted(self.starts, seconds, side = 'left') - 1
+        started = last >= 0
+        last = last[started]
+
+        removed = np.zeros(len(seconds), dtype = np.int64)
+        removed[started] = self.offsets[last] + np.clip(seconds[started] - self.starts[last], 0, self.durations[last])
+
+        return seconds - removed
+
+    def removeNonWorkingTime(self, *series):
+        ''' Maps the x values of all given series to work time in place '''
+        lengths = [len(s.x) for s in series]
+        if not sum(lengths):
+            return
+
+        workTimes = self.toWorkTime(np.concatenate([s.x for s in series]))
+        for s, x in zip(series, np.split(workTimes, np.cumsum(lengths)[:-1])):
+            s.x = x
@@ -0,0 +1,123 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Checks that jsonstream parses JSON the same as json.loads, however the
+# bytes of the JSON text are split into chunks.
+
+import json
+import os
+import random
+import sys
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import jsonstream
+
+def createDocument(rand, itemCount):
+    ''' Returns a paged Jira-like response with members before and after
+        the items and items with multi-byte characters and all kinds of
+        numbers. Numbers are also used as items and members themselves,
+        because only values that are not nested in others can be cut off
+        at the end of a chunk and still look complete.
+    '''
+    texts = ['', 'plain', 'café', '€ 12,50', 'clef \U0001d11e', '日本語',
+             'quote " and backslash \\', 'line\nbreak', 'é' * 50]
+    numbers = [0, 7, -1, 123456789012345678901234567890, 3.25, -0.5, 1e-7, 6.02e23]
+
+    def createItem(i):
+        if rand.random() < 0.3:
+            return rand.choice(numbers + [rand.uniform(-1000, 1000)])
+        return { 'id' : str(10000 + i),
+                 'key' : 'PRJ-%d' % i,
+                 'summary' : rand.choice(texts),
+                 'timeSpentSeconds' : rand.choice(numbers),
+                 'estimate' : rand.choice([None, True, False, rand.uniform(-1000, 1000)]),
+                 'labels' : rand.sample(texts, rand.randint(0, 3)),
+                 'fields' : {} }
+
+    return { 'startAt' : 0,
+             'ratio' : rand.choice(numbers),
+             'maxResults' : 1000,
+             'total' : itemCount,
+             'issues' : [createItem(i) for i in range(itemCount)],
+             'isLast' : True,
+             'names' : { 'summary' : 'Samenvatting à la « carte »' } }
+
+def splitRandomly(rand, data, maxChunkSize):
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = start + rand.randint(1, maxChunkSize)
+        chunks.append(data[start:end])
+        start = end
+    return chunks
+
+class IterItemsTest(unittest.TestCase):
+
+    def assertParsedLikeJson(self, chunks, itemsKey = 'issues'):
+        expected = json.loads(b''.join(chunks).decode('utf-8'))
+        members = {}
+        items = list(jsonstream.iterItems(chunks, itemsKey, members))
+        self.assertEqual(items, expected.pop(itemsKey, []))
+        self.assertEqual(members, expected)
+
+    def test_randomChunks(self):
+        rand = random.Random(26)
+        for _ in range(200):
+            document = createDocument(rand, rand.randint(0, 20))
+            data = json.dumps(document, ensure_ascii = rand.random() < 0.2,
+                              indent = rand.choice([None, 1])).encode('utf-8')
+            self.assertParsedLikeJson(splitRandomly(rand, data, rand.choice([1, 3, 16, 1000])))
+
+    def test_everySplit(self):
+        data = json.dumps({ 'total' : 12.5e-3, 'issues' : [-12345, '€\U0001d11e', 1e100, [0.5]],
+                            'after' : 'é' }, ensure_ascii = False).encode('utf-8')
+        for i in range(1, len(data)):
+            with self.subTest(split = i):
+                self.assertParsedLikeJson([data[:i], data[i:]])
+
+    def test_singleBytes(self):
+        data = json.dumps(createDocument(random.Random(9), 5), ensure_ascii = False).encode('utf-8')
+        self.assertParsedLikeJson([data[i:i + 1] for i in range(len(data))])
+
+    def test_emptyChunks(self):
+        data = b'{"total": 2, "issues": [10, 20]}'
+        self.assertParsedLikeJson([b'', data[:10], b'', b'', data[10:], b''])
+
+    def test_emptyArrayAndObject(self):
+        self.assertParsedLikeJson([b'{"total": 0, "issues": [ ]}'])
+        self.assertParsedLikeJson([b'{ }'])
+
+    def test_parsedTextIsDropped(self):
+        ''' Values longer than the parsed part of the buffer that is kept
+            are still parsed in one piece
+        '''
+        rand = random.Random(31)
+        document = createDocument(rand, 30)
+        data = json.dumps(document, ensure_ascii = False).encode('utf-8')
+        with unittest.mock.patch.object(jsonstream, 'maxParsedBytes', 40):
+            for maxChunkSize in (1, 7, 100):
+                self.assertParsedLikeJson(splitRandomly(rand, data, maxChunkSize))
+
+    def test_invalidJson(self):
+        with self.assertRaises(ValueError):
+            list(jsonstream.iterItems([b'{"issues": [1, 2'], 'issues', {}))
+        with self.assertRaises(ValueError):
+            list(jsonstream.iterItems([b'["issues"]'], 'issues', {}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+# Copyright 2016 Maurice van der Pot <griffon26@kfk4ever.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Checks how the RequestScheduler spaces requests and how it reacts to
+# responses of a server that throttles them.
+
+import asyncio
+import contextvars
+import email.utils
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import core
+import requestscheduler
+
+def runWithoutWaiting(function, *args):
+    ''' Runs function as code that may not wait, like the GUI thread '''
+    def run():
+        requestscheduler.mayWait.set(False)
+        return function(*args)
+    return contextvars.copy_context().run(run)
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(requestscheduler.parseRetryAfter('120'), 120)
+        self.assertEqual(requestscheduler.parseRetryAfter('0.5'), 0.5)
+        self.assertEqual(requestscheduler.parseRetryAfter('-3'), 0)
+
+    def test_httpDate(self):
+        inHalfAMinute = email.utils.formatdate(time.time() + 30, usegmt = True)
+        self.assertAlmostEqual(requestscheduler.parseRetryAfter(inHalfAMinute), 30, delta = 2)
+        aMinuteAgo = email.utils.formatdate(time.time() - 60, usegmt = True)
+        self.assertEqual(requestscheduler.parseRetryAfter(aMinuteAgo), 0)
+
+    def test_missingOrInvalid(self):
+        for value in (None, '', 'soon', 'Mon, 99 Foo 2016'):
+            with self.subTest(value = value):
+                self.assertIsNone(requestscheduler.parseRetryAfter(value))
+
+class RetryDelayTest(unittest.TestCase):
+
+    def test_otherStatuses(self):
+        scheduler = requestscheduler.RequestScheduler()
+        for status in (200, 304, 400, 404, 500):
+            self.assertIsNone(scheduler.getRetryDelay(status, '10', 0))
+        self.assertEqual(scheduler.blockedUntil, 0)
+
+    def test_retryAfter(self):
+        scheduler = requestscheduler.RequestScheduler()
+        self.assertEqual(scheduler.getRetryDelay(429, '5', 0), 5)
+        self.assertAlmostEqual(scheduler.blockedUntil, time.monotonic() + 5, delta = 1)
+        self.assertEqual(scheduler.getStatistics()['throttledResponses'], 1)
+
+    def test_retryAfterIsLimited(self):
+        scheduler = requestscheduler.RequestScheduler(maxDelay = 30)
+        self.assertEqual(scheduler.getRetryDelay(503, '3600', 0), 30)
+        self.assertLess(scheduler.blockedUntil, time.monotonic() + 31)
+
+    def test_backoffIsLimited(self):
+        scheduler = requestscheduler.RequestScheduler(maxRetries = 20, baseDelay = 0.1, maxDelay = 2)
+        for attempt in range(20):
+            delay = scheduler.getRetryDelay(429, None, attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(2, 0.1 * 2 ** attempt))
+
+    def test_maxRetries(self):
+        scheduler = requestscheduler.RequestScheduler(maxRetries = 3)
+        self.assertIsNotNone(scheduler.getRetryDelay(429, '0', 2))
+        self.assertIsNone(scheduler.getRetryDelay(429, '0', 3))
+        self.assertIsNone(scheduler.getRetryDelay(429, '0', 4))
+
+    def test_rateAdapts(self):
+        scheduler = requestscheduler.RequestScheduler(requestsPerSecond = 20, burst = 10)
+        scheduler.getRetryDelay(429, '0', 0)
+        self.assertEqual(scheduler.rate, 10)
+        for attempt in range(10):
+            scheduler.getRetryDelay(429, '0', 0)
+        self.assertEqual(scheduler.rate, 1)
+        scheduler.getRetryDelay(200, None, 0)
+        self.assertEqual(scheduler.rate, 2)
+        for attempt in range(30):
+            scheduler.getRetryDelay(200, None, 0)
+        self.assertEqual(scheduler.rate, 20)
+
+class AcquireTest(unittest.TestCase):
+
+    def test_burstThenRate(self):
+        scheduler = requestscheduler.RequestScheduler(requestsPerSecond = 50, burst = 5)
+        start = time.monotonic()
+        for i in range(5):
+            scheduler.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
+        for i in range(10):
+            scheduler.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+    def test_heldBackAfterThrottling(self):
+        scheduler = requestscheduler.RequestScheduler()
+        scheduler.getRetryDelay(429, '0.2', 0)
+        start = time.monotonic()
+        scheduler.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_noWaiting(self):
+        scheduler = requestscheduler.RequestScheduler(requestsPerSecond = 1, burst = 1)
+        start = time.monotonic()
+        for i in range(5):
+            runWithoutWaiting(scheduler.acquire)
+        self.assertLess(time.monotonic() - start, 0.05)
+
+        scheduler.getRetryDelay(429, '10', 0)
+        with self.assertRaises(requestscheduler.Throttled):
+            runWithoutWaiting(scheduler.acquire)
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_cancelled(self):
+        scheduler = requestscheduler.RequestScheduler()
+        scheduler.getRetryDelay(429, '10', 0)
+        cancelled = threading.Event()
+        threading.Timer(0.1, cancelled.set).start()
+        start = time.monotonic()
+        with requestscheduler.cancellable(cancelled.is_set):
+            with self.assertRaises(requestscheduler.Cancelled):
+                scheduler.acquire()
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_backgroundGivesWay(self):
+        scheduler = requestscheduler.RequestScheduler(requestsPerSecond = 10, burst = 1)
+        scheduler.getRetryDelay(429, '0.3', 0)
+        order = []
+
+        def request(name, background):
+            if background:
+                with requestscheduler.background():
+                    scheduler.acquire()
+            else:
+                scheduler.acquire()
+            order.append(name)
+
+        threads = [threading.Thread(target = request, args = ('background', True))]
+        threads[0].start()
+        time.sleep(0.1)
+        for i in range(3):
+            threads.append(threading.Thread(target = request, args = ('foreground', False)))
+            threads[-1].start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, ['foreground'] * 3 + ['background'])
+
+    def test_backgroundGivesWayAsync(self):
+        scheduler = requestscheduler.RequestScheduler(requestsPerSecond = 10, burst = 1)
+        scheduler.getRetryDelay(429, '0.3', 0)
+        order = []
+
+        async def request(name, background):
+            if background:
+                with requestscheduler.background():
+                    await scheduler.acquireAsync()
+            else:
+                await scheduler.acquireAsync()
+            order.append(name)
+
+        async def run():
+            backgroundTask = asyncio.ensure_future(request('background', True))
+            await asyncio.sleep(0.1)
+            await asyncio.gather(backgroundTask, *[request('foreground', False) for i in range(3)])
+
+        asyncio.run(run())
+        self.assertEqual(order, ['foreground'] * 3 + ['background'])
+
+class Response():
+
+    def __init__(self, status_code, headers = {}):
+        self.status_code = status_code
+        self.headers = headers
+
+    def close(self):
+        pass
+
+class Session():
+    ''' Answers every request with the given statuses in turn '''
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        status = self.statuses[min(self.requests, len(self.statuses) - 1)]
+        self.requests += 1
+        return Response(status, { 'Retry-After' : '0' })
+
+class SendTest(unittest.TestCase):
+
+    def createJira(self, statuses, maxRetries = 5):
+        jira = core.Jira6('http://jira.invalid', 'user', '',
+                          scheduler = requestscheduler.RequestScheduler(maxRetries = maxRetries))
+        jira.session = Session(statuses)
+        return jira
+
+    def test_retriedUntilAccepted(self):
+        jira = self.createJira([429, 503, 200])
+        self.assertEqual(jira._send('GET', 'rest/api/2/myself').status_code, 200)
+        self.assertEqual(jira.session.requests, 3)
+
+    def test_retriesAreLimited(self):
+        jira = self.createJira([429], maxRetries = 3)
+        self.assertEqual(jira._send('GET', 'rest/api/2/myself').status_code, 429)
+        self.assertEqual(jira.session.requests, 4)
+
+    def test_notRetriedWithoutWaiting(self):
+        jira = self.createJira([429, 200])
+        self.assertEqual(runWithoutWaiting(jira._send, 'GET', 'rest/api/2/myself').status_code, 429)
+        self.assertEqual(jira.session.requests, 1)
+
+if __name__ == '__main__':
+    unittest.main()